@@ -0,0 +1,73 @@
+"""
+Requests sent and age of the applied quotes when requoting orders faster than the amend round
+trip, with one amend task per requote and with AmendManager.
+
+    python benchmarks/bench_amend.py [--orders 5] [--requote 0.01] [--duration 3] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import time
+
+from bit.amend import AmendManager
+from bit.metrics import Histogram
+from bit.mock_exchange import MockExchange
+from bit.rest_client import RestClient
+
+
+async def run(exchange: MockExchange, client: RestClient, amend, args):
+    order_ids = [
+        (await client.spot_place_order(pair = 'BTC-USDT', side = 'buy', order_type = 'limit', qty = '1', price = '100'))['order_id']
+        for _ in range(args.orders)
+    ]
+    requests = exchange.rest_requests
+    ages = Histogram()
+    last = {}
+    tasks = []
+
+    async def send(order_id, price):
+        start = time.perf_counter()
+        await amend(order_id = order_id, pair = 'BTC-USDT', price = price)
+        ages.record(time.perf_counter() - start)
+
+    deadline = time.perf_counter() + args.duration
+    step = 0
+    while time.perf_counter() < deadline:
+        step += 1
+        for order_id in order_ids:
+            last[order_id] = '{:.2f}'.format(100 + step * 0.01)
+            tasks.append(asyncio.ensure_future(send(order_id, last[order_id])))
+        await asyncio.sleep(args.requote)
+    await asyncio.gather(*tasks)
+    stale = sum(1 for order_id in order_ids if float(exchange.orders[order_id]['price']) != float(last[order_id]))
+    return len(tasks), exchange.rest_requests - requests, ages, stale
+
+
+async def main(args):
+    exchange = MockExchange(rest_latency = args.latency)
+    await exchange.start()
+    for conflate in (False, True):
+        client = RestClient('key', 'secret', exchange.rest_url, pool_size = args.pool_size)
+        manager = AmendManager(client) if conflate else None
+        amend = manager.spot_amend_order if conflate else client.spot_amend_order
+        amends, requests, ages, stale = await run(exchange, client, amend, args)
+        print('{:<10} {} amends, {} requests, caller wait p50 {:7.1f} ms p99 {:7.1f} ms, {} orders left at a stale price'.format(
+            'conflated' if conflate else 'direct', amends, requests, ages.percentile(50) * 1e3, ages.percentile(99) * 1e3, stale,
+        ))
+        if manager is not None:
+            stats = manager.stats()
+            print('  saved {saved}  sent {sent}  age of applied quotes p50 {p50:.1f} ms p99 {p99:.1f} ms'.format(
+                p50 = stats['age_p50'] * 1e3, p99 = stats['age_p99'] * 1e3, **stats,
+            ))
+            await manager.close()
+        await client.close()
+    await exchange.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type = int, default = 5)
+    parser.add_argument('--requote', type = float, default = 0.01, help = 'seconds between requotes of every order')
+    parser.add_argument('--duration', type = float, default = 3)
+    parser.add_argument('--latency', type = float, default = 0.05, help = 'seconds per REST response')
+    parser.add_argument('--pool-size', type = int, default = 32)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""
+Cost of adding a trade to the bar aggregator and of the rolling statistics over the bar rings,
+compared with a plain Python loop over the same bars.
+
+    python benchmarks/bench_bars.py [--trades 200000] [--window 20]
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+
+from bit.bars import TICK, TIME, VOLUME, BarAggregator, BarSpec
+
+
+def python_rolling(bars, window):
+    closes = [bar['close'] for bar in bars]
+    returns = [math.log(b / a) for a, b in zip(closes, closes[1:])]
+    volatility = []
+    for end in range(window, len(returns) + 1):
+        chunk = returns[end - window:end]
+        mean = sum(chunk) / window
+        volatility.append(math.sqrt(sum((r - mean) ** 2 for r in chunk) / window))
+    return volatility
+
+
+async def main(args):
+    tick = BarSpec(TICK, 10)
+    aggregator = BarAggregator(
+        [BarSpec(TIME, 1000), tick, BarSpec(VOLUME, 5.0)], trade_capacity = args.trades, bar_capacity = args.trades // 10,
+    )
+    price = 50000.0
+    trades = []
+    for n in range(args.trades):
+        price *= math.exp(random.gauss(0, 0.0005))
+        trades.append((n * 10, price, random.uniform(0.01, 1), random.random() < 0.5))
+
+    start = time.perf_counter()
+    for trade in trades:
+        await aggregator.add_trade('BTC-USDT', *trade)
+    elapsed = time.perf_counter() - start
+    print('add trade, 3 bar specs {:8.3f} us'.format(elapsed / args.trades * 1e6))
+
+    bars = aggregator.bars('BTC-USDT', tick)
+    start = time.perf_counter()
+    stats = aggregator.rolling('BTC-USDT', tick, args.window)
+    numpy_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = python_rolling(bars, args.window)
+    python_elapsed = time.perf_counter() - start
+    error = max(abs(a - b) for a, b in zip(stats['volatility'], expected))
+    print('rolling stats, {} bars  numpy {:8.2f} ms, python volatility only {:8.2f} ms, max difference {:.2e}'.format(
+        len(bars), numpy_elapsed * 1e3, python_elapsed * 1e3, error,
+    ))
+    print('vwap of {} trades      {:8.2f} ms'.format(args.trades, _timed(lambda: aggregator.vwap('BTC-USDT')) * 1e3))
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trades', type = int, default = 200000)
+    parser.add_argument('--window', type = int, default = 20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+"""
+Cold start of a session with order books, state, trade subscriptions and REST snapshots, one step
+after the other and with bootstrap, against the mock exchange.
+
+    python benchmarks/bench_bootstrap.py [--pairs 4] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import time
+
+from bit.bootstrap import SNAPSHOTS, bootstrap
+from bit.mock_exchange import MockExchange
+from bit.web_socket_client import WebSocketClient
+
+
+async def on_trade(channel, pair, data):
+    pass
+
+
+async def serial(exchange: MockExchange, pairs, snapshots) -> float:
+    start = time.perf_counter()
+    client = WebSocketClient('key', 'secret', stream_url = exchange.stream_url, rest_url = exchange.rest_url)
+    await client.start()
+    await client.subscribe(coro = on_trade, channels = ['trade'], pairs = pairs)
+    books = await client.subscribe_order_book(pairs = pairs)
+    state = await client.track_state(spot_pairs = pairs, um_account = False)
+    await state.synced.wait()
+    for fetch in snapshots.values():
+        await fetch(client.rest_client)
+    await books.wait_synced(pairs)
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return elapsed
+
+
+async def parallel(exchange: MockExchange, pairs, snapshots) -> float:
+    start = time.perf_counter()
+    session = await bootstrap(
+        'key', 'secret', stream_url = exchange.stream_url, rest_url = exchange.rest_url,
+        subscriptions = [{'coro': on_trade, 'channels': ['trade'], 'pairs': pairs}],
+        order_books = pairs, spot_pairs = pairs, snapshots = snapshots,
+    )
+    elapsed = time.perf_counter() - start
+    print('  steps done after ' + ', '.join('{} {:.0f} ms'.format(name, seconds * 1e3) for name, seconds in session.timings.items()))
+    await session.close()
+    return elapsed
+
+
+async def main(args):
+    exchange = MockExchange(rest_latency = args.latency, ws_latency = args.latency / 2)
+    await exchange.start()
+    pairs = ['PAIR{}-USDT'.format(n) for n in range(args.pairs)]
+    snapshots = {
+        'spot_open_orders': SNAPSHOTS['spot_open_orders'],
+        'trades': lambda client: client.spot_market_trades(pair = pairs[0]),
+    }
+    for name, run in (('serial', serial), ('bootstrap', parallel)):
+        elapsed = await run(exchange, pairs, snapshots)
+        print('{:<10} ready after {:7.1f} ms'.format(name, elapsed * 1e3))
+    await exchange.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pairs', type = int, default = 4)
+    parser.add_argument('--latency', type = float, default = 0.05, help = 'seconds per REST response, half of it per websocket message')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,90 @@
+"""
+Websocket frame decode throughput per JSON backend, with and without envelope-first filtering.
+
+Frames are read from a capture file or directory of bit.capture.FrameRecorder, or from a file with
+one raw frame per line when given, otherwise a synthetic mix of depth, ticker and trade frames is
+generated. With filtering, only a quarter of the pairs is
+subscribed and the other frames are dropped after peeking at their channel and pair.
+
+    python benchmarks/bench_codec.py [frames.txt | capture.cap | capture_dir]
+"""
+import os
+import sys
+import time
+
+from bit.capture import SUFFIX, ReplaySource
+from bit.codec import BACKENDS, get_codec, peek_envelope
+
+PAIRS = ['PAIR{}-USDT'.format(i) for i in range(100)]
+
+
+def synthetic_frames(count = 50000):
+    frames = []
+    for i in range(count):
+        pair = PAIRS[i % len(PAIRS)]
+        if i % 10 == 0:
+            frames.append(
+                '{"channel":"trade","timestamp":1684236540123,"module":"spot","data":[{"trade_id":"%d","pair":"%s",'
+                '"price":"30120.50","qty":"0.0123","side":"buy","created_at":1684236540120}]}' % (i, pair)
+            )
+        elif i % 10 == 1:
+            frames.append(
+                '{"channel":"ticker","timestamp":1684236540123,"module":"spot","data":{"pair":"%s","time":1684236540123,'
+                '"best_bid":"30120.00","best_ask":"30121.00","best_bid_qty":"1.2","best_ask_qty":"0.8",'
+                '"last_price":"30120.50","last_qty":"0.01","open24h":"29800","high24h":"30500","low24h":"29700",'
+                '"price_change24h":"0.01","volume24h":"1234.5","volume_usd24h":"37000000"}}' % pair
+            )
+        else:
+            changes = ','.join('["%s","%.2f","%.4f"]' % ('buy' if j % 2 else 'sell', 30100 + j, j / 7) for j in range(10))
+            frames.append(
+                '{"channel":"depth","timestamp":1684236540123,"module":"spot","data":{"type":"update","pair":"%s",'
+                '"sequence":%d,"prev_sequence":%d,"changes":[%s]}}' % (pair, i, i - 1, changes)
+            )
+    return frames
+
+
+def main():
+    if len(sys.argv) > 1 and (sys.argv[1].endswith(SUFFIX) or os.path.isdir(sys.argv[1])):
+        frames = [frame for _, frame in ReplaySource(sys.argv[1]).frames() if isinstance(frame, str)]
+    elif len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            frames = [line.rstrip('\n') for line in f if line.strip()]
+    else:
+        frames = synthetic_frames()
+    frames_bytes = [frame.encode() for frame in frames]
+    subscribed = {(channel, pair) for channel in ('depth', 'ticker', 'trade') for pair in PAIRS[:len(PAIRS) // 4]}
+    channels = {'depth', 'ticker', 'trade'}
+
+    def accept(raw):
+        channel, pair = peek_envelope(raw)
+        if channel not in channels:
+            return False
+        return pair is None or (channel, pair) in subscribed
+
+    print('{} frames, {:.0f} bytes on average'.format(len(frames), sum(map(len, frames_bytes)) / len(frames)))
+    for name in BACKENDS:
+        codec = get_codec(name)
+        if codec.name != name:
+            print('{:<8} not installed'.format(name))
+            continue
+        loads = codec.loads
+        for kind, data in (('str', frames), ('bytes', frames_bytes)):
+            full = lazy = float('inf')
+            for _ in range(3):
+                start = time.perf_counter()
+                for frame in data:
+                    loads(frame)
+                full = min(full, time.perf_counter() - start)
+
+                start = time.perf_counter()
+                for frame in data:
+                    if accept(frame):
+                        loads(frame)
+                lazy = min(lazy, time.perf_counter() - start)
+            print('{:<8} {:<6} full decode {:>10,.0f} frames/s   envelope-first {:>10,.0f} frames/s'.format(
+                name, kind, len(data) / full, len(data) / lazy,
+            ))
+
+
+if __name__ == '__main__':
+    main()
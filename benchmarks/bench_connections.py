@@ -0,0 +1,70 @@
+"""
+Request latency with the plain aiosonic connector, which opens a connection per request, against
+TunedConnector reusing pooled connections, and the first request of a cold client against a warmed up one.
+
+Connection setup costs far more over TLS and a real network than against the local mock exchange,
+use --latency to add server time per response.
+
+    python benchmarks/bench_connections.py [--requests 2000] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import time
+
+import aiosonic
+
+from bit.metrics import Histogram
+from bit.mock_exchange import MockExchange
+from bit.rest_client import RestClient
+
+
+def format_histogram(histogram: Histogram) -> str:
+    return 'p50 {:.3f} ms  p99 {:.3f} ms  max {:.3f} ms'.format(
+        histogram.percentile(50) * 1e3, histogram.percentile(99) * 1e3, histogram.max * 1e3,
+    )
+
+
+async def run(client: RestClient, args) -> Histogram:
+    latency = Histogram()
+
+    async def worker():
+        for _ in range(args.requests // args.concurrency):
+            start = time.perf_counter()
+            await client.spot_system_time()
+            latency.record(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return latency
+
+
+async def main(args):
+    exchange = MockExchange(rest_latency = args.latency)
+    await exchange.start()
+
+    plain = RestClient('key', 'secret', exchange.rest_url, pool_size = args.concurrency)
+    plain.session = aiosonic.HTTPClient(connector = aiosonic.TCPConnector(pool_size = args.concurrency))
+    print('plain aiosonic connector  {}'.format(format_histogram(await run(plain, args))))
+    await plain.close()
+
+    tuned = RestClient('key', 'secret', exchange.rest_url, pool_size = args.concurrency)
+    print('TunedConnector            {}'.format(format_histogram(await run(tuned, args))))
+    print('  pool {}'.format(tuned.pool_stats()))
+    await tuned.close()
+
+    for warm in (False, True):
+        client = RestClient('key', 'secret', exchange.rest_url, pool_size = args.concurrency)
+        if warm:
+            await client.warm_up()
+        start = time.perf_counter()
+        await asyncio.gather(*(client.spot_system_time() for _ in range(args.concurrency)))
+        print('first {} requests, {:<6} {:.3f} ms'.format(args.concurrency, 'warm' if warm else 'cold', (time.perf_counter() - start) * 1e3))
+        await client.close()
+    await exchange.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type = int, default = 2000)
+    parser.add_argument('--concurrency', type = int, default = 8)
+    parser.add_argument('--latency', type = float, default = 0.0, help = 'seconds per REST response')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,137 @@
+"""
+WebSocketClient.on_message dispatch throughput in messages per second.
+
+Compares the previous nested-lookup dispatch with the precompiled (channel, pair) table, for single
+pair messages and list payloads, and with concurrent fan-out where every subscriber is fed through
+its own queue and task. The legacy dispatch delivered list payloads only to the subscribers of
+their first pair, hence fewer callbacks.
+
+    python benchmarks/bench_dispatch.py
+"""
+import asyncio
+import logging
+import time
+
+import websockets
+
+from bit.reconnecting_websocket import ReconnectingWebsocket
+from bit.util import get_message_topic
+from bit.web_socket_client import WebSocketClient
+
+PAIRS = ['PAIR{}-USDT'.format(i) for i in range(200)]
+MESSAGES = 100000
+
+
+async def legacy_on_message(self, message):
+    topic = get_message_topic(message)
+    if topic in ('pong', 'subscription'):
+        return
+    if "data" in message:
+        data = message["data"]
+        if 'timestamp' in message and type(data) == dict:
+            data['timestamp'] = message['timestamp']
+        if 'pair' in data:
+            pair = data['pair']
+        elif type(data) == list:
+            for submessage in data:
+                pair = submessage['pair']
+                try:
+                    subscribers = self.subscribers[topic][pair]
+                except KeyError:
+                    logging.info(f'no subscribers for submessage {message}')
+                else:
+                    for subscriber in subscribers:
+                        await subscriber(topic, pair, data)
+                    return
+        else:
+            pair = ''
+        try:
+            subscribers = self.subscribers[topic][pair]
+        except KeyError:
+            logging.info(f'no subscribers {message}')
+        else:
+            for subscriber in subscribers:
+                await subscriber(topic, pair, data)
+
+
+def make_messages(lists):
+    messages = []
+    for i in range(MESSAGES):
+        pair = PAIRS[i % len(PAIRS)]
+        if lists:
+            data = [
+                {'pair': pair, 'trade_id': str(i), 'price': '100.5', 'qty': '0.1', 'side': 'buy'},
+                {'pair': PAIRS[(i + 1) % len(PAIRS)], 'trade_id': str(i + 1), 'price': '100.5', 'qty': '0.1', 'side': 'sell'},
+            ]
+            messages.append({'channel': 'trade', 'timestamp': 1684236540123, 'data': data})
+        else:
+            data = {'pair': pair, 'type': 'update', 'sequence': i, 'changes': [['buy', '100.5', '1']]}
+            messages.append({'channel': 'depth', 'timestamp': 1684236540123, 'data': data})
+    return messages
+
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+
+    async def __call__(self, channel, pair, data):
+        self.count += 1
+
+
+async def run(name, on_message, messages, subscribers, expected = None):
+    start = time.perf_counter()
+    for message in messages:
+        await on_message(message)
+    if expected is not None:
+        # Wait for queued deliveries to drain
+        while sum(s.count for s in subscribers) < expected:
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    delivered = sum(s.count for s in subscribers)
+    print('{:<50} {:>10,.0f} msg/s {:>10,.0f} callbacks/s'.format(name, len(messages) / elapsed, delivered / elapsed))
+    return delivered
+
+
+async def bench():
+    serial = WebSocketClient('key', 'secret')
+    concurrent = WebSocketClient('key', 'secret', concurrent_dispatch=True)
+    for client in (serial, concurrent):
+        await client.ws.start()
+        client._token = 'token'
+
+    for lists in (False, True):
+        kind = 'list payloads' if lists else 'single pair payloads'
+        messages = make_messages(lists)
+
+        legacy = [Counter(), Counter()]
+        serial.subscribers = {ch: {p: set(legacy) for p in PAIRS} for ch in ('trade', 'depth')}
+        await run('legacy nested lookups, ' + kind, lambda m: legacy_on_message(serial, m), messages, legacy)
+
+        subscribers = [Counter(), Counter()]
+        serial.subscribers = {}
+        for subscriber in subscribers:
+            await serial.subscribe(coro=subscriber, channels=['trade', 'depth'], pairs=PAIRS)
+        delivered = await run('dispatch table, ' + kind, serial.on_message, messages, subscribers)
+
+        subscribers = [Counter(), Counter()]
+        concurrent.subscribers = {}
+        for subscriber in subscribers:
+            await concurrent.subscribe(coro=subscriber, channels=['trade', 'depth'], pairs=PAIRS)
+        await run('dispatch table concurrent, ' + kind, concurrent.on_message, messages, subscribers, delivered)
+
+    await serial.close()
+    await concurrent.close()
+
+
+async def main():
+    async def handler(socket):
+        await socket.wait_closed()
+
+    async with websockets.serve(handler, '127.0.0.1', 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        ReconnectingWebsocket.STREAM_URL = 'ws://127.0.0.1:{}'.format(port)
+        await bench()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
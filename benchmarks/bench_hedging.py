@@ -0,0 +1,59 @@
+"""
+Tail latency of a private GET query with and without hedging, against the mock exchange stalling a
+share of its responses.
+
+    python benchmarks/bench_hedging.py [--requests 2000] [--stall-probability 0.02] [--stall 0.5]
+"""
+import argparse
+import asyncio
+import time
+
+from bit.hedging import HedgePolicy
+from bit.metrics import Histogram
+from bit.mock_exchange import MockExchange
+from bit.rest_client import RestClient
+
+
+async def run(client: RestClient, args) -> Histogram:
+    latency = Histogram()
+
+    async def worker():
+        for _ in range(args.requests // args.concurrency):
+            start = time.perf_counter()
+            await client.spot_query_open_orders(pair = 'BTC-USDT')
+            latency.record(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return latency
+
+
+async def main(args):
+    exchange = MockExchange(
+        rest_latency = args.latency, rest_stall_probability = args.stall_probability, rest_stall = args.stall,
+    )
+    await exchange.start()
+    for hedge in (None, HedgePolicy(percentile = args.percentile, budget = args.budget)):
+        client = RestClient('key', 'secret', exchange.rest_url, pool_size = args.concurrency * 2, hedge = hedge)
+        requests = exchange.rest_requests
+        latency = await run(client, args)
+        print('{:<10} p50 {:7.2f} ms  p99 {:7.2f} ms  p99.9 {:7.2f} ms  max {:7.2f} ms  {} requests sent'.format(
+            'hedged' if hedge else 'plain', latency.percentile(50) * 1e3, latency.percentile(99) * 1e3,
+            latency.percentile(99.9) * 1e3, latency.max * 1e3, exchange.rest_requests - requests,
+        ))
+        if hedge:
+            stats = hedge.stats()
+            print('  hedges {hedges}  won by second attempt {wins}  delays {delays}'.format(**stats))
+        await client.close()
+    await exchange.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type = int, default = 2000)
+    parser.add_argument('--concurrency', type = int, default = 4)
+    parser.add_argument('--latency', type = float, default = 0.005, help = 'seconds per REST response')
+    parser.add_argument('--stall-probability', type = float, default = 0.02)
+    parser.add_argument('--stall', type = float, default = 0.5, help = 'seconds a stalled response takes')
+    parser.add_argument('--percentile', type = float, default = 95)
+    parser.add_argument('--budget', type = float, default = 0.05)
+    asyncio.run(main(parser.parse_args()))
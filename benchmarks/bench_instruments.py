@@ -0,0 +1,63 @@
+"""
+Cost of local order normalization and instrument cache start, cold from REST and warm from disk.
+
+    python benchmarks/bench_instruments.py [--pairs 500] [--orders 100000]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from bit.instruments import DOWN, InstrumentCache, round_to_step
+from bit.mock_exchange import MockExchange
+from bit.rest_client import RestClient
+
+
+async def main(args):
+    exchange = MockExchange(rest_latency = args.latency)
+    for n in range(args.pairs):
+        exchange.book('PAIR{}-USDT'.format(n))
+    await exchange.start()
+    client = RestClient('key', 'secret', exchange.rest_url)
+    path = os.path.join(tempfile.mkdtemp(), 'instruments.json')
+
+    cold = InstrumentCache(path = path)
+    start = time.perf_counter()
+    await cold.start(client, background = False)
+    print('cold start from REST   {:8.2f} ms, {} instruments'.format((time.perf_counter() - start) * 1e3, len(cold)))
+    warm = InstrumentCache(path = path)
+    start = time.perf_counter()
+    await warm.start(client, background = False)
+    print('warm start from disk   {:8.2f} ms, {} instruments'.format((time.perf_counter() - start) * 1e3, len(warm)))
+
+    orders = [
+        {'pair': 'PAIR{}-USDT'.format(n % args.pairs), 'side': 'buy' if n % 2 else 'sell', 'price': 100 + n * 0.00137, 'qty': 1.234567}
+        for n in range(args.orders)
+    ]
+    start = time.perf_counter()
+    for order in orders:
+        warm.normalize(order)
+    print('normalize one order    {:8.3f} us'.format((time.perf_counter() - start) / args.orders * 1e6))
+    start = time.perf_counter()
+    warm.normalize_many(orders)
+    print('normalize_many         {:8.3f} us per order'.format((time.perf_counter() - start) / args.orders * 1e6))
+
+    prices = np.array([order['price'] for order in orders])
+    step = warm['PAIR0-USDT'].price_step
+    start = time.perf_counter()
+    round_to_step(prices, step, DOWN)
+    print('round_to_step array    {:8.3f} us per price'.format((time.perf_counter() - start) / args.orders * 1e6))
+
+    await client.close()
+    await exchange.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pairs', type = int, default = 500)
+    parser.add_argument('--orders', type = int, default = 100000)
+    parser.add_argument('--latency', type = float, default = 0.05, help = 'seconds per REST response')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,79 @@
+"""
+Memory per message and parse cost of bit.models objects against plain payload dicts.
+
+For trades and orders it measures retained memory of decoded messages with tracemalloc, the cost of
+building the objects, and of a consumer reading the numeric fields three times, which parses the
+strings on every read with dicts but only once with models.
+
+    python benchmarks/bench_models.py
+"""
+import timeit
+import tracemalloc
+
+from bit.codec import get_codec
+from bit.models import Order, Trade
+
+COUNT = 20000
+
+TRADE = (
+    '{"trade_id":"%d","pair":"BTC-USDT","price":"30120.50","qty":"0.0123","side":"buy",'
+    '"created_at":1684236540120}'
+)
+ORDER = (
+    '{"order_id":"%d","created_at":1684236540120,"updated_at":1684236540125,"user_id":"481554",'
+    '"pair":"BTC-USDT","order_type":"limit","side":"buy","price":"30120.50","qty":"0.50000000",'
+    '"status":"open","time_in_force":"gtc","avg_price":"0.00000000","filled_qty":"0.00000000",'
+    '"fee":"0.00000000","stop_price":"","auto_price":"0.00000000","auto_price_type":"",'
+    '"maker_fee_rate":"0.00020000","taker_fee_rate":"0.00050000","label":"strategy-1","source":"api",'
+    '"post_only":true,"reduce_only":false,"reject_post_only":false,"is_liquidation":false,"hidden":false,'
+    '"mmp":false,"cancel_reason":""}'
+)
+
+
+def retained(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objects
+    return size / COUNT
+
+
+def main():
+    loads = get_codec().loads
+    for name, template, model, numbers in (
+        ('trade', TRADE, Trade, ('price', 'qty')),
+        ('order', ORDER, Order, ('price', 'qty', 'filled_qty', 'avg_price')),
+    ):
+        frames = [template % i for i in range(COUNT)]
+        dicts_memory = retained(lambda: [loads(frame) for frame in frames])
+        models_memory = retained(lambda: [model(loads(frame)) for frame in frames])
+
+        decoded = [loads(frame) for frame in frames]
+        build = min(timeit.repeat(lambda: [model(d) for d in decoded], number = 1, repeat = 5)) / COUNT
+
+        def read_dicts():
+            for d in decoded:
+                for _ in range(3):
+                    for field in numbers:
+                        float(d[field])
+
+        def read_models():
+            for m in [model(d) for d in decoded]:
+                for _ in range(3):
+                    for field in numbers:
+                        getattr(m, field)
+
+        dict_reads = min(timeit.repeat(read_dicts, number = 1, repeat = 5)) / COUNT
+        model_reads = min(timeit.repeat(read_models, number = 1, repeat = 5)) / COUNT
+
+        print('{}: {:.0f} bytes per dict, {:.0f} bytes per model'.format(name, dicts_memory, models_memory))
+        print('{}: model construction {:.2f} us'.format(name, build * 1e6))
+        print('{}: 3 reads of {} numbers, dict + float() {:.2f} us, model incl. construction {:.2f} us'.format(
+            name, len(numbers), dict_reads * 1e6, model_reads * 1e6,
+        ))
+
+
+if __name__ == '__main__':
+    main()
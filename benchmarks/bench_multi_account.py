@@ -0,0 +1,83 @@
+"""
+Account sweeps over many accounts with a RestClient per account queried one after the other, with
+a RestClient per account queried at once, and with MultiAccountClient. Then the wait of a single
+request of one account while another sends a burst over the shared pool.
+
+    python benchmarks/bench_multi_account.py [--accounts 32] [--latency 0.05] [--pool-size 16]
+"""
+import argparse
+import asyncio
+import time
+
+from bit.mock_exchange import MockExchange
+from bit.multi_account import MultiAccountClient
+from bit.rest_client import RestClient
+
+
+async def sweep(exchange: MockExchange, args, mode: str):
+    accounts = {'account{}'.format(n): ('key{}'.format(n), 'secret{}'.format(n)) for n in range(args.accounts)}
+    if mode == 'shared':
+        client = MultiAccountClient(accounts, exchange.rest_url, pool_size = args.pool_size)
+        clients = list(client.clients.values())
+    else:
+        client = None
+        clients = [RestClient(ak, sk, exchange.rest_url) for ak, sk in accounts.values()]
+    times = []
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        if mode == 'serial':
+            for c in clients:
+                await c.um_query_accounts()
+        elif mode == 'concurrent':
+            await asyncio.gather(*(c.um_query_accounts() for c in clients))
+        else:
+            await client.um_query_accounts()
+        times.append(time.perf_counter() - start)
+    if client is not None:
+        connections = client.pool_stats()['created']
+        await client.close()
+    else:
+        connections = sum(c.pool_stats()['created'] for c in clients)
+        for c in clients:
+            await c.close()
+    print('{:<11} sweep of {} accounts {:7.1f} ms (best of {}), {} connections'.format(
+        mode, args.accounts, min(times) * 1e3, args.rounds, connections,
+    ))
+
+
+async def burst(exchange: MockExchange, args, max_in_flight):
+    client = MultiAccountClient(
+        {'busy': ('key0', 'secret0'), 'quiet': ('key1', 'secret1')}, exchange.rest_url,
+        pool_size = args.pool_size, max_in_flight = max_in_flight,
+    )
+    await client.warm_up(keepalive = False)
+    busy = [asyncio.ensure_future(client['busy'].spot_query_open_orders()) for _ in range(args.burst)]
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await client['quiet'].spot_query_open_orders()
+    waited = time.perf_counter() - start
+    await asyncio.gather(*busy)
+    await client.close()
+    print('max_in_flight {:<4} quiet account request during a burst of {}: {:7.1f} ms'.format(
+        client.max_in_flight, args.burst, waited * 1e3,
+    ))
+
+
+async def main(args):
+    exchange = MockExchange(rest_latency = args.latency)
+    await exchange.start()
+    for mode in ('serial', 'concurrent', 'shared'):
+        await sweep(exchange, args, mode)
+    for max_in_flight in (args.pool_size, None):
+        await burst(exchange, args, max_in_flight)
+    await exchange.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--accounts', type = int, default = 32)
+    parser.add_argument('--latency', type = float, default = 0.05, help = 'seconds per REST response')
+    parser.add_argument('--pool-size', type = int, default = 16)
+    parser.add_argument('--rounds', type = int, default = 3)
+    parser.add_argument('--burst', type = int, default = 200, help = 'requests sent at once by the busy account')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,63 @@
+"""
+Time to pull a whole user trade history page by page, against the mock exchange with injected latency.
+
+Compares the manual loop where every page waits for the previous one with RestClient.spot_iter_trades
+prefetching pages, with and without splitting the time range into parallel windows.
+
+    python benchmarks/bench_pagination.py [--records 20000] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import time
+
+from bit.mock_exchange import MockExchange
+from bit.rest_client import RestClient
+
+
+async def sequential(client: RestClient, params: dict) -> int:
+    count = 0
+    offset = 1
+    while True:
+        page = await client.spot_query_trades(offset = offset, limit = 100, **params)
+        count += len(page)
+        if len(page) < 100:
+            return count
+        offset += 1
+
+
+async def iterated(client: RestClient, params: dict, **options) -> int:
+    count = 0
+    async for _ in client.spot_iter_trades(**options, **params):
+        count += 1
+    return count
+
+
+async def main(args):
+    exchange = MockExchange(rest_latency = args.latency, history_size = args.records)
+    await exchange.start()
+    client = RestClient('key', 'secret', exchange.rest_url, pool_size = 16)
+    params = {
+        'pair': 'BTC-USDT', 'start_time': exchange.HISTORY_START,
+        'end_time': exchange.HISTORY_START + args.records * 1000 - 1,
+    }
+    runs = [
+        ('sequential pages', lambda: sequential(client, params)),
+        ('spot_iter_trades concurrency 4', lambda: iterated(client, params, concurrency = 4)),
+        ('spot_iter_trades concurrency 16', lambda: iterated(client, params, concurrency = 16)),
+        ('spot_iter_trades concurrency 16, 8 windows', lambda: iterated(client, params, concurrency = 16, windows = 8)),
+    ]
+    for name, run in runs:
+        requests = exchange.rest_requests
+        start = time.perf_counter()
+        count = await run()
+        elapsed = time.perf_counter() - start
+        print('{:<45} {:>7} records in {:6.2f} s, {} requests'.format(name, count, elapsed, exchange.rest_requests - requests))
+    await client.close()
+    await exchange.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type = int, default = 20000)
+    parser.add_argument('--latency', type = float, default = 0.02, help = 'seconds per REST response')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,90 @@
+"""
+Per-order request signing cost: legacy encoder + fresh HMAC versus bit.signing.Signer.
+
+Also verifies that the new canonical encoder produces exactly the legacy output for single orders
+and nested batch payloads.
+
+    python benchmarks/bench_signing.py
+"""
+import hashlib
+import hmac
+import timeit
+
+from bit.signing import Signer, encode_object
+
+SECRET = 'eabe3b5bf4a1e7ea9e1a9c5a3f2d4b6c'
+
+
+def legacy_encode_list(item_list):
+    return '[' + '&'.join(legacy_encode_object(item) for item in item_list) + ']'
+
+
+def legacy_encode_object(obj):
+    if isinstance(obj, (str, int)):
+        return obj
+    ret_list = []
+    for key in sorted(obj.keys()):
+        val = obj[key]
+        if isinstance(val, list):
+            ret_list.append(f'{key}={legacy_encode_list(val)}')
+        elif isinstance(val, dict):
+            ret_list.append(f'{key}={legacy_encode_object(val)}')
+        elif isinstance(val, bool):
+            ret_list.append(f'{key}={str(val).lower()}')
+        else:
+            ret_list.append(f'{key}={str(val)}')
+    return '&'.join(sorted(ret_list))
+
+
+def legacy_sign(api_path, param_map):
+    str_to_sign = api_path + '&' + legacy_encode_object(param_map)
+    return hmac.new(SECRET.encode('utf-8'), str_to_sign.encode('utf-8'), digestmod=hashlib.sha256).hexdigest()
+
+
+def make_order(i):
+    return {
+        'pair': 'BTC-USDT',
+        'side': 'buy' if i % 2 else 'sell',
+        'price': '{:.2f}'.format(30000 + i * 0.5),
+        'qty': '0.01',
+        'order_type': 'limit',
+        'time_in_force': 'gtc',
+        'post_only': True,
+        'reduce_only': False,
+        'label': 'quote-{}'.format(i),
+        'timestamp': '1684236540123',
+    }
+
+
+def verify():
+    payloads = [
+        make_order(1),
+        {'orders': [make_order(i) for i in range(20)], 'timestamp': '1684236540123'},
+        {'currency': 'USD', 'orders_data': [make_order(i) for i in range(3)], 'timestamp': 1},
+        # Keys which are prefixes of other keys and sort differently as 'key=val' strings
+        {'a': 1, 'a-b': 2, 'a_b': {'x': [{'y': 'z', 'y-1': False}]}, 'ab': 'c'},
+        {'orders': [], 'nested': {'deep': {'deeper': {'list': ['1', '2', {'k': 'v'}]}}}},
+    ]
+    for payload in payloads:
+        assert encode_object(payload) == legacy_encode_object(payload), payload
+
+
+def main():
+    verify()
+    print('canonical encoder matches legacy output')
+
+    signer = Signer(SECRET)
+    single = make_order(1)
+    batch = {'orders': [make_order(i) for i in range(20)], 'timestamp': '1684236540123'}
+    number = 5000
+
+    for name, payload, orders in (('single order', single, 1), ('20-order batch', batch, 20)):
+        legacy = min(timeit.repeat(lambda: legacy_sign('/spot/v1/orders', payload), number=number, repeat=7))
+        fast = min(timeit.repeat(lambda: signer.sign('/spot/v1/orders', payload), number=number, repeat=7))
+        print('{:<16} legacy {:7.2f} us/order   signer {:7.2f} us/order   speedup {:.2f}x'.format(
+            name, legacy / number / orders * 1e6, fast / number / orders * 1e6, legacy / fast,
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Load test of RestClient and WebSocketClient against the local mock exchange, no network needed.
+
+Reports REST throughput and tail latency with concurrent order placement, queries and cancels,
+websocket message throughput and latency at the configured stream rate, and the time from a forced
+disconnect to the first data message after the client resubscribed. The mock exchange runs in the
+same event loop as the clients, so latencies include its work too; compare runs, not absolute values.
+
+    python benchmarks/load_test.py --duration 10 --pairs 20 --rate 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from bit.exceptions import BitAPIException
+from bit.metrics import Histogram, Metrics, WS_EXCHANGE_LATENCY, WS_HANDLE
+from bit.mock_exchange import MockExchange
+from bit.rest_client import RestClient
+from bit.web_socket_client import WebSocketClient
+
+
+def format_histogram(histogram: Histogram) -> str:
+    if not histogram or not histogram.count:
+        return 'no samples'
+    return 'p50 {:.3f} ms  p99 {:.3f} ms  p99.9 {:.3f} ms  max {:.3f} ms'.format(
+        histogram.percentile(50) * 1e3, histogram.percentile(99) * 1e3, histogram.percentile(99.9) * 1e3,
+        histogram.max * 1e3,
+    )
+
+
+async def rest_load(exchange: MockExchange, args):
+    client = RestClient('key', 'secret', exchange.rest_url, pool_size = args.concurrency)
+    latency = Histogram()
+    errors = 0
+    deadline = time.monotonic() + args.duration
+
+    async def worker(n):
+        nonlocal errors
+        pair = 'PAIR{}-USDT'.format(n % args.pairs)
+        i = 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                if i % 3 == 0:
+                    await client.spot_place_order(pair = pair, side = 'buy', price = '100', qty = '1', order_type = 'limit')
+                elif i % 3 == 1:
+                    await client.spot_query_open_orders(pair = pair)
+                else:
+                    await client.spot_cancel_order(pair = pair)
+            except BitAPIException:
+                errors += 1
+            latency.record(time.perf_counter() - start)
+            i += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    await client.close()
+    print('REST       {:>10,.0f} req/s  {} errors  {}'.format(latency.count / elapsed, errors, format_histogram(latency)))
+
+
+async def ws_load(exchange: MockExchange, args):
+    metrics = Metrics()
+    client = WebSocketClient('key', 'secret', stream_url = exchange.stream_url, rest_url = exchange.rest_url, metrics = metrics)
+    received = 0
+
+    async def on_data(channel, pair, data):
+        nonlocal received
+        received += 1
+
+    await client.start()
+    pairs = ['PAIR{}-USDT'.format(n) for n in range(args.pairs)]
+    await client.subscribe(coro = on_data, channels = ['depth', 'trade', 'ticker'], pairs = pairs)
+    await asyncio.sleep(1)
+    metrics.reset()
+    received = 0
+    sent = exchange.ws_messages
+    start = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    elapsed = time.perf_counter() - start
+    print('websocket  {:>10,.0f} msg/s received  {:>10,.0f} msg/s sent'.format(
+        received / elapsed, (exchange.ws_messages - sent) / elapsed,
+    ))
+    print('  exchange to receive  {}'.format(format_histogram(metrics.merged(WS_EXCHANGE_LATENCY))))
+    print('  receive to handled   {}'.format(format_histogram(metrics.merged(WS_HANDLE))))
+
+    recoveries = []
+    for _ in range(args.disconnects):
+        disconnected = time.monotonic()
+        await exchange.disconnect()
+        while client.ws.connected.is_set() and time.monotonic() - disconnected < 1:
+            await asyncio.sleep(0.001)
+        while not client.ws.connected.is_set():
+            await asyncio.sleep(0.001)
+        count = received
+        while received == count:
+            await asyncio.sleep(0.001)
+        recoveries.append(time.monotonic() - disconnected)
+        await asyncio.sleep(0.5)
+    if recoveries:
+        print('reconnect  recovery min {:.3f} s  avg {:.3f} s  max {:.3f} s over {} disconnects'.format(
+            min(recoveries), sum(recoveries) / len(recoveries), max(recoveries), len(recoveries),
+        ))
+    await client.close()
+
+
+async def main(args):
+    exchange = MockExchange(
+        message_rate = args.rate, trade_rate = args.rate / 10, rest_latency = args.rest_latency,
+        ws_latency = args.ws_latency,
+    )
+    await exchange.start()
+    try:
+        await rest_load(exchange, args)
+        await ws_load(exchange, args)
+    finally:
+        await exchange.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type = float, default = 5, help = 'seconds of each phase')
+    parser.add_argument('--pairs', type = int, default = 10)
+    parser.add_argument('--rate', type = float, default = 100, help = 'depth updates per second and pair')
+    parser.add_argument('--concurrency', type = int, default = 8, help = 'concurrent REST requests')
+    parser.add_argument('--rest-latency', type = float, default = 0.0, help = 'seconds injected per REST response')
+    parser.add_argument('--ws-latency', type = float, default = 0.0, help = 'seconds injected per websocket message')
+    parser.add_argument('--disconnects', type = int, default = 3, help = 'forced disconnects to measure recovery')
+    logging.basicConfig(level = logging.WARNING)
+    asyncio.run(main(parser.parse_args()))
@@ -3,3 +3,4 @@ __version__ = "0.1.0"
 from bit.web_socket_client import WebSocketClient
 from bit.rest_client import RestClient
 from bit.exceptions import BitAPIException
+from bit.sharded_client import ShardedWebSocketClient
@@ -0,0 +1,188 @@
+"""
+Amend conflation for orders requoted faster than the exchange answers.
+
+``AmendManager`` keeps at most one amend request in flight per order. An amend of an order whose
+previous amend hasn't returned yet becomes its pending target, and further amends update that
+target (newer fields replace older ones) instead of queueing behind it, so only the latest price
+and size are sent once the exchange answered and stale prices are never applied after newer ones.
+Pending targets of different orders are sent together through the amend batch endpoints, linear
+ones grouped by settlement currency, a single one through the regular amend endpoint.
+
+Every caller gets the exchange result of the request carrying its target or a newer one replacing
+it. ``stats`` reports the amends saved by conflation and the age of the applied targets: seconds
+from the last update of a target to the exchange acknowledging it.
+
+Usage::
+
+    amends = AmendManager(rest_client)
+    await amends.spot_amend_order(order_id = order_id, pair = 'BTC-USDT', price = '50000.5')
+"""
+import asyncio
+from typing import Dict, List, Optional
+
+from bit.exceptions import BitAPIException
+from bit.metrics import Histogram
+from bit.util import linear_currency
+
+SPOT = 'spot'
+LINEAR = 'linear'
+
+
+class _Target:
+    __slots__ = ('kind', 'group', 'params', 'futures', 'updated')
+
+    def __init__(self, kind: str, group: Optional[str], params: dict, updated: float):
+        self.kind = kind
+        self.group = group
+        self.params = params
+        self.futures: List[asyncio.Future] = []
+        # Loop time of the last update
+        self.updated = updated
+
+
+class AmendManager:
+    BATCH_KEY = 'orders_data'
+
+    def __init__(self, client, *, window: float = 0.0, max_batch_size: int = 20):
+        """
+        :param client: RestClient
+        :param window: seconds pending targets are collected before they are sent, by default the
+            amends made until the event loop runs again are sent together
+        :param max_batch_size: orders per batch request
+        """
+        self.client = client
+        self.window = window
+        self.max_batch_size = max_batch_size
+        # order_id -> target waiting for the order's in-flight amend, or for the window
+        self._pending: Dict[str, _Target] = {}
+        # order_id -> target sent
+        self._in_flight: Dict[str, _Target] = {}
+        self._timer: Optional[asyncio.Handle] = None
+        self._tasks = set()
+        self.amends = 0
+        # Amends replaced by a newer one before being sent
+        self.saved = 0
+        self.sent = 0
+        self.requests = 0
+        self.ages = Histogram()
+
+    async def spot_amend_order(self, **req):
+        """Amend a spot order, same parameters and result as RestClient.spot_amend_order."""
+        return await self._amend(SPOT, None, req)
+
+    async def linear_amend_order(self, **req):
+        """Amend a linear order, same parameters and result as RestClient.linear_amend_order."""
+        return await self._amend(LINEAR, linear_currency(req), req)
+
+    async def _amend(self, kind: str, group: Optional[str], req: dict):
+        loop = asyncio.get_running_loop()
+        order_id = str(req['order_id'])
+        target = self._pending.get(order_id)
+        if target is None:
+            target = self._pending[order_id] = _Target(kind, group, dict(req), loop.time())
+        else:
+            target.params.update(req)
+            target.updated = loop.time()
+            self.saved += 1
+        self.amends += 1
+        future = loop.create_future()
+        target.futures.append(future)
+        if order_id not in self._in_flight:
+            self._schedule()
+        return await future
+
+    def discard(self, order_id) -> bool:
+        """Drop the pending target of an order, e.g. cancelled meanwhile, its callers get CancelledError."""
+        target = self._pending.pop(str(order_id), None)
+        if target is None:
+            return False
+        for future in target.futures:
+            future.cancel()
+        return True
+
+    def _schedule(self):
+        if self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.window, self._flush) if self.window else loop.call_soon(self._flush)
+
+    def _flush(self):
+        self._timer = None
+        groups: Dict[tuple, List[_Target]] = {}
+        for order_id in [order_id for order_id in self._pending if order_id not in self._in_flight]:
+            target = self._pending.pop(order_id)
+            if all(future.done() for future in target.futures):
+                # Every caller was cancelled
+                continue
+            self._in_flight[order_id] = target
+            groups.setdefault((target.kind, target.group), []).append(target)
+        for (kind, group), targets in groups.items():
+            for i in range(0, len(targets), self.max_batch_size):
+                task = asyncio.create_task(self._send(kind, group, targets[i:i + self.max_batch_size]))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, kind: str, group: Optional[str], targets: List[_Target]):
+        self.requests += 1
+        self.sent += len(targets)
+        client = self.client
+        try:
+            if len(targets) == 1:
+                single = client.spot_amend_order if kind == SPOT else client.linear_amend_order
+                results = [await single(**targets[0].params)]
+            else:
+                orders = [target.params for target in targets]
+                if kind == SPOT:
+                    data = await client.spot_amend_batch_orders(**{self.BATCH_KEY: orders})
+                else:
+                    data = await client.linear_amend_batch(**{'currency': group, self.BATCH_KEY: [
+                        {k: v for k, v in order.items() if k != 'currency'} for order in orders
+                    ]})
+                results = data['orders'] if isinstance(data, dict) else data
+                if len(results) != len(targets):
+                    raise BitAPIException(
+                        'batch', None, None, 3, 'Batch response has {} results for {} orders'.format(len(results), len(targets))
+                    )
+            now = asyncio.get_running_loop().time()
+            for target, result in zip(targets, results):
+                if isinstance(result, dict) and result.get('code'):
+                    error = BitAPIException('batch', target.params, None, result['code'], result.get('message', ''))
+                    self._resolve(target, exception = error)
+                else:
+                    self.ages.record(now - target.updated)
+                    self._resolve(target, result = result)
+        except Exception as e:
+            for target in targets:
+                self._resolve(target, exception = e)
+        finally:
+            for target in targets:
+                del self._in_flight[str(target.params['order_id'])]
+            if any(str(target.params['order_id']) in self._pending for target in targets):
+                self._schedule()
+
+    @staticmethod
+    def _resolve(target: _Target, *, result = None, exception: Optional[BaseException] = None):
+        for future in target.futures:
+            if future.done():
+                continue
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """Amends made, saved by conflation, sent and requests sent, age percentiles of applied targets in seconds."""
+        return {
+            'amends': self.amends, 'saved': self.saved, 'sent': self.sent, 'requests': self.requests,
+            'in_flight': len(self._in_flight), 'pending': len(self._pending),
+            'age_p50': self.ages.percentile(50), 'age_p99': self.ages.percentile(99),
+            'age_max': self.ages.max if self.ages.count else None,
+        }
+
+    async def close(self):
+        """Send the pending targets and wait until every amend returned."""
+        while self._pending or self._tasks:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._flush()
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions = True)
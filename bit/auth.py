@@ -0,0 +1,83 @@
+"""
+Websocket auth token cache.
+
+Subscriptions to private channels carry a token from ``spot_ws_auth``. ``TokenCache`` fetches it once,
+keeps it until shortly before it expires and refreshes it in the background meanwhile, so that
+(re)subscribing never waits for a REST round trip. Concurrent callers share one fetch.
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+
+class TokenCache:
+    # Seconds a token is used for, the exchange keeps them valid longer
+    TTL = 300
+    # Seconds before expiry the background refresh fetches the next token
+    REFRESH_AHEAD = 60
+    RETRY_WAIT = 1.0
+
+    def __init__(self, fetch: Callable[[], Awaitable[str]], *, ttl: float = TTL, refresh_ahead: float = REFRESH_AHEAD):
+        """
+        :param fetch: coroutine function returning a new token, e.g. fetching it with RestClient.spot_ws_auth
+        """
+        self._log = logging.getLogger(__name__)
+        self._fetch = fetch
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.token: Optional[str] = None
+        # monotonic time the token is used until
+        self.expires = 0.0
+        self._pending: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self.fetches = 0
+
+    @property
+    def valid(self) -> bool:
+        return self.token is not None and time.monotonic() < self.expires
+
+    async def get(self) -> str:
+        """Cached token, fetched only when there is none or it expired."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+        if self.valid:
+            return self.token
+        return await self.refresh()
+
+    async def refresh(self) -> str:
+        """Fetch a new token, callers arriving meanwhile wait for the same fetch."""
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(self._do_fetch())
+        # A caller being cancelled doesn't cancel the fetch others are waiting for
+        return await asyncio.shield(self._pending)
+
+    async def _do_fetch(self) -> str:
+        try:
+            token = await self._fetch()
+            self.fetches += 1
+            self.token = token
+            self.expires = time.monotonic() + self.ttl
+            return token
+        finally:
+            self._pending = None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(max(self.expires - self.refresh_ahead - time.monotonic(), 0))
+            try:
+                await self.refresh()
+            except Exception:
+                self._log.exception('Websocket token refresh failed')
+                await asyncio.sleep(self.RETRY_WAIT)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._pending is not None:
+            with contextlib.suppress(Exception, asyncio.CancelledError):
+                await self._pending
@@ -0,0 +1,312 @@
+"""
+Incremental OHLCV/VWAP bars over the trade channel, kept in NumPy ring buffers.
+
+``BarAggregator.on_trade`` is a WebSocketClient subscriber. Every trade goes into a per pair ring of
+recent trades and updates the open bar of every configured ``BarSpec``: time bars close when a trade
+falls into a later interval (intervals without trades have no bar), tick bars after ``size`` trades
+and volume bars once their volume reaches ``size``, the trade crossing the threshold closing the
+bar. Closed bars go into a per pair ring of ``BAR_DTYPE`` records, so memory is bounded by the ring
+capacities whatever the run time. Rolling statistics are computed over the rings with vectorized
+NumPy functions.
+
+``start`` subscribes the trade channel and seeds the rings from ``spot_market_trades`` first, live
+trades arriving meanwhile are applied after the seed without the ones it already contained.
+
+Requires numpy, installed with the ``numpy`` extra of the package. Importing this module without it
+raises ImportError.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError as e:  # pragma: no cover
+    raise ImportError('bit.bars requires numpy, install the numpy extra: pip install "python-bit[numpy]"') from e
+
+TIME = 'time'
+TICK = 'tick'
+VOLUME = 'volume'
+
+BAR_DTYPE = np.dtype([
+    ('start', 'i8'), ('end', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'), ('close', 'f8'),
+    ('volume', 'f8'), ('notional', 'f8'), ('buy_volume', 'f8'), ('count', 'i8'),
+])
+
+
+class BarSpec(tuple):
+    """Bar kind (TIME, TICK or VOLUME) and size: milliseconds, trades or base currency quantity."""
+    __slots__ = ()
+
+    def __new__(cls, kind: str, size):
+        if kind not in (TIME, TICK, VOLUME):
+            raise ValueError('Unknown bar kind {}'.format(kind))
+        if size <= 0:
+            raise ValueError('Bar size must be positive')
+        return super().__new__(cls, (kind, size))
+
+    @property
+    def kind(self) -> str:
+        return self[0]
+
+    @property
+    def size(self):
+        return self[1]
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Sums of every window of consecutive values, len(values) - window + 1 of them."""
+    if len(values) < window:
+        return np.empty(0, dtype = values.dtype)
+    sums = np.cumsum(values, dtype = np.float64)
+    sums[window:] = sums[window:] - sums[:-window]
+    return sums[window - 1:]
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    return rolling_sum(values, window) / window
+
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """Population standard deviation of every window, from rolling sums of values and squares."""
+    mean = rolling_mean(values, window)
+    variance = rolling_sum(values * values, window) / window - mean * mean
+    return np.sqrt(np.maximum(variance, 0))
+
+
+class _Ring:
+    """Fixed capacity ring of records, oldest overwritten first."""
+    __slots__ = ('data', 'head', 'count')
+
+    def __init__(self, capacity: int, dtype):
+        self.data = np.zeros(capacity, dtype = dtype)
+        self.head = 0
+        self.count = 0
+
+    def append(self, record):
+        self.data[self.head] = record
+        self.head += 1
+        if self.head == len(self.data):
+            self.head = 0
+        if self.count < len(self.data):
+            self.count += 1
+
+    def last(self, n: Optional[int] = None) -> np.ndarray:
+        """Copy of the newest n records, oldest first."""
+        count = self.count if n is None else min(n, self.count)
+        start = self.head - count
+        if start >= 0:
+            return self.data[start:self.head].copy()
+        return np.concatenate((self.data[start:], self.data[:self.head]))
+
+    def __len__(self):
+        return self.count
+
+
+TRADE_DTYPE = np.dtype([('time', 'i8'), ('price', 'f8'), ('qty', 'f8'), ('side', 'i1')])
+
+
+class _OpenBar:
+    __slots__ = ('start', 'end', 'open', 'high', 'low', 'close', 'volume', 'notional', 'buy_volume', 'count')
+
+    def __init__(self, start: int, price: float):
+        self.start = start
+        self.end = start
+        self.open = self.high = self.low = self.close = price
+        self.volume = self.notional = self.buy_volume = 0.0
+        self.count = 0
+
+    def add(self, time: int, price: float, qty: float, buy: bool):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.end = time
+        self.volume += qty
+        self.notional += price * qty
+        if buy:
+            self.buy_volume += qty
+        self.count += 1
+
+    def record(self) -> tuple:
+        return (
+            self.start, self.end, self.open, self.high, self.low, self.close, self.volume, self.notional,
+            self.buy_volume, self.count,
+        )
+
+
+class BarAggregator:
+    # Bars closed when a trade arrives are passed to on_bar(pair, spec, bar)
+
+    def __init__(
+        self, specs: Iterable = (BarSpec(TIME, 60000),), *, trade_capacity: int = 100000, bar_capacity: int = 1000,
+        on_bar: Optional[Callable[[str, BarSpec, np.void], Awaitable]] = None,
+    ):
+        """
+        :param specs: BarSpec or (kind, size) tuples of the bars built for every pair
+        :param trade_capacity: recent trades kept per pair
+        :param bar_capacity: closed bars kept per pair and spec
+        :param on_bar: optional coroutine awaited with pair, spec and the BAR_DTYPE record of every closed bar
+        """
+        self._log = logging.getLogger(__name__)
+        self.specs: List[BarSpec] = [spec if isinstance(spec, BarSpec) else BarSpec(*spec) for spec in specs]
+        self.trade_capacity = trade_capacity
+        self.bar_capacity = bar_capacity
+        self.on_bar = on_bar
+        self._trades: Dict[str, _Ring] = {}
+        self._bars: Dict[Tuple[str, BarSpec], _Ring] = {}
+        self._open: Dict[Tuple[str, BarSpec], _OpenBar] = {}
+        # Pairs being seeded -> live trades received meanwhile
+        self._pending: Dict[str, list] = {}
+
+    ######################
+    # Input
+    ######################
+
+    async def on_trade(self, channel, pair, data):
+        items = data if type(data) is list else (data,)
+        pending = self._pending.get(pair)
+        if pending is not None:
+            pending.extend(items)
+            return
+        for item in items:
+            await self._add_item(pair, item)
+
+    async def _add_item(self, pair: str, item):
+        await self.add_trade(
+            pair, int(item.get('created_at') or item.get('timestamp') or 0), float(item.get('price')),
+            float(item.get('qty')), item.get('side') == 'buy',
+        )
+
+    async def add_trade(self, pair: str, time: int, price: float, qty: float, buy: bool):
+        """Add one trade, time in milliseconds."""
+        trades = self._trades.get(pair)
+        if trades is None:
+            trades = self._trades[pair] = _Ring(self.trade_capacity, TRADE_DTYPE)
+        trades.append((time, price, qty, 1 if buy else -1))
+        for spec in self.specs:
+            key = (pair, spec)
+            bar = self._open.get(key)
+            kind, size = spec
+            if kind == TIME:
+                start = time - time % size
+                if bar is not None and start > bar.start:
+                    await self._close(key, bar)
+                    bar = None
+                if bar is None:
+                    bar = self._open[key] = _OpenBar(start, price)
+                bar.add(time, price, qty, buy)
+            else:
+                if bar is None:
+                    bar = self._open[key] = _OpenBar(time, price)
+                bar.add(time, price, qty, buy)
+                if (bar.count if kind == TICK else bar.volume) >= size:
+                    await self._close(key, bar)
+
+    async def _close(self, key: Tuple[str, BarSpec], bar: _OpenBar):
+        del self._open[key]
+        ring = self._bars.get(key)
+        if ring is None:
+            ring = self._bars[key] = _Ring(self.bar_capacity, BAR_DTYPE)
+        ring.append(bar.record())
+        if self.on_bar is not None:
+            await self.on_bar(key[0], key[1], ring.data[ring.head - 1])
+
+    async def close_due(self, now: int):
+        """Close the time bars whose interval ended before now (ms), without waiting for the next trade."""
+        for key, bar in list(self._open.items()):
+            kind, size = key[1]
+            if kind == TIME and bar.start + size <= now:
+                await self._close(key, bar)
+
+    async def start(self, ws_client, pairs: List[str], *, seed: int = 1000, interval: Optional[str] = ''):
+        """
+        Subscribe the trade channel of pairs and seed them with their last trades from REST.
+        :param ws_client: WebSocketClient, its RestClient fetches the seed
+        :param seed: trades fetched per pair, 0 subscribes without seeding
+        """
+        if seed:
+            for pair in pairs:
+                self._pending.setdefault(pair, [])
+        await ws_client.subscribe(coro = self.on_trade, channels = ['trade'], pairs = pairs, interval = interval)
+        if seed:
+            rest_client = ws_client.rest_client
+            results = await asyncio.gather(
+                *(rest_client.spot_market_trades(pair = pair, count = seed) for pair in pairs), return_exceptions = True,
+            )
+            for pair, trades in zip(pairs, results):
+                if isinstance(trades, BaseException):
+                    self._log.warning('Failed to seed trades of %s: %r', pair, trades)
+                    trades = []
+                await self._apply_seed(pair, trades)
+
+    async def _apply_seed(self, pair: str, trades: list):
+        trades = sorted(trades, key = lambda item: (int(item.get('created_at') or 0), str(item.get('trade_id'))))
+        seeded = {item.get('trade_id') for item in trades}
+        for item in trades:
+            await self._add_item(pair, item)
+        last = int(trades[-1].get('created_at') or 0) if trades else 0
+        # Live trades received while seeding, the last ones may be in the seed too
+        while self._pending.get(pair):
+            live, self._pending[pair] = self._pending[pair], []
+            for item in live:
+                if item.get('trade_id') not in seeded and int(item.get('created_at') or 0) >= last:
+                    await self._add_item(pair, item)
+        self._pending.pop(pair, None)
+
+    ######################
+    # Output
+    ######################
+
+    def trades(self, pair: str, n: Optional[int] = None) -> np.ndarray:
+        """Newest n (all kept by default) trades of pair as TRADE_DTYPE records, oldest first."""
+        ring = self._trades.get(pair)
+        return np.empty(0, dtype = TRADE_DTYPE) if ring is None else ring.last(n)
+
+    def bars(self, pair: str, spec = BarSpec(TIME, 60000), n: Optional[int] = None, *, include_open: bool = False) -> np.ndarray:
+        """
+        Newest n closed bars of pair as BAR_DTYPE records, oldest first.
+        :param include_open: append the bar still open
+        """
+        spec = spec if isinstance(spec, BarSpec) else BarSpec(*spec)
+        ring = self._bars.get((pair, spec))
+        bars = np.empty(0, dtype = BAR_DTYPE) if ring is None else ring.last(n)
+        bar = self._open.get((pair, spec))
+        if include_open and bar is not None:
+            bars = np.append(bars, np.array([bar.record()], dtype = BAR_DTYPE))
+        return bars
+
+    def vwap(self, pair: str, since: Optional[int] = None) -> Optional[float]:
+        """VWAP of the kept trades of pair, of the ones at or after since (ms) when given."""
+        trades = self.trades(pair)
+        if since is not None:
+            trades = trades[trades['time'] >= since]
+        volume = trades['qty'].sum()
+        if not volume:
+            return None
+        return float((trades['price'] * trades['qty']).sum() / volume)
+
+    def rolling(self, pair: str, spec = BarSpec(TIME, 60000), window: int = 20) -> Dict[str, np.ndarray]:
+        """
+        Rolling statistics over windows of closed bars, one value per window ending at each bar.
+
+        vwap: volume weighted price, volume: mean volume, returns: log return of the closes of each
+        bar, volatility: standard deviation of the log returns, imbalance: buy minus sell volume
+        over volume.
+        """
+        bars = self.bars(pair, spec)
+        if len(bars) < window + 1:
+            return {name: np.empty(0) for name in ('vwap', 'volume', 'returns', 'volatility', 'imbalance')}
+        volume = rolling_sum(bars['volume'], window)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            vwap = rolling_sum(bars['notional'], window) / volume
+            imbalance = (2 * rolling_sum(bars['buy_volume'], window) - volume) / volume
+        returns = np.diff(np.log(bars['close']))
+        return {
+            'vwap': vwap[1:],
+            'volume': volume[1:] / window,
+            'returns': returns[window - 1:],
+            'volatility': rolling_std(returns, window),
+            'imbalance': imbalance[1:],
+        }
@@ -0,0 +1,151 @@
+import asyncio
+from typing import Dict, List, Tuple
+
+from bit.exceptions import BitAPIException
+from bit.util import linear_currency
+
+
+class _Coalescer:
+    """Collects concurrent single calls of one kind and sends them as batch requests."""
+
+    def __init__(self, single_coro, batch_coro, build_batch, *, window: float, max_batch_size: int, group_key = None):
+        self._single_coro = single_coro
+        self._batch_coro = batch_coro
+        self._build_batch = build_batch
+        self._group_key = group_key
+        self._window = window
+        self._max_batch_size = max_batch_size
+        self._pending: Dict[object, List[Tuple[dict, asyncio.Future]]] = {}
+        self._timers: Dict[object, asyncio.TimerHandle] = {}
+        self._tasks = set()
+        self.calls = 0
+        self.requests_sent = 0
+
+    async def submit(self, params: dict):
+        loop = asyncio.get_running_loop()
+        key = self._group_key(params) if self._group_key else None
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((params, future))
+        self.calls += 1
+        if len(pending) >= self._max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self._window, self._flush, key)
+        return await future
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        batch = [item for item in self._pending.pop(key, ()) if not item[1].done()]
+        if not batch:
+            return
+        task = asyncio.create_task(self._send(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, key, batch: List[Tuple[dict, asyncio.Future]]):
+        self.requests_sent += 1
+        try:
+            if len(batch) == 1:
+                params, future = batch[0]
+                result = await self._single_coro(**params)
+                if not future.done():
+                    future.set_result(result)
+                return
+
+            data = await self._batch_coro(**self._build_batch(key, [params for params, _ in batch]))
+            results = data['orders'] if isinstance(data, dict) else data
+            if len(results) != len(batch):
+                raise BitAPIException(
+                    'batch', None, None, 3, 'Batch response has {} results for {} orders'.format(len(results), len(batch))
+                )
+            for (params, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, dict) and result.get('code'):
+                    future.set_exception(BitAPIException('batch', params, None, result['code'], result.get('message', '')))
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def close(self):
+        for key in list(self._pending):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions = True)
+
+
+class OrderCoalescer:
+    """
+    Opt-in layer merging concurrent single order calls into batch requests.
+
+    Calls arriving within ``window`` seconds of the first pending call (or until ``max_batch_size``
+    calls are pending) are sent as one ``spot_new_batch_orders``/``linear_new_batch`` request, or the
+    amend batch equivalents. Each caller gets back its own order result, or a BitAPIException when
+    the exchange rejected that order. A window with a single call is sent through the regular
+    single order endpoint.
+
+    Usage::
+
+        coalescer = OrderCoalescer(rest_client, window = 0.002)
+        order = await coalescer.spot_place_order(pair = 'BTC-USDT', side = 'buy', ...)
+    """
+    BATCH_KEY = 'orders_data'
+
+    def __init__(self, client, *, window: float = 0.001, max_batch_size: int = 20):
+        self.client = client
+        options = dict(window = window, max_batch_size = max_batch_size)
+        self._spot_place = _Coalescer(
+            client.spot_place_order, client.spot_new_batch_orders, self._build_spot_batch, **options,
+        )
+        self._spot_amend = _Coalescer(
+            client.spot_amend_order, client.spot_amend_batch_orders, self._build_spot_batch, **options,
+        )
+        self._linear_place = _Coalescer(
+            client.linear_place_order, client.linear_new_batch, self._build_linear_batch,
+            group_key = linear_currency, **options,
+        )
+        self._linear_amend = _Coalescer(
+            client.linear_amend_order, client.linear_amend_batch, self._build_linear_batch,
+            group_key = linear_currency, **options,
+        )
+
+    def _build_spot_batch(self, key, orders: List[dict]) -> dict:
+        return {self.BATCH_KEY: orders}
+
+    def _build_linear_batch(self, currency, orders: List[dict]) -> dict:
+        return {'currency': currency, self.BATCH_KEY: [
+            {k: v for k, v in order.items() if k != 'currency'} for order in orders
+        ]}
+
+    async def spot_place_order(self, **order_req):
+        return await self._spot_place.submit(order_req)
+
+    async def spot_amend_order(self, **req):
+        return await self._spot_amend.submit(req)
+
+    async def linear_place_order(self, **order_req):
+        return await self._linear_place.submit(order_req)
+
+    async def linear_amend_order(self, **req):
+        return await self._linear_amend.submit(req)
+
+    def stats(self) -> dict:
+        """Number of coalesced calls and of requests actually sent, per kind."""
+        return {
+            name: {'calls': coalescer.calls, 'requests': coalescer.requests_sent}
+            for name, coalescer in (
+                ('spot_place_order', self._spot_place), ('spot_amend_order', self._spot_amend),
+                ('linear_place_order', self._linear_place), ('linear_amend_order', self._linear_amend),
+            )
+        }
+
+    async def close(self):
+        """Send everything still pending and wait for the in-flight batches."""
+        for coalescer in (self._spot_place, self._spot_amend, self._linear_place, self._linear_amend):
+            await coalescer.close()
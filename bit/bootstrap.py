@@ -0,0 +1,181 @@
+"""
+Parallel cold start of a trading session.
+
+Started one step after the other, a session waits for the websocket connection, then the auth
+token, then sends one subscribe message per subscription and fetches its REST snapshots one by one.
+``bootstrap`` overlaps what doesn't depend on each other:
+
+1. connecting the websocket and fetching the auth token, while opening pooled REST connections,
+   loading instruments, measuring the clock offset and fetching the requested REST snapshots run in
+   the background from the start
+2. every subscription, order book and private channel sent as soon as the token is there, in as few
+   subscribe messages as possible, see WebSocketClient.batch_subscriptions. Order books sync from
+   the depth snapshot the exchange sends first
+3. the state reconcile, once the subscriptions are replied to so that no fill between its REST
+   snapshot and the stream is missed, StateTracker ignores fills its snapshot already contains
+
+The returned Session holds the clients and results, and the seconds from start at which each step
+was done in ``timings``.
+
+Usage::
+
+    session = await bootstrap(
+        api_key, api_secret, order_books = ['BTC-USDT'], spot_pairs = ['BTC-USDT'],
+        subscriptions = [{'coro': on_trade, 'channels': ['trade'], 'pairs': ['BTC-USDT']}],
+        snapshots = ['accounts'],
+    )
+    print(session.timings)
+"""
+import asyncio
+import contextlib
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Union
+
+from bit.instruments import InstrumentCache
+from bit.rest_client import RestClient
+from bit.web_socket_client import WebSocketClient
+
+# REST snapshots available by name, each a coroutine function of the RestClient
+SNAPSHOTS: Dict[str, Callable[[RestClient], Awaitable]] = {
+    'accounts': lambda client: client.um_query_accounts(),
+    'spot_open_orders': lambda client: client.spot_query_open_orders(),
+    'linear_open_orders': lambda client: client.linear_query_open_orders(),
+    'linear_positions': lambda client: client.linear_query_positions(),
+}
+
+
+class Session:
+    """Clients and snapshots of a bootstrapped session, see bootstrap."""
+
+    def __init__(self, ws_client: WebSocketClient, rest_client: RestClient, *, instruments = None, clock = None):
+        self.ws_client = ws_client
+        self.rest_client = rest_client
+        self.instruments: Optional[InstrumentCache] = instruments
+        self.clock = clock
+        # Snapshot name -> result
+        self.snapshots: Dict[str, object] = {}
+        # Step -> seconds from the start of the bootstrap until it was done
+        self.timings: Dict[str, float] = {}
+
+    @property
+    def order_books(self):
+        return self.ws_client.order_books
+
+    @property
+    def state(self):
+        return self.ws_client.state
+
+    async def close(self):
+        """Close the clients, the websocket client closes the RestClient."""
+        if self.clock is not None:
+            await self.clock.close()
+        if self.instruments is not None:
+            await self.instruments.close()
+        await self.ws_client.close()
+
+
+async def bootstrap(
+    api_key, api_secret, *, subscriptions: Iterable[dict] = (), order_books: Iterable[str] = (),
+    spot_pairs: Iterable[str] = (), linear_pairs: Iterable[str] = (), um_account: bool = False,
+    snapshots: Union[Iterable[str], Dict[str, Callable[[RestClient], Awaitable]]] = (),
+    instruments: Union[bool, InstrumentCache] = False, clock = None, warm_up: bool = True,
+    timeout: float = 10, rest_kwargs: Optional[dict] = None, **client_kwargs,
+) -> Session:
+    """
+    Start a session, see the module docstring.
+
+    :param subscriptions: keyword arguments of WebSocketClient.subscribe calls
+    :param order_books: pairs of local order books, see WebSocketClient.subscribe_order_book
+    :param spot_pairs: spot pairs of the order and fill state, see WebSocketClient.track_state
+    :param linear_pairs: linear pairs of the order, fill and position state
+    :param um_account: also keep the um_account channel in the state
+    :param snapshots: names of SNAPSHOTS, or name -> coroutine function of the RestClient
+    :param instruments: load an InstrumentCache, or the one given, and normalize orders with it
+    :param clock: optional bit.clock.ClockSync, synced in the background
+    :param warm_up: open the pooled REST connections, see RestClient.warm_up
+    :param timeout: seconds each step may take
+    :param rest_kwargs: keyword arguments of the RestClient, base URL from rest_url
+    :param client_kwargs: keyword arguments of the WebSocketClient
+    """
+    log = logging.getLogger(__name__)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    if instruments is True:
+        instruments = InstrumentCache()
+    rest_client = RestClient(
+        api_key, api_secret, client_kwargs.get('rest_url') or RestClient.API_URL,
+        instruments = instruments or None, clock = clock, **(rest_kwargs or {}),
+    )
+    # The websocket starts connecting right away
+    ws_client = WebSocketClient(api_key, api_secret, clock = clock, rest_client = rest_client, **client_kwargs)
+    session = Session(ws_client, rest_client, instruments = instruments or None, clock = clock)
+    timings = session.timings
+
+    async def step(name: str, coro):
+        result = await asyncio.wait_for(coro, timeout)
+        timings[name] = loop.time() - start
+        return result
+
+    background = None
+    try:
+        if not isinstance(snapshots, dict):
+            snapshots = {name: SNAPSHOTS[name] for name in snapshots}
+        # Nothing in the background depends on the stream
+        background = [step(name, _snapshot(session, name, fetch)) for name, fetch in snapshots.items()]
+        if clock is not None:
+            clock.start(rest_client)
+            background.append(step('clock', clock.synced.wait()))
+        if warm_up:
+            # The token, snapshot, instrument and clock requests open connections of their own, warming
+            # up the whole pool would queue them behind the warm up requests
+            busy = 1 + len(snapshots) + bool(instruments) + (clock is not None)
+            background.append(step('warm_up', rest_client.warm_up(max(rest_client.pool_size - busy, 1))))
+        if instruments:
+            background.append(step('instruments', instruments.start(rest_client)))
+        background = asyncio.gather(*background)
+
+        await asyncio.gather(step('connect', ws_client.ws.connected.wait()), step('token', ws_client.fetch_token()))
+
+        order_books = list(order_books)
+        spot_pairs, linear_pairs = list(spot_pairs), list(linear_pairs)
+        track_state = bool(spot_pairs or linear_pairs or um_account)
+        async with ws_client.batch_subscriptions():
+            for subscription in subscriptions:
+                await ws_client.subscribe(**subscription)
+            if order_books:
+                await ws_client.subscribe_order_book(pairs = order_books)
+            if track_state:
+                await ws_client.track_state(
+                    spot_pairs = spot_pairs, linear_pairs = linear_pairs, um_account = um_account, reconcile = False,
+                )
+        timings['subscribe'] = loop.time() - start
+
+        streaming = []
+        if order_books:
+            streaming.append(step('order_books', ws_client.order_books.wait_synced(order_books)))
+        if subscriptions or order_books:
+            streaming.append(step('first_update', ws_client.first_data.wait()))
+        if track_state:
+            streaming.append(_reconcile(ws_client, step))
+        await asyncio.gather(background, *streaming)
+    except BaseException:
+        if background is not None:
+            background.cancel()
+            with contextlib.suppress(BaseException):
+                await background
+        await session.close()
+        raise
+    timings['total'] = loop.time() - start
+    log.info('Session started in %.3f s: %s', timings['total'], ', '.join(
+        '{} {:.3f}'.format(name, seconds) for name, seconds in timings.items() if name != 'total'
+    ))
+    return session
+
+
+async def _reconcile(ws_client: WebSocketClient, step):
+    await step('subscribed', ws_client.wait_subscribed())
+    await step('state', ws_client.state.reconcile())
+
+
+async def _snapshot(session: Session, name: str, fetch):
+    session.snapshots[name] = await fetch(session.rest_client)
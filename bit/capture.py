@@ -0,0 +1,244 @@
+"""
+Capture of raw websocket frames to append-only files and their replay.
+
+A capture file starts with a header of ``MAGIC`` followed by the wall clock and monotonic clock at
+creation, both ``<q`` nanoseconds. Then every frame is a ``<qIB`` record header, the monotonic
+receive time in nanoseconds, the payload length and its kind (0 for text, 1 for binary frames),
+followed by the payload. Files are only appended to, a record cut short by a crash is skipped on
+replay.
+
+Monotonic clocks of different processes or boots aren't comparable, so frames are read back with
+their receive time rebased on the wall clock of their file header. File names carry the pid and are
+created exclusively, recorders sharing a directory never write to the same file.
+"""
+import asyncio
+import glob
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple, Union
+
+MAGIC = b'BITCAP1\n'
+FILE_HEADER = struct.Struct('<qq')
+RECORD_HEADER = struct.Struct('<qIB')
+TEXT = 0
+BINARY = 1
+SUFFIX = '.cap'
+
+
+class FrameRecorder:
+    """
+    Tees raw frames into capture files in a directory, rotated by size.
+
+    ``record`` only timestamps the frame and puts it on a queue, encoding and file writes happen on a
+    background thread so the event loop never waits for the disk. The queue isn't bounded, a disk
+    slower than the stream shows up as memory growth and in ``pending``.
+    """
+    # Max seconds between a frame being recorded and written out to the file
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, directory: str, *, prefix: str = 'frames', max_file_size: int = 256 * 2 ** 20, max_files: Optional[int] = None):
+        """
+        :param max_file_size: size in bytes after which a new file is started
+        :param max_files: number of files to keep, the oldest are deleted. All are kept when None.
+        """
+        self._log = logging.getLogger(__name__)
+        self.directory = directory
+        self.prefix = prefix
+        self.max_file_size = max_file_size
+        self.max_files = max_files
+        self.frames = 0
+        self.bytes = 0
+        self.files: List[str] = []
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._file_size = 0
+        self._sequence = 0
+        os.makedirs(directory, exist_ok = True)
+        self._thread = threading.Thread(target = self._write_loop, name = 'bit-frame-recorder', daemon = True)
+        self._thread.start()
+
+    def record(self, frame: Union[str, bytes]):
+        self._queue.put((time.monotonic_ns(), frame))
+
+    @property
+    def pending(self) -> int:
+        """Frames recorded but not written yet."""
+        return self._queue.qsize()
+
+    def _write_loop(self):
+        closing = False
+        while not closing:
+            try:
+                items = [self._queue.get(timeout = self.FLUSH_INTERVAL)]
+            except queue.Empty:
+                if self._file is not None:
+                    self._file.flush()
+                continue
+            # Drain whatever else is queued to write it in one go
+            with_more = True
+            while with_more:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    with_more = False
+            if items[-1] is None:
+                closing = True
+                items.pop()
+            try:
+                self._write(items)
+            except Exception:
+                self._log.exception('Writing %d frames failed', len(items))
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, items):
+        chunks = []
+        size = 0
+        for timestamp, frame in items:
+            if frame is None:
+                continue
+            if type(frame) is str:
+                payload = frame.encode()
+                kind = TEXT
+            else:
+                payload = bytes(frame)
+                kind = BINARY
+            chunks.append(RECORD_HEADER.pack(timestamp, len(payload), kind))
+            chunks.append(payload)
+            size += RECORD_HEADER.size + len(payload)
+            self.frames += 1
+            if self._file is None or self._file_size + size >= self.max_file_size:
+                self._flush_chunks(chunks, size)
+                chunks = []
+                size = 0
+        self._flush_chunks(chunks, size)
+
+    def _flush_chunks(self, chunks, size):
+        if not chunks:
+            return
+        if self._file is None or self._file_size >= self.max_file_size:
+            self._rotate()
+        self._file.write(b''.join(chunks))
+        self._file_size += size
+        self.bytes += size
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        while True:
+            self._sequence += 1
+            name = '{}-{}-{}-{:04d}{}'.format(self.prefix, stamp, os.getpid(), self._sequence, SUFFIX)
+            path = os.path.join(self.directory, name)
+            try:
+                self._file = open(path, 'xb')
+            except FileExistsError:
+                # Taken by another recorder of this process with the same prefix
+                continue
+            break
+        self._file.write(MAGIC + FILE_HEADER.pack(time.time_ns(), time.monotonic_ns()))
+        self._file_size = len(MAGIC) + FILE_HEADER.size
+        self.files.append(path)
+        self._log.info('Capturing frames to %s', path)
+        while self.max_files and len(self.files) > self.max_files:
+            old = self.files.pop(0)
+            try:
+                os.remove(old)
+            except OSError:
+                self._log.warning('Cannot remove old capture file %s', old)
+
+    async def close(self):
+        """Write out all recorded frames and close the file, the writer thread is joined off the event loop."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            await asyncio.to_thread(self._thread.join)
+
+
+def _start_time(path: str) -> int:
+    """Wall clock time in nanoseconds from the header of a capture file, 0 when it has none."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(len(MAGIC) + FILE_HEADER.size)
+    except OSError:
+        return 0
+    if len(header) < len(MAGIC) + FILE_HEADER.size or not header.startswith(MAGIC):
+        return 0
+    return FILE_HEADER.unpack_from(header, len(MAGIC))[0]
+
+
+class ReplaySource:
+    """
+    Frames of capture files, read through memory maps so that files don't have to fit in memory.
+
+    :param paths: capture file, directory of capture files or list of files, replayed in the order of the
+        wall clock times in their headers
+    :param speed: 1 replays at the recorded pace, 2 twice as fast and so on, None as fast as possible
+    """
+    # Frames fed between yields to the event loop when replaying as fast as possible
+    YIELD_EVERY = 100
+
+    def __init__(self, paths: Union[str, List[str]], *, speed: Optional[float] = 1.0):
+        self._log = logging.getLogger(__name__)
+        if isinstance(paths, str):
+            paths = glob.glob(os.path.join(paths, '*' + SUFFIX)) if os.path.isdir(paths) else [paths]
+        # File names of several recorders or past 9999 rotations don't sort by time
+        self.paths = sorted(paths, key = lambda path: (_start_time(path), path))
+        self.speed = speed
+        self.frames_replayed = 0
+
+    def frames(self) -> Iterator[Tuple[int, Union[str, bytes]]]:
+        """(wall clock receive time in nanoseconds, frame) of all files, text frames as str."""
+        for path in self.paths:
+            yield from self._read(path)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < len(MAGIC) + FILE_HEADER.size:
+                self._log.warning('Skipping empty capture file %s', path)
+                return
+            with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+                if mm[:len(MAGIC)] != MAGIC:
+                    raise ValueError('{} is not a capture file'.format(path))
+                wall_ns, monotonic_ns = FILE_HEADER.unpack_from(mm, len(MAGIC))
+                base = wall_ns - monotonic_ns
+                offset = len(MAGIC) + FILE_HEADER.size
+                end = len(mm)
+                unpack_from = RECORD_HEADER.unpack_from
+                header_size = RECORD_HEADER.size
+                while offset + header_size <= end:
+                    timestamp, length, kind = unpack_from(mm, offset)
+                    offset += header_size
+                    if offset + length > end:
+                        self._log.warning('Truncated frame at the end of %s', path)
+                        return
+                    payload = mm[offset:offset + length]
+                    offset += length
+                    yield base + timestamp, payload.decode() if kind == TEXT else payload
+
+    async def replay(self, ws):
+        """
+        Feed the frames to a websocket, usually ``client.ws`` of a WebSocketClient created with
+        ``offline=True``, through its ``feed`` method as if they were received.
+        """
+        loop = asyncio.get_event_loop()
+        speed = self.speed
+        start = None
+        first = None
+        for timestamp, frame in self.frames():
+            if speed:
+                if start is None:
+                    start = loop.time()
+                    first = timestamp
+                delay = start + (timestamp - first) / 1e9 / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif self.frames_replayed % self.YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+            await ws.feed(frame)
+            self.frames_replayed += 1
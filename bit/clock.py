@@ -0,0 +1,129 @@
+"""
+Exchange clock offset and round trip time, estimated NTP style from REST responses.
+
+Every REST response envelope carries the exchange time it was answered at (``timestamp``, in
+milliseconds). With t0 and t1 the local wall clock times the request was sent and its response
+received, the exchange clock is ahead of the local one by ``timestamp - (t0 + t1) / 2``, up to half
+the round trip ``t1 - t0``. Requests waiting for a pooled connection, opening one or answered slowly
+have long round trips and asymmetric delays, so ``ClockSync`` keeps the recent samples and takes the
+median offset of the quarter with the shortest round trips, samples above ``max_rtt`` are dropped.
+
+A RestClient created with ``clock = ClockSync()`` samples every response and corrects the timestamps
+it signs requests with, a WebSocketClient with the same clock corrects the exchange latency of
+incoming messages. ``start`` probes ``spot_system_time`` until the first estimate and then
+periodically, so the offset keeps up with drift when the client is idle.
+"""
+import asyncio
+import collections
+import contextlib
+import logging
+import time
+from typing import Optional
+
+from bit.metrics import Histogram
+
+
+class ClockSync:
+    # Samples kept, and seconds after which a sample is dropped
+    WINDOW = 64
+    MAX_AGE = 600
+    # Share of the kept samples with the shortest round trip the offset is taken from
+    BEST = 0.25
+    # Seconds above which a round trip is too long to be a useful sample
+    MAX_RTT = 1.0
+    # System time requests sent by start before the first estimate, and seconds between probes then
+    BURST = 8
+    INTERVAL = 30
+
+    def __init__(self, *, window: int = WINDOW, max_age: float = MAX_AGE, max_rtt: float = MAX_RTT):
+        self._log = logging.getLogger(__name__)
+        self.max_age = max_age
+        self.max_rtt = max_rtt
+        # (rtt, offset, receive time) in seconds
+        self._samples = collections.deque(maxlen = window)
+        # Seconds the exchange clock is ahead of the local one
+        self.offset = 0.0
+        # Upper bound of the offset error: half the longest round trip of the samples it is taken from
+        self.error: Optional[float] = None
+        self.rtt = Histogram()
+        self.rejected = 0
+        self.synced = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def sample(self, sent: float, received: float, server_ms):
+        """
+        Add a request sent and answered at the local wall clock times sent and received (seconds),
+        answered by the exchange at server_ms.
+        """
+        rtt = received - sent
+        if not 0 <= rtt <= self.max_rtt:
+            self.rejected += 1
+            return
+        self.rtt.record(rtt)
+        self._samples.append((rtt, server_ms / 1000 - (sent + received) / 2, received))
+        self._estimate(received)
+
+    def _estimate(self, now: float):
+        samples = self._samples
+        while samples[0][2] < now - self.max_age:
+            samples.popleft()
+        best = sorted(samples)[:max(1, int(len(samples) * self.BEST))]
+        offsets = sorted(offset for _, offset, _ in best)
+        middle = len(offsets) // 2
+        self.offset = offsets[middle] if len(offsets) % 2 else (offsets[middle - 1] + offsets[middle]) / 2
+        # Exchange timestamps have millisecond resolution
+        self.error = best[-1][0] / 2 + 0.0005
+
+    def now(self) -> float:
+        """Exchange time in seconds."""
+        return time.time() + self.offset
+
+    def now_ms(self) -> int:
+        """Exchange time in milliseconds, as used for request timestamps."""
+        return int(round((time.time() + self.offset) * 1000))
+
+    def to_local(self, server_ms) -> float:
+        """Local wall clock time in seconds of an exchange timestamp in milliseconds."""
+        return server_ms / 1000 - self.offset
+
+    def stats(self) -> dict:
+        """Offset and its error bound, round trip percentiles in seconds, samples kept and rejected."""
+        return {
+            'offset': self.offset, 'error': self.error, 'samples': len(self._samples), 'rejected': self.rejected,
+            'rtt_min': self.rtt.min if self.rtt.count else None, 'rtt_p50': self.rtt.percentile(50),
+            'rtt_p90': self.rtt.percentile(90), 'rtt_p99': self.rtt.percentile(99),
+        }
+
+    def start(self, rest_client, *, interval: float = INTERVAL):
+        """
+        Probe the exchange time in the background with rest_client, which gets this clock when it has none.
+        Await synced for the first estimate.
+
+        :raises ValueError: when rest_client already has another clock, which would get the samples instead
+        """
+        if rest_client.clock is None:
+            rest_client.clock = self
+        elif rest_client.clock is not self:
+            raise ValueError('RestClient already has another clock')
+        if self._task is None:
+            self._task = asyncio.create_task(self._probe_loop(rest_client, interval))
+
+    async def _probe_loop(self, rest_client, interval: float):
+        while True:
+            # One at a time, concurrent probes would wait for each other's connection
+            for _ in range(self.BURST if not self.synced.is_set() else 1):
+                try:
+                    await rest_client.spot_system_time()
+                except Exception as e:
+                    self._log.warning('Clock probe failed: %r', e)
+            if self._samples and not self.synced.is_set():
+                self._log.info('Exchange clock offset %.2f ms +- %.2f ms', self.offset * 1e3, self.error * 1e3)
+                self.synced.set()
+            await asyncio.sleep(interval if self.synced.is_set() else 1)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
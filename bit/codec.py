@@ -0,0 +1,162 @@
+"""
+JSON codecs used for websocket frames and REST responses.
+
+The backend can be picked by name: ``orjson``, ``msgspec``, ``ujson`` or the standard library
+``json``. By default the first available of ``DEFAULT_BACKENDS`` is used, ujson as before. orjson
+and msgspec are opt-in, installed with the ``orjson`` and ``msgspec`` extras and selected by name with
+the ``codec`` argument of the clients or ``set_default_codec``. A backend which isn't installed falls
+back to the default ones. All codecs decode ``str`` and ``bytes`` directly, raise ``ValueError`` on
+invalid input and encode to ``str``.
+"""
+import json
+import logging
+import re
+from typing import Callable, Optional, Tuple
+
+BACKENDS = ('orjson', 'msgspec', 'ujson', 'json')
+DEFAULT_BACKENDS = ('ujson', 'json')
+
+
+class Codec:
+    __slots__ = ('name', 'loads', 'dumps')
+
+    def __init__(self, name: str, loads: Callable, dumps: Callable):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return '<Codec {}>'.format(self.name)
+
+
+def _orjson_codec() -> Codec:
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode()
+    return Codec('orjson', orjson.loads, dumps)
+
+
+def _msgspec_codec() -> Codec:
+    import msgspec
+    decode = msgspec.json.decode
+    encode = msgspec.json.encode
+    DecodeError = msgspec.DecodeError
+
+    def loads(raw):
+        try:
+            return decode(raw)
+        except DecodeError as e:
+            raise ValueError(str(e)) from e
+
+    def dumps(obj):
+        return encode(obj).decode()
+    return Codec('msgspec', loads, dumps)
+
+
+def _ujson_codec() -> Codec:
+    import ujson
+    return Codec('ujson', ujson.loads, ujson.dumps)
+
+
+def _json_codec() -> Codec:
+    return Codec('json', json.loads, json.dumps)
+
+
+_FACTORIES = {
+    'orjson': _orjson_codec,
+    'msgspec': _msgspec_codec,
+    'ujson': _ujson_codec,
+    'json': _json_codec,
+}
+_codecs = {}
+_default: Optional[Codec] = None
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """
+    Codec of the given backend, or the default one.
+
+    When the requested backend isn't installed the next available of DEFAULT_BACKENDS is returned.
+    """
+    global _default
+    if name is None:
+        if _default is None:
+            _default = _load(DEFAULT_BACKENDS)
+        return _default
+    if name not in _FACTORIES:
+        raise ValueError('Unknown codec {}, use one of {}'.format(name, ', '.join(_FACTORIES)))
+    return _load((name,) + DEFAULT_BACKENDS)
+
+
+def set_default_codec(name: str) -> Codec:
+    """Set the codec used by clients created without an explicit codec."""
+    global _default
+    _default = get_codec(name)
+    return _default
+
+
+def _load(names) -> Codec:
+    for name in names:
+        codec = _codecs.get(name)
+        if codec is not None:
+            return codec
+        try:
+            codec = _codecs[name] = _FACTORIES[name]()
+        except ImportError:
+            logging.getLogger(__name__).debug('JSON backend %s not installed', name)
+            continue
+        return codec
+    raise ImportError('No JSON backend available')
+
+
+_CHANNEL_RE = re.compile(r'"channel"\s*:\s*"([^"]*)"')
+_PAIR_RE = re.compile(r'"data"\s*:\s*\{[^{}\[\]]*?"pair"\s*:\s*"([^"]*)"')
+_CHANNEL_RE_BYTES = re.compile(_CHANNEL_RE.pattern.encode())
+_PAIR_RE_BYTES = re.compile(_PAIR_RE.pattern.encode())
+_NESTED = re.compile(r'[{}\[\]]')
+_NESTED_BYTES = re.compile(rb'[{}\[\]]')
+
+
+def peek_envelope(raw) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Read ``channel`` and the ``pair`` of the ``data`` object from a raw frame without decoding it.
+
+    ``pair`` is only found when ``data`` is an object having ``pair`` before any nested container,
+    which is how market data updates are laid out, otherwise None is returned for it. Keys may come
+    in any order. Compact JSON is scanned with plain substring searches, whitespace around the colons
+    falls back to regular expressions. Bytes frames are scanned as bytes. A frame without a channel
+    gives (None, None) and has to be decoded fully.
+    """
+    if isinstance(raw, str):
+        channel, pair = _peek(raw, '"channel":"', '"data":{', '"pair":"', '"', _NESTED, _CHANNEL_RE, _PAIR_RE)
+    else:
+        channel, pair = _peek(raw, b'"channel":"', b'"data":{', b'"pair":"', b'"', _NESTED_BYTES, _CHANNEL_RE_BYTES, _PAIR_RE_BYTES)
+        channel = channel.decode() if channel is not None else None
+        pair = pair.decode() if pair is not None else None
+    return channel, pair
+
+
+def _peek(raw, channel_key, data_key, pair_key, quote, nested_re, channel_re, pair_re):
+    start = raw.find(channel_key)
+    if start < 0:
+        match = channel_re.search(raw)
+        if match is None:
+            return None, None
+        channel = match.group(1)
+    else:
+        start += len(channel_key)
+        channel = raw[start:raw.find(quote, start)]
+
+    data = raw.find(data_key)
+    if data >= 0:
+        data += len(data_key)
+        pair = raw.find(pair_key, data)
+        if pair >= 0:
+            # The pair has to belong to the data object itself, not to a nested one
+            if nested_re.search(raw, data, pair) is not None:
+                return channel, None
+            pair += len(pair_key)
+            return channel, raw[pair:raw.find(quote, pair)]
+    match = pair_re.search(raw)
+    return channel, match.group(1) if match is not None else None
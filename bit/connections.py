@@ -0,0 +1,123 @@
+"""
+Connection pool tuning for the aiosonic REST session and socket options for the websocket.
+
+aiosonic 0.16 never reuses a pooled connection: ``Connection._connect`` compares against
+``writer.is_closing`` without calling it, so every request opens a new TCP (and TLS) connection.
+``TunedConnection`` fixes the check, treats connections the server closed (EOF read) as gone and
+applies ``tune_socket`` to new sockets. ``TunedConnector`` counts created and reused connections,
+gives the pool slot of a request cancelled while connecting back and doesn't recycle connections
+after ``conn_max_requests`` (100 in aiosonic).
+"""
+import socket
+import time
+from typing import Optional
+
+import aiosonic
+from aiosonic.connection import Connection
+
+# Seconds without traffic before TCP keepalive probes start, between probes and probes before the
+# connection is dropped. Keeps NAT and load balancer state of quiet connections alive.
+KEEPALIVE_IDLE = 30
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_PROBES = 3
+
+
+def tune_socket(sock: Optional[socket.socket], *, nodelay: bool = True, keepalive: bool = True):
+    """Disable Nagle's algorithm and enable TCP keepalive probes on a TCP socket."""
+    if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+        return
+    try:
+        if nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if keepalive:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            # Linux names, macOS only has TCP_KEEPALIVE for the idle time
+            for option, value in (('TCP_KEEPIDLE', KEEPALIVE_IDLE), ('TCP_KEEPINTVL', KEEPALIVE_INTERVAL), ('TCP_KEEPCNT', KEEPALIVE_PROBES)):
+                if hasattr(socket, option):
+                    sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+    except OSError:
+        # Closed meanwhile
+        pass
+
+
+class PoolStats:
+    __slots__ = ('created', 'reused', 'requests')
+
+    def __init__(self):
+        # Connections opened, requests sent over an already open connection and requests in total
+        self.created = 0
+        self.reused = 0
+        self.requests = 0
+
+
+class TunedConnection(Connection):
+    """aiosonic Connection reusing its open socket and tuning new ones."""
+
+    def __init__(self, connector):
+        super().__init__(connector)
+        # monotonic time of the last release, 0 when never used
+        self.last_used = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return (
+            self.writer is not None and not self.writer.is_closing()
+            and self.reader is not None and not self.reader.at_eof()
+        )
+
+    async def connect(self, urlparsed, dns_info, verify, ssl_context, http2 = False):
+        stats = self.connector.stats
+        stats.requests += 1
+        key = '{}-{}'.format(urlparsed.hostname, urlparsed.port)
+        if self.key == key and self.is_open:
+            stats.reused += 1
+            self.temp_key = key
+            return
+        # Drop the key so that the aiosonic logic opens a new connection
+        self.key = None
+        await super().connect(urlparsed, dns_info, verify, ssl_context, http2)
+        stats.created += 1
+        tune_socket(self.writer.get_extra_info('socket'), nodelay = self.connector.nodelay)
+
+    async def release(self):
+        self.last_used = time.monotonic()
+        await super().release()
+
+
+class TunedConnector(aiosonic.TCPConnector):
+    """TCPConnector of TunedConnection with pool statistics."""
+
+    def __init__(self, pool_size: int = 10, timeouts = None, *, nodelay: bool = True, conn_max_requests: int = 1000000, **kwargs):
+        self.stats = PoolStats()
+        self.nodelay = nodelay
+        super().__init__(pool_size, timeouts, connection_cls = TunedConnection, conn_max_requests = conn_max_requests, **kwargs)
+
+    async def after_acquire(self, urlparsed, conn, verify, ssl, timeouts, http2):
+        try:
+            return await super().after_acquire(urlparsed, conn, verify, ssl, timeouts, http2)
+        except BaseException:
+            # aiosonic keeps the pool slot of a connection failing or cancelled while connecting
+            conn.key = None
+            conn.close()
+            await self.release(conn)
+            raise
+
+    def connections(self) -> list:
+        """Connections waiting in the pool, the ones in use are not listed."""
+        return list(self.pool.pool)
+
+    def pool_stats(self) -> dict:
+        free = self.connections()
+        return {
+            'size': self.pool_size,
+            'in_use': self.pool_size - len(free),
+            'idle': sum(1 for connection in free if connection.is_open),
+            'created': self.stats.created,
+            'reused': self.stats.reused,
+            'requests': self.stats.requests,
+        }
+
+    def idle_connections(self, older_than: float) -> int:
+        """Open connections waiting in the pool, unused for older_than seconds."""
+        deadline = time.monotonic() - older_than
+        return sum(1 for connection in self.connections() if connection.is_open and connection.last_used < deadline)
@@ -0,0 +1,116 @@
+import asyncio
+import collections
+import contextlib
+import logging
+from typing import Optional
+
+
+class DeliveryPolicy:
+    """How messages wait for a subscriber which doesn't keep up with the socket."""
+    # Keep every message
+    UNBOUNDED = 'unbounded'
+    # Keep at most max_queue messages, dropping the oldest ones
+    DROP_OLDEST = 'drop_oldest'
+    # Keep only the latest pending message per (channel, pair) of CONFLATED_CHANNELS, queue the rest
+    CONFLATE = 'conflate'
+
+    ALL = (UNBOUNDED, DROP_OLDEST, CONFLATE)
+
+
+# Channels whose messages carry the full current state, so older pending ones can be skipped
+CONFLATED_CHANNELS = frozenset(('depth', 'depth1', 'ticker'))
+
+
+class Mailbox:
+    """
+    Queue in front of one subscriber coroutine, drained by its own task.
+
+    ``put`` never blocks, so a slow subscriber doesn't hold up the websocket receive loop nor the
+    other subscribers. Messages are delivered in arrival order; with the conflate policy a pending
+    message of a conflated channel is replaced in place by newer data of the same pair.
+    """
+
+    def __init__(self, coro, policy: str = DeliveryPolicy.UNBOUNDED, max_queue: Optional[int] = None):
+        if policy not in DeliveryPolicy.ALL:
+            raise ValueError('Unknown delivery policy {}'.format(policy))
+        if policy == DeliveryPolicy.DROP_OLDEST and not max_queue:
+            raise ValueError('Drop oldest delivery policy needs max_queue')
+        self._log = logging.getLogger(__name__)
+        self.coro = coro
+        self.policy = policy
+        self.max_queue = max_queue
+        # Entries are [channel, pair, data] lists so that conflation can replace data in place
+        self._queue = collections.deque()
+        self._pending = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.delivered = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.max_queued = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def put(self, channel, pair, data):
+        if self.policy == DeliveryPolicy.CONFLATE and channel in CONFLATED_CHANNELS:
+            entry = self._pending.get((channel, pair))
+            if entry is not None:
+                entry[2] = data
+                self.conflated += 1
+                return
+            entry = self._pending[(channel, pair)] = [channel, pair, data]
+        else:
+            entry = [channel, pair, data]
+
+        queue = self._queue
+        if self.max_queue and len(queue) >= self.max_queue:
+            self._forget(queue.popleft())
+            self.dropped += 1
+        queue.append(entry)
+        if len(queue) > self.max_queued:
+            self.max_queued = len(queue)
+        self._wakeup.set()
+
+    def _forget(self, entry):
+        if self._pending and self._pending.get((entry[0], entry[1])) is entry:
+            del self._pending[(entry[0], entry[1])]
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            if not queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            entry = queue.popleft()
+            self._forget(entry)
+            channel, pair, data = entry
+            try:
+                await self.coro(channel, pair, data)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._log.exception('Subscriber %r failed on %s %s', self.coro, channel, pair)
+            self.delivered += 1
+
+    def __len__(self):
+        return len(self._queue)
+
+    def stats(self) -> dict:
+        return {
+            'policy': self.policy,
+            'queued': len(self._queue),
+            'max_queued': self.max_queued,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'conflated': self.conflated,
+        }
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
@@ -13,3 +13,10 @@ class BitAPIException(Exception):
 class SubscribeException(BitAPIException):
     def __init__(self, code, message):
         super().__init__('websocket', '', None, code, message)
+
+
+class OrderValidationException(BitAPIException):
+    """Order rejected locally by instrument checks, before it was sent."""
+
+    def __init__(self, params, message):
+        super().__init__('local', params, None, 400, message)
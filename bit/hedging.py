@@ -0,0 +1,159 @@
+"""
+Hedged requests: a second attempt of a slow request, the first response wins.
+
+``HedgePolicy`` learns a latency histogram per endpoint. When an attempt hasn't answered after the
+configured percentile of its endpoint, a second attempt is started, which gets another pooled
+connection since the first one is still busy, and the loser is cancelled. Hedges are capped by a
+budget relative to the requests sent, so a slow exchange doesn't get twice the load.
+
+RestClient(hedge=HedgePolicy()) hedges GET queries. Orders are only hedged with ``orders=True`` and
+when they carry a client ``label`` identifying the order. Their losing attempt isn't cancelled, it may
+have reached the exchange already. Once every attempt finished, failed ones included since a timed
+out request may still have placed its order, the orders with the label are queried and all but the
+one returned to the caller are cancelled, again ``recheck_delay`` seconds later when an attempt
+failed. A duplicate can still fill before its cancel arrives, which is logged as an error.
+"""
+import asyncio
+import contextlib
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from bit.metrics import Histogram
+
+
+class HedgePolicy:
+    # Samples of an endpoint needed before its percentile is trusted, max_delay is used until then
+    MIN_SAMPLES = 20
+
+    def __init__(
+        self, *, percentile: float = 95, min_delay: float = 0.005, max_delay: float = 1.0,
+        budget: float = 0.05, burst: int = 10, paths: Optional[Iterable[str]] = None, orders: bool = False,
+        recheck_delay: float = 2.0,
+    ):
+        """
+        :param percentile: latency percentile of the endpoint after which the second attempt is sent
+        :param min_delay: seconds waited at least before hedging
+        :param max_delay: seconds waited at most before hedging, also the delay while learning
+        :param budget: hedges allowed as a fraction of the requests sent
+        :param burst: hedges allowed on top of the budget, e.g. right after start
+        :param paths: endpoint paths to hedge, all GET endpoints by default
+        :param orders: also hedge order placements carrying a label, see the module docstring
+        :param recheck_delay: seconds after which the duplicates of a hedged order are looked for again
+            when one of its attempts failed
+        """
+        self._log = logging.getLogger(__name__)
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.burst = burst
+        self.paths = frozenset(paths) if paths is not None else None
+        self.orders = orders
+        self.recheck_delay = recheck_delay
+        self.latencies: Dict[str, Histogram] = {}
+        self.requests = 0
+        self.hedges = 0
+        # Hedges answered first by the second attempt
+        self.wins = 0
+        self.duplicates = 0
+        self._background = set()
+
+    def delay(self, key: str) -> float:
+        """Seconds the first attempt of key gets before the second one is sent."""
+        histogram = self.latencies.get(key)
+        if histogram is None or histogram.count < self.MIN_SAMPLES:
+            return self.max_delay
+        return min(max(histogram.percentile(self.percentile), self.min_delay), self.max_delay)
+
+    def _allowed(self) -> bool:
+        return self.hedges < self.budget * self.requests + self.burst
+
+    def _record(self, key: str, elapsed: float):
+        histogram = self.latencies.get(key)
+        if histogram is None:
+            histogram = self.latencies[key] = Histogram()
+        histogram.record(elapsed)
+
+    async def run(self, key: str, attempt: Callable[[], Awaitable], settle: Optional[Callable[[object], Awaitable]] = None):
+        """
+        Run attempt(), a second one when the first is slow, and return the first successful result.
+
+        :param key: endpoint the latencies are learned for
+        :param attempt: coroutine function sending the request once
+        :param settle: for non idempotent requests: attempts aren't cancelled and once all attempts of
+            a hedged request finished, settle(kept) is awaited with the result returned to the caller,
+            None when the caller got none. It undoes the other attempts and returns how many it found.
+        """
+        loop = asyncio.get_event_loop()
+        self.requests += 1
+        start = loop.time()
+        first = asyncio.ensure_future(attempt())
+        attempts = [first]
+        kept = None
+        try:
+            done, _ = await asyncio.wait(attempts, timeout = self.delay(key))
+            if done or not self._allowed():
+                result = await first
+                self._record(key, loop.time() - start)
+                return result
+
+            self.hedges += 1
+            second_start = loop.time()
+            second = asyncio.ensure_future(attempt())
+            attempts.append(second)
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    if task is second:
+                        self.wins += 1
+                        self._record(key, loop.time() - second_start)
+                    else:
+                        self._record(key, loop.time() - start)
+                    kept = task.result()
+                    return kept
+            raise error
+        finally:
+            if settle is None:
+                # Losers, or all attempts when cancelled
+                for task in attempts:
+                    task.cancel()
+                for task in attempts:
+                    with contextlib.suppress(asyncio.CancelledError, Exception):
+                        await task
+            elif len(attempts) > 1 or not first.done():
+                self._settle_later(key, attempts, settle, kept)
+
+    def _settle_later(self, key: str, attempts, settle, kept):
+        async def watch():
+            results = await asyncio.gather(*attempts, return_exceptions = True)
+            if len(attempts) < 2:
+                # Not hedged, the caller was cancelled while the only attempt was running
+                return
+            failed = any(isinstance(result, BaseException) for result in results)
+            for check in range(2 if failed else 1):
+                if check:
+                    await asyncio.sleep(self.recheck_delay)
+                try:
+                    self.duplicates += await settle(kept)
+                except Exception:
+                    self._log.exception('Failed to settle the attempts of hedged request %s', key)
+
+        watcher = asyncio.ensure_future(watch())
+        self._background.add(watcher)
+        watcher.add_done_callback(self._background.discard)
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests, 'hedges': self.hedges, 'wins': self.wins, 'duplicates': self.duplicates,
+            'delays': {key: self.delay(key) for key in self.latencies},
+        }
+
+    async def close(self):
+        """Wait for the duplicate checks of hedged orders still running."""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions = True)
@@ -0,0 +1,281 @@
+"""
+Cache of spot instrument metadata with local price and size normalization of orders.
+
+``InstrumentCache`` loads ``spot_query_instruments`` once, from a JSON file on disk when it's fresher
+than the TTL, and refreshes it in the background. Lookups by pair are plain dict reads. RestClient
+created with ``instruments=cache`` rounds order prices to ``price_step`` and quantities to ``qty_step``
+and rejects orders below ``qty_min`` or of unknown or inactive pairs with OrderValidationException,
+without spending a request.
+
+``round_to_step`` accepts numpy arrays as well as floats to round whole price ladders at once, and
+``InstrumentCache.normalize_many`` rounds the prices and quantities of many orders on arrays.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import math
+import os
+import time
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from bit.exceptions import OrderValidationException
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+NEAREST = 'nearest'
+DOWN = 'down'
+UP = 'up'
+# Buy prices are rounded down and sell prices up, so rounding never makes an order more aggressive
+PASSIVE = 'passive'
+
+# Tolerance of float division when checking that a value is on its step
+_EPSILON = 1e-9
+
+
+def round_to_step(values, step: float, mode: str = NEAREST):
+    """Round a float or a numpy array of floats to a multiple of step."""
+    scaled = values / step
+    if np is not None and isinstance(scaled, np.ndarray):
+        if mode == DOWN:
+            return np.floor(scaled + _EPSILON) * step
+        if mode == UP:
+            return np.ceil(scaled - _EPSILON) * step
+        return np.rint(scaled) * step
+    if mode == DOWN:
+        return math.floor(scaled + _EPSILON) * step
+    if mode == UP:
+        return math.ceil(scaled - _EPSILON) * step
+    return round(scaled) * step
+
+
+def _decimals(step: str) -> int:
+    return max(0, -Decimal(step).normalize().as_tuple().exponent)
+
+
+class Instrument:
+    __slots__ = ('pair', 'base_currency', 'quote_currency', 'price_step', 'qty_step', 'qty_min', 'active', 'raw', '_price_decimals', '_qty_decimals')
+
+    def __init__(self, data: dict):
+        self.pair = data['pair']
+        self.base_currency = data.get('base_currency')
+        self.quote_currency = data.get('quote_currency')
+        self.price_step = float(data['price_step'])
+        self.qty_step = float(data['qty_step'])
+        self.qty_min = float(data.get('qty_min') or 0)
+        self.active = data.get('active', True)
+        self.raw = data
+        self._price_decimals = _decimals(str(data['price_step']))
+        self._qty_decimals = _decimals(str(data['qty_step']))
+
+    def round_price(self, price, mode: str = NEAREST, side: Optional[str] = None) -> str:
+        """Price on the price step formatted for an order, PASSIVE rounds to nearest without a side."""
+        if mode == PASSIVE:
+            mode = DOWN if side == 'buy' else UP if side == 'sell' else NEAREST
+        return '{:.{}f}'.format(round_to_step(float(price), self.price_step, mode), self._price_decimals)
+
+    def round_qty(self, qty, mode: str = DOWN) -> str:
+        """Quantity on the qty step formatted for an order, rounded down by default."""
+        return '{:.{}f}'.format(round_to_step(float(qty), self.qty_step, mode), self._qty_decimals)
+
+    def normalize(self, order: dict, price_mode: str = PASSIVE) -> dict:
+        """
+        Copy of order params with price and qty rounded to their steps.
+
+        :raises OrderValidationException: when the pair is inactive or the rounded qty is below qty_min
+        """
+        if not self.active:
+            raise OrderValidationException(order, 'Instrument {} is not active'.format(self.pair))
+        qty = price = None
+        if order.get('qty') is not None:
+            qty = round_to_step(float(order['qty']), self.qty_step, DOWN)
+        if order.get('price') is not None:
+            if price_mode == PASSIVE:
+                side = order.get('side')
+                mode = DOWN if side == 'buy' else UP if side == 'sell' else NEAREST
+            else:
+                mode = price_mode
+            price = round_to_step(float(order['price']), self.price_step, mode)
+        return self._format(order, price, qty)
+
+    def _format(self, order: dict, price: Optional[float], qty: Optional[float]) -> dict:
+        """Copy of order params with the rounded price and qty formatted, qty checked against qty_min."""
+        order = dict(order)
+        if qty is not None:
+            qty = '{:.{}f}'.format(qty, self._qty_decimals)
+            if float(qty) < self.qty_min or float(qty) <= 0:
+                raise OrderValidationException(order, 'Quantity {} of {} is below the minimum {}'.format(order['qty'], self.pair, self.qty_min))
+            order['qty'] = qty
+        if price is not None:
+            price = '{:.{}f}'.format(price, self._price_decimals)
+            if float(price) <= 0:
+                raise OrderValidationException(order, 'Price {} of {} rounds to zero'.format(order['price'], self.pair))
+            order['price'] = price
+        return order
+
+    def __repr__(self):
+        return '<Instrument {} price_step={} qty_step={} qty_min={}>'.format(self.pair, self.price_step, self.qty_step, self.qty_min)
+
+
+class InstrumentCache:
+    """
+    Spot instruments by pair, refreshed every ttl seconds and persisted to path when given.
+
+    One cache can be shared by several RestClients, ``start`` takes the client used for refreshes.
+    """
+    # Seconds to wait before retrying a failed refresh
+    RETRY_WAIT = 10
+
+    def __init__(self, *, ttl: float = 3600, path: Optional[str] = None):
+        self._log = logging.getLogger(__name__)
+        self.ttl = ttl
+        self.path = path
+        self.instruments: Dict[str, Instrument] = {}
+        # Wall clock time of the loaded data
+        self.updated = 0.0
+        self._rest_client = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, rest_client, *, background: bool = True):
+        """Load from disk if fresh enough, otherwise from REST, and keep refreshing in the background."""
+        self._rest_client = rest_client
+        if not self._load_file():
+            await self.refresh()
+        if background and self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    def _load_file(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path) as f:
+                content = json.load(f)
+            updated = content['updated']
+            if time.time() - updated > self.ttl:
+                return False
+            self._set(content['instruments'], updated)
+        except (OSError, ValueError, KeyError, TypeError):
+            self._log.warning('Ignoring unreadable instrument cache %s', self.path, exc_info = True)
+            return False
+        self._log.debug('Loaded %d instruments from %s', len(self.instruments), self.path)
+        return True
+
+    def _set(self, data: List[dict], updated: float):
+        instruments = {}
+        for item in data:
+            try:
+                instrument = Instrument(item)
+            except (KeyError, ValueError, TypeError):
+                self._log.warning('Skipping instrument without steps: %s', item)
+                continue
+            instruments[instrument.pair] = instrument
+        self.instruments = instruments
+        self.updated = updated
+
+    async def refresh(self):
+        data = await self._rest_client.spot_query_instruments()
+        self._set(data, time.time())
+        if self.path:
+            content = {'updated': self.updated, 'instruments': data}
+            await asyncio.get_event_loop().run_in_executor(None, self._write_file, content)
+
+    def _write_file(self, content: dict):
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(content, f)
+        os.replace(tmp_path, self.path)
+
+    async def _refresh_loop(self):
+        while True:
+            wait = self.updated + self.ttl - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                await self.refresh()
+            except Exception:
+                # API errors as well as timeouts, connection errors and failed writes of the cache file,
+                # the loaded instruments stay in use until a refresh succeeds
+                self._log.exception('Instrument refresh failed, retrying in %s s', self.RETRY_WAIT)
+                await asyncio.sleep(self.RETRY_WAIT)
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self.updated > self.ttl
+
+    def get(self, pair: str) -> Optional[Instrument]:
+        return self.instruments.get(pair)
+
+    def __getitem__(self, pair: str) -> Instrument:
+        return self.instruments[pair]
+
+    def __contains__(self, pair: str) -> bool:
+        return pair in self.instruments
+
+    def __len__(self):
+        return len(self.instruments)
+
+    def normalize(self, order: dict, price_mode: str = PASSIVE) -> dict:
+        """
+        Order params rounded to the steps of their pair, see Instrument.normalize.
+
+        Orders are passed through unchanged while the cache isn't loaded.
+        """
+        if not self.instruments:
+            return order
+        instrument = self.instruments.get(order.get('pair'))
+        if instrument is None:
+            raise OrderValidationException(order, 'Unknown instrument {}'.format(order.get('pair')))
+        return instrument.normalize(order, price_mode)
+
+    def normalize_many(self, orders: Iterable[dict], price_mode: str = PASSIVE) -> List[dict]:
+        """
+        Orders rounded like normalize. With numpy installed (``numpy`` extra) the prices and quantities
+        of all orders are rounded at once on arrays, only formatting and checks are done per order.
+
+        :raises OrderValidationException: for the first invalid order
+        """
+        orders = list(orders)
+        if np is None or not self.instruments or not orders:
+            return [self.normalize(order, price_mode) for order in orders]
+        instruments = [self.instruments.get(order.get('pair')) for order in orders]
+        steps = np.array([
+            (instrument.price_step, instrument.qty_step) if instrument is not None else (1.0, 1.0)
+            for instrument in instruments
+        ])
+        prices = np.array([float(order['price']) if order.get('price') is not None else 0.0 for order in orders])
+        qtys = np.array([float(order['qty']) if order.get('qty') is not None else 0.0 for order in orders])
+
+        scaled = prices / steps[:, 0]
+        if price_mode == PASSIVE:
+            sides = [order.get('side') for order in orders]
+            down = np.array([side == 'buy' for side in sides])
+            up = np.array([side == 'sell' for side in sides])
+        else:
+            down = np.full(len(orders), price_mode == DOWN)
+            up = np.full(len(orders), price_mode == UP)
+        prices = np.where(
+            down, np.floor(scaled + _EPSILON), np.where(up, np.ceil(scaled - _EPSILON), np.rint(scaled)),
+        ) * steps[:, 0]
+        qtys = np.floor(qtys / steps[:, 1] + _EPSILON) * steps[:, 1]
+
+        normalized = []
+        for order, instrument, price, qty in zip(orders, instruments, prices.tolist(), qtys.tolist()):
+            if instrument is None:
+                raise OrderValidationException(order, 'Unknown instrument {}'.format(order.get('pair')))
+            if not instrument.active:
+                raise OrderValidationException(order, 'Instrument {} is not active'.format(instrument.pair))
+            normalized.append(instrument._format(
+                order, price if order.get('price') is not None else None, qty if order.get('qty') is not None else None,
+            ))
+        return normalized
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
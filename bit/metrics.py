@@ -0,0 +1,188 @@
+"""
+Latency histograms of the websocket pipeline and REST calls.
+
+Clients take an optional ``metrics`` object; when it's None (the default) instrumentation costs one
+``is None`` check per message or request. Observations go to fixed log-scale histograms kept in
+process, ``Metrics.snapshot()`` returns them for an exporter to scrape and ``prometheus_text()``
+renders the Prometheus text format. Hooks get every observation as it happens.
+
+Recorded metrics, all in seconds:
+
+- ``bit_ws_exchange_latency_seconds``: message ``timestamp`` of the exchange to socket receive, includes
+  the clock offset between the exchange and this host unless the client has a bit.clock.ClockSync
+- ``bit_ws_decode_seconds``: receive to decoded message
+- ``bit_ws_dispatch_seconds``: decoded message to subscribers looked up
+- ``bit_ws_callback_seconds``: subscriber callbacks of one message, or queueing them for queued subscribers
+- ``bit_ws_handle_seconds``: receive to callbacks done
+- ``bit_ws_recovery_seconds``: disconnect or reconnect (``since`` label) to the first data message after it
+- ``bit_rest_latency_seconds``: REST request to decoded response, per method, path and status
+- ``bit_rest_queue_wait_seconds``: wait for the client side rate limiter
+"""
+import math
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+WS_EXCHANGE_LATENCY = 'bit_ws_exchange_latency_seconds'
+WS_DECODE = 'bit_ws_decode_seconds'
+WS_DISPATCH = 'bit_ws_dispatch_seconds'
+WS_CALLBACK = 'bit_ws_callback_seconds'
+WS_HANDLE = 'bit_ws_handle_seconds'
+WS_RECOVERY = 'bit_ws_recovery_seconds'
+REST_LATENCY = 'bit_rest_latency_seconds'
+REST_QUEUE_WAIT = 'bit_rest_queue_wait_seconds'
+
+# Metric name -> names of its labels
+LABELS = {
+    WS_EXCHANGE_LATENCY: ('channel',),
+    WS_DECODE: (),
+    WS_DISPATCH: ('channel',),
+    WS_CALLBACK: ('channel',),
+    WS_HANDLE: ('channel',),
+    WS_RECOVERY: ('since',),
+    REST_LATENCY: ('method', 'path', 'status'),
+    REST_QUEUE_WAIT: ('priority',),
+}
+
+
+class Histogram:
+    """
+    Histogram with log-scale buckets, four per power of two from 1us to about 2 minutes.
+
+    Values below the first bound (including negative ones) count in the first bucket, values above
+    the last one in an overflow bucket. Sum, min and max are exact.
+    """
+    __slots__ = ('counts', 'count', 'sum', 'min', 'max')
+
+    BOUNDS = [2 ** (i / 4) * 1e-6 for i in range(4 * 27)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value: float):
+        self.counts[bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'Histogram'):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th percentile (0-100), clamped to min and max."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                bound = self.BOUNDS[i] if i < len(self.BOUNDS) else self.max
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+    def buckets(self) -> List[Tuple[float, int]]:
+        """Cumulative (upper bound, count) pairs, the last bound is inf."""
+        result = []
+        seen = 0
+        for bound, n in zip(self.BOUNDS + [math.inf], self.counts):
+            seen += n
+            result.append((bound, seen))
+        return result
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': self.buckets(),
+        }
+
+
+class MetricsHook:
+    """Receives every observation, e.g. to forward it to a StatsD or OpenTelemetry client."""
+
+    def observe(self, name: str, value: float, labels: tuple):
+        pass
+
+
+class Metrics:
+    """Histograms per metric name and label values, see the module docstring for the recorded metrics."""
+
+    def __init__(self, hooks: Optional[List[MetricsHook]] = None):
+        self._histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self.hooks: List[MetricsHook] = list(hooks or ())
+
+    def add_hook(self, hook: MetricsHook):
+        self.hooks.append(hook)
+
+    def observe(self, name: str, value: float, *labels):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.record(value)
+        for hook in self.hooks:
+            hook.observe(name, value, labels)
+
+    def histogram(self, name: str, *labels) -> Optional[Histogram]:
+        return self._histograms.get((name, labels))
+
+    def merged(self, name: str) -> Histogram:
+        """Histogram of a metric over all its label values."""
+        result = Histogram()
+        for (entry_name, _), histogram in self._histograms.items():
+            if entry_name == name:
+                result.merge(histogram)
+        return result
+
+    def snapshot(self) -> List[dict]:
+        """Every histogram as a dict with name, labels (name -> value) and Histogram.snapshot() data."""
+        result = []
+        for (name, labels), histogram in self._histograms.items():
+            entry = histogram.snapshot()
+            entry['name'] = name
+            entry['labels'] = dict(zip(LABELS.get(name, ()), labels))
+            result.append(entry)
+        return result
+
+    def prometheus_text(self) -> str:
+        """Histograms in the Prometheus text exposition format, one bucket per power of two."""
+        lines = []
+        declared = set()
+        for (name, labels), histogram in sorted(self._histograms.items(), key = lambda item: (item[0][0], str(item[0][1]))):
+            if name not in declared:
+                declared.add(name)
+                lines.append('# TYPE {} histogram'.format(name))
+            label_text = ','.join(
+                '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                for k, v in zip(LABELS.get(name, ()), labels)
+            )
+            prefix = label_text + ',' if label_text else ''
+            for i, (bound, count) in enumerate(histogram.buckets()):
+                if i % 4 and bound != math.inf:
+                    continue
+                le = '+Inf' if bound == math.inf else repr(bound)
+                lines.append('{}_bucket{{{}le="{}"}} {}'.format(name, prefix, le, count))
+            suffix = '{' + label_text + '}' if label_text else ''
+            lines.append('{}_sum{} {}'.format(name, suffix, histogram.sum))
+            lines.append('{}_count{} {}'.format(name, suffix, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        self._histograms.clear()
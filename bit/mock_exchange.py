@@ -0,0 +1,587 @@
+"""
+Local mock of the Bit.com spot REST and websocket APIs for offline testing and load tests.
+
+The REST server speaks HTTP/1.1 with keep-alive and answers in the ``code``/``message``/``data``
+envelope. It keeps open orders in memory and serves order book snapshots consistent with the depth
+stream. The websocket server follows the subscribe protocol, replies with ``subscription`` messages
+and streams simulated depth, trade and ticker data of every subscribed pair.
+
+Latency can be injected on both servers, REST can be rate limited with the ``X-RateLimit-*``
+headers and websocket connections can be dropped on demand or periodically.
+
+    python -m bit.mock_exchange --rest-port 8080 --ws-port 8081 --rate 100
+
+    exchange = MockExchange(message_rate = 1000)
+    await exchange.start()
+    rest = RestClient('key', 'secret', base_url = exchange.rest_url)
+    ws = WebSocketClient('key', 'secret', stream_url = exchange.stream_url, rest_url = exchange.rest_url)
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import websockets
+
+from bit.rate_limit import TokenBucket
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 429: 'Too Many Requests', 500: 'Internal Server Error'}
+
+
+class _Book:
+    """Simulated order book of one pair, moved by random level changes."""
+    LEVELS = 20
+
+    def __init__(self, pair: str, price: float):
+        self.pair = pair
+        self.tick = price / 10000
+        self.mid = price
+        self.sequence = 1
+        self.bids = {round(price - (i + 1) * self.tick, 8): round(random.uniform(0.1, 5), 4) for i in range(self.LEVELS)}
+        self.asks = {round(price + (i + 1) * self.tick, 8): round(random.uniform(0.1, 5), 4) for i in range(self.LEVELS)}
+
+    def step(self) -> List[list]:
+        """Change a few levels, returns the changes as [side, price, qty] strings."""
+        changes = []
+        for _ in range(random.randint(1, 3)):
+            side = random.choice(('buy', 'sell'))
+            levels = self.bids if side == 'buy' else self.asks
+            offset = random.randint(1, self.LEVELS) * self.tick
+            price = round(self.mid - offset if side == 'buy' else self.mid + offset, 8)
+            qty = 0.0 if price in levels and random.random() < 0.2 else round(random.uniform(0.1, 5), 4)
+            if qty:
+                levels[price] = qty
+            else:
+                levels.pop(price, None)
+            changes.append([side, '{:.8f}'.format(price), '{:.4f}'.format(qty)])
+        self.sequence += 1
+        return changes
+
+    def snapshot(self) -> dict:
+        return {
+            'pair': self.pair,
+            'sequence': self.sequence,
+            'bids': [['{:.8f}'.format(p), '{:.4f}'.format(q)] for p, q in sorted(self.bids.items(), reverse = True)],
+            'asks': [['{:.8f}'.format(p), '{:.4f}'.format(q)] for p, q in sorted(self.asks.items())],
+        }
+
+
+class _Connection:
+    def __init__(self, socket):
+        self.socket = socket
+        self.subscriptions: Set[Tuple[str, str]] = set()
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.sender: Optional[asyncio.Task] = None
+
+
+class MockExchange:
+    """
+    Mock REST and websocket servers on localhost.
+
+    :param message_rate: depth updates per second of every pair, each one also sent as a ticker update
+    :param trade_rate: trades per second of every pair
+    :param rest_latency: seconds added before every REST response
+    :param ws_latency: seconds every websocket message is held back after it was generated
+    :param rest_rate_limit: REST requests per second answered before 429 responses, None for no limit
+    :param disconnect_every: drop all websocket connections every that many seconds, None never
+    :param history_size: number of user trades and transactions served by the paginated history queries,
+        one per second from HISTORY_START
+    :param rest_stall_probability: share of REST responses held back another rest_stall seconds, like
+        a stalled connection
+    :param clock_offset: seconds the exchange clock is ahead of the local one, applied to all exchange timestamps
+    """
+    TOKEN = 'mock-ws-token'
+    # Seconds between market simulation steps
+    TICK = 0.001
+    HISTORY_START = 1672531200000
+
+    def __init__(
+        self, *, host: str = '127.0.0.1', rest_port: int = 0, ws_port: int = 0, message_rate: float = 100,
+        trade_rate: float = 10, rest_latency: float = 0.0, ws_latency: float = 0.0,
+        rest_rate_limit: Optional[float] = None, disconnect_every: Optional[float] = None, history_size: int = 10000,
+        rest_stall_probability: float = 0.0, rest_stall: float = 0.0, clock_offset: float = 0.0,
+    ):
+        self._log = logging.getLogger(__name__)
+        self.host = host
+        self.rest_port = rest_port
+        self.ws_port = ws_port
+        self.message_rate = message_rate
+        self.trade_rate = trade_rate
+        self.rest_latency = rest_latency
+        self.ws_latency = ws_latency
+        self.rest_rate_limit = rest_rate_limit
+        self.disconnect_every = disconnect_every
+        self.history_size = history_size
+        self.rest_stall_probability = rest_stall_probability
+        self.rest_stall = rest_stall
+        self.clock_offset = clock_offset
+        self._bucket = TokenBucket(rest_rate_limit, rest_rate_limit) if rest_rate_limit else None
+        self.books: Dict[str, _Book] = {}
+        self.orders: Dict[str, dict] = {}
+        self._order_ids = itertools.count(1)
+        self._trade_ids = itertools.count(1)
+        self._connections: Set[_Connection] = set()
+        self._rest_server = None
+        self._ws_server = None
+        self._tasks: List[asyncio.Task] = []
+        self.routes = {
+            ('GET', '/spot/v1/ws/auth'): self._ws_auth,
+            ('GET', '/spot/v1/system/time'): self._system_time,
+            ('GET', '/spot/v1/instruments'): self._instruments,
+            ('GET', '/spot/v1/market/orderbooks'): self._orderbooks,
+            ('GET', '/spot/v1/market/trades'): self._market_trades,
+            ('GET', '/spot/v1/orders'): self._query_orders,
+            ('GET', '/spot/v1/open_orders'): self._open_orders,
+            ('POST', '/spot/v1/orders'): self._place_order,
+            ('POST', '/spot/v1/cancel_orders'): self._cancel_orders,
+            ('POST', '/spot/v1/amend_orders'): self._amend_order,
+            ('POST', '/spot/v1/batchorders'): self._batch_orders,
+            ('POST', '/spot/v1/amend_batchorders'): self._amend_batch_orders,
+            ('GET', '/spot/v1/user/trades'): self._user_trades,
+            ('GET', '/linear/v1/user/trades'): self._user_trades,
+            ('GET', '/spot/v1/transactions'): self._transactions,
+            ('GET', '/um/v1/transactions'): self._transactions,
+            ('GET', '/um/v1/accounts'): self._um_accounts,
+        }
+        self.rest_requests = 0
+        self.ws_messages = 0
+        self.disconnects = 0
+        # Wall clock time of the last forced disconnect
+        self.last_disconnect = 0.0
+
+    @property
+    def rest_url(self) -> str:
+        return 'http://{}:{}'.format(self.host, self.rest_port)
+
+    @property
+    def stream_url(self) -> str:
+        return 'ws://{}:{}'.format(self.host, self.ws_port)
+
+    async def start(self):
+        self._rest_server = await asyncio.start_server(self._serve_http, self.host, self.rest_port)
+        self.rest_port = self._rest_server.sockets[0].getsockname()[1]
+        self._ws_server = await websockets.serve(self._serve_ws, self.host, self.ws_port, max_queue = None)
+        self.ws_port = self._ws_server.sockets[0].getsockname()[1]
+        self._tasks.append(asyncio.create_task(self._simulate()))
+        if self.disconnect_every:
+            self._tasks.append(asyncio.create_task(self._disconnect_loop()))
+        self._log.info('Mock exchange REST on %s, websocket on %s', self.rest_url, self.stream_url)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks.clear()
+        for connection in list(self._connections):
+            if connection.sender:
+                connection.sender.cancel()
+        if self._ws_server:
+            self._ws_server.close()
+            await self._ws_server.wait_closed()
+        if self._rest_server:
+            self._rest_server.close()
+            await self._rest_server.wait_closed()
+
+    def book(self, pair: str) -> _Book:
+        book = self.books.get(pair)
+        if book is None:
+            book = self.books[pair] = _Book(pair, random.uniform(10, 50000))
+        return book
+
+    ######################
+    # REST
+    ######################
+
+    async def _serve_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode().split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = b''
+                if 'content-length' in headers:
+                    body = await reader.readexactly(int(headers['content-length']))
+                status, response_headers, payload = await self._handle_http(method, target, body)
+                head = ['HTTP/1.1 {} {}'.format(status, REASONS.get(status, 'Unknown'))]
+                response_headers['Content-Type'] = 'application/json'
+                response_headers['Content-Length'] = str(len(payload))
+                head += ['{}: {}'.format(k, v) for k, v in response_headers.items()]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except ValueError:
+            self._log.warning('Malformed HTTP request')
+        finally:
+            writer.close()
+
+    async def _handle_http(self, method: str, target: str, body: bytes):
+        self.rest_requests += 1
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+        if self.rest_stall_probability and random.random() < self.rest_stall_probability:
+            await asyncio.sleep(self.rest_stall)
+        headers = {}
+        if self._bucket is not None:
+            allowed = self._bucket.try_take()
+            headers['X-RateLimit-Limit'] = str(int(self.rest_rate_limit))
+            headers['X-RateLimit-Remaining'] = str(max(int(self._bucket.tokens), 0))
+            if not allowed:
+                headers['Retry-After'] = '{:.3f}'.format(1 / self.rest_rate_limit)
+                return 429, headers, b'{"code":429,"message":"Too many requests","data":null}'
+
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            return 404, headers, json.dumps({'code': 404, 'message': 'Unknown path ' + url.path, 'data': None}).encode()
+        params = dict(parse_qsl(url.query))
+        if body:
+            try:
+                params.update(json.loads(body))
+            except ValueError:
+                return 400, headers, b'{"code":400,"message":"Invalid JSON","data":null}'
+        try:
+            data = handler(params)
+        except KeyError as e:
+            content = {'code': 18100100, 'message': 'Missing parameter {}'.format(e), 'data': None}
+        else:
+            content = {'code': 0, 'message': '', 'data': data}
+        content['timestamp'] = self.now_ms()
+        return 200, headers, json.dumps(content).encode()
+
+    def now_ms(self) -> int:
+        """Exchange clock in milliseconds."""
+        return int((time.time() + self.clock_offset) * 1000)
+
+    def _ws_auth(self, params):
+        return {'token': self.TOKEN}
+
+    def _system_time(self, params):
+        return self.now_ms()
+
+    def _um_accounts(self, params):
+        return {
+            'user_id': 1, 'created_at': self.now_ms(), 'um_type': 'cross', 'total_collateral': '100000',
+            'total_margin_balance': '100000', 'total_available': '100000', 'total_initial_margin': '0',
+            'total_maintenance_margin': '0', 'total_liability': '0', 'details': [],
+        }
+
+    def _instruments(self, params):
+        return [
+            {'pair': pair, 'base_currency': pair.split('-')[0], 'quote_currency': pair.split('-')[1],
+             'price_step': '{:.8f}'.format(book.tick), 'qty_step': '0.0001', 'qty_min': '0.0001', 'active': True}
+            for pair, book in self.books.items()
+        ]
+
+    def _orderbooks(self, params):
+        snapshot = self.book(params['pair']).snapshot()
+        level = int(params.get('level') or 0)
+        if level:
+            snapshot['bids'] = snapshot['bids'][:level]
+            snapshot['asks'] = snapshot['asks'][:level]
+        snapshot['timestamp'] = self.now_ms()
+        return snapshot
+
+    def _market_trades(self, params):
+        book = self.book(params['pair'])
+        now = self.now_ms()
+        return [self._trade(book, now - i) for i in range(int(params.get('count') or 100))]
+
+    def _trade(self, book: _Book, created_at: int) -> dict:
+        return {
+            'trade_id': str(next(self._trade_ids)), 'pair': book.pair, 'price': '{:.8f}'.format(book.mid),
+            'qty': '{:.4f}'.format(random.uniform(0.001, 1)), 'side': random.choice(('buy', 'sell')),
+            'created_at': created_at,
+        }
+
+    def _history_page(self, params) -> range:
+        """Indexes of the history records of the requested page, newest first."""
+        first = max(0, -(-(int(params.get('start_time', self.HISTORY_START)) - self.HISTORY_START) // 1000))
+        last = min(self.history_size - 1, (int(params.get('end_time', 2 ** 62)) - self.HISTORY_START) // 1000)
+        limit = int(params.get('limit') or 10)
+        skip = (int(params.get('offset') or 1) - 1) * limit
+        top = last - skip
+        return range(top, max(top - limit, first - 1), -1)
+
+    def _user_trades(self, params):
+        return [
+            {'trade_id': str(i), 'order_id': str(i), 'pair': params.get('pair', 'BTC-USDT'), 'qty': '0.1',
+             'price': '30000', 'fee': '0.01', 'fee_rate': '0.0001', 'side': 'buy', 'order_type': 'limit',
+             'is_taker': False, 'created_at': self.HISTORY_START + i * 1000}
+            for i in self._history_page(params)
+        ]
+
+    def _transactions(self, params):
+        return [
+            {'tx_time': self.HISTORY_START + i * 1000, 'tx_type': 'trade', 'ccy': params.get('currency', 'USDT'),
+             'instrument_id': 'BTC-USDT', 'qty': '0.1', 'price': '30000', 'change': '-3000', 'cash_flow': '-3000'}
+            for i in self._history_page(params)
+        ]
+
+    def _query_orders(self, params):
+        pair = params.get('pair')
+        order_id = params.get('order_id')
+        label = params.get('label')
+        return [
+            o for o in self.orders.values()
+            if (pair is None or o['pair'] == pair) and (order_id is None or o['order_id'] == str(order_id))
+            and (label is None or o['label'] == label)
+        ]
+
+    def _open_orders(self, params):
+        pair = params.get('pair')
+        return [o for o in self.orders.values() if o['status'] == 'open' and (pair is None or o['pair'] == pair)]
+
+    def _place_order(self, params):
+        now = self.now_ms()
+        order = {
+            'order_id': str(next(self._order_ids)), 'pair': params['pair'], 'side': params['side'],
+            'order_type': params.get('order_type', 'limit'), 'price': str(params.get('price', '0')),
+            'qty': str(params['qty']), 'filled_qty': '0', 'avg_price': '0', 'fee': '0', 'status': 'open',
+            'time_in_force': params.get('time_in_force', 'gtc'), 'label': params.get('label', ''),
+            'post_only': bool(params.get('post_only', False)), 'created_at': now, 'updated_at': now,
+        }
+        self.orders[order['order_id']] = order
+        self._publish_order(order)
+        return order
+
+    def _cancel_orders(self, params):
+        cancelled = 0
+        for order in self.orders.values():
+            if order['status'] != 'open':
+                continue
+            if 'order_id' in params and order['order_id'] != str(params['order_id']):
+                continue
+            if 'label' in params and order['label'] != params['label']:
+                continue
+            if 'pair' in params and order['pair'] != params['pair']:
+                continue
+            order['status'] = 'cancelled'
+            order['updated_at'] = self.now_ms()
+            self._publish_order(order)
+            cancelled += 1
+        return {'num_cancelled': cancelled}
+
+    def _amend_order(self, params):
+        order = self.orders[str(params['order_id'])]
+        for key in ('price', 'qty'):
+            if key in params:
+                order[key] = str(params[key])
+        order['updated_at'] = self.now_ms()
+        self._publish_order(order)
+        return order
+
+    def _publish_order(self, order: dict):
+        self._publish('order', order['pair'], [dict(order)], self.now_ms())
+
+    def fill(self, order_id: str, qty: Optional[float] = None, *, publish_order: bool = True) -> dict:
+        """
+        Fill an open order, by default completely, and publish the fill on the user_trade channel.
+
+        :param publish_order: also publish the order update, False simulates a missed update
+        """
+        order = self.orders[order_id]
+        remaining = float(order['qty']) - float(order['filled_qty'])
+        qty = remaining if qty is None else min(qty, remaining)
+        now = self.now_ms()
+        filled = float(order['filled_qty']) + qty
+        order['avg_price'] = order['price']
+        order['filled_qty'] = '{:.4f}'.format(filled)
+        order['status'] = 'filled' if filled >= float(order['qty']) - 1e-12 else 'open'
+        order['updated_at'] = now
+        trade = {
+            'trade_id': str(next(self._trade_ids)), 'order_id': order_id, 'pair': order['pair'],
+            'side': order['side'], 'order_type': order['order_type'], 'label': order['label'],
+            'price': order['price'], 'qty': '{:.4f}'.format(qty), 'fee': '0', 'fee_rate': '0', 'is_taker': False,
+            'created_at': now,
+        }
+        self._publish('user_trade', order['pair'], [trade], now)
+        if publish_order:
+            self._publish_order(order)
+        return trade
+
+    def _batch(self, handler, orders):
+        results = []
+        for order in orders:
+            try:
+                results.append(dict(handler(order), code = 0, message = ''))
+            except KeyError as e:
+                results.append({'code': 18100100, 'message': 'Missing parameter {}'.format(e)})
+        return {'orders': results}
+
+    def _batch_orders(self, params):
+        return self._batch(self._place_order, params['orders_data'])
+
+    def _amend_batch_orders(self, params):
+        return self._batch(self._amend_order, params['orders_data'])
+
+    ######################
+    # Websocket
+    ######################
+
+    async def _serve_ws(self, socket):
+        connection = _Connection(socket)
+        connection.sender = asyncio.create_task(self._send_loop(connection))
+        self._connections.add(connection)
+        try:
+            async for raw in socket:
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    continue
+                await self._handle_ws(connection, message)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._connections.discard(connection)
+            connection.sender.cancel()
+
+    async def _handle_ws(self, connection: _Connection, message: dict):
+        msg_type = message.get('type')
+        if msg_type == 'ping':
+            self._enqueue(connection, {'type': 'pong', 'timestamp': self.now_ms()})
+            return
+        if msg_type not in ('subscribe', 'unsubscribe'):
+            return
+        channels = message.get('channels', [])
+        pairs = message.get('pairs') or ['']
+        if message.get('token') != self.TOKEN:
+            reply = {'code': 10002, 'message': 'Invalid token', 'subscription': channels, 'pairs': pairs}
+        else:
+            reply = {'code': 0, 'message': '', 'subscription': channels, 'pairs': pairs}
+            for channel in channels:
+                for pair in pairs:
+                    if msg_type == 'subscribe':
+                        connection.subscriptions.add((channel, pair))
+                    else:
+                        connection.subscriptions.discard((channel, pair))
+        self._enqueue(connection, {'channel': 'subscription', 'timestamp': self.now_ms(), 'data': reply})
+        if reply['code'] == 0 and msg_type == 'subscribe' and 'depth' in channels:
+            for pair in pairs:
+                if pair:
+                    data = dict(self.book(pair).snapshot(), type = 'snapshot')
+                    self._enqueue(connection, {'channel': 'depth', 'timestamp': self.now_ms(), 'module': 'spot', 'data': data})
+
+    def _enqueue(self, connection: _Connection, message: dict):
+        connection.queue.put_nowait((time.monotonic() + self.ws_latency, json.dumps(message)))
+
+    async def _send_loop(self, connection: _Connection):
+        queue = connection.queue
+        while True:
+            due, frame = await queue.get()
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await connection.socket.send(frame)
+            except websockets.ConnectionClosed:
+                return
+            self.ws_messages += 1
+
+    async def _simulate(self):
+        loop = asyncio.get_event_loop()
+        last = loop.time()
+        depth_due = 0.0
+        trade_due = 0.0
+        while True:
+            await asyncio.sleep(self.TICK)
+            now = loop.time()
+            depth_due += (now - last) * self.message_rate
+            trade_due += (now - last) * self.trade_rate
+            last = now
+            pairs = {pair for connection in self._connections for _, pair in connection.subscriptions if pair}
+            timestamp = self.now_ms()
+            for _ in range(int(depth_due)):
+                for pair in pairs:
+                    book = self.book(pair)
+                    prev_sequence = book.sequence
+                    changes = book.step()
+                    self._publish('depth', pair, {
+                        'type': 'update', 'pair': pair, 'sequence': book.sequence, 'prev_sequence': prev_sequence,
+                        'changes': changes,
+                    }, timestamp)
+                    self._publish('ticker', pair, {
+                        'pair': pair, 'time': timestamp, 'best_bid': '{:.8f}'.format(max(book.bids, default = 0)),
+                        'best_ask': '{:.8f}'.format(min(book.asks, default = 0)), 'last_price': '{:.8f}'.format(book.mid),
+                    }, timestamp)
+            for _ in range(int(trade_due)):
+                for pair in pairs:
+                    self._publish('trade', pair, [self._trade(self.book(pair), timestamp)], timestamp)
+            depth_due -= int(depth_due)
+            trade_due -= int(trade_due)
+
+    def _publish(self, channel: str, pair: str, data, timestamp: int):
+        frame = None
+        for connection in self._connections:
+            if (channel, pair) in connection.subscriptions:
+                if frame is None:
+                    frame = json.dumps({'channel': channel, 'timestamp': timestamp, 'module': 'spot', 'data': data})
+                connection.queue.put_nowait((time.monotonic() + self.ws_latency, frame))
+
+    async def disconnect(self, abort: bool = False):
+        """Drop all websocket connections, abort closes the TCP connections without a close handshake."""
+        self.disconnects += 1
+        self.last_disconnect = time.time()
+        for connection in list(self._connections):
+            if abort:
+                connection.socket.transport.abort()
+            else:
+                await connection.socket.close(1012, 'Service restart')
+
+    async def _disconnect_loop(self):
+        while True:
+            await asyncio.sleep(self.disconnect_every)
+            self._log.info('Dropping %d websocket connections', len(self._connections))
+            await self.disconnect()
+
+
+async def _main(args):
+    exchange = MockExchange(
+        host = args.host, rest_port = args.rest_port, ws_port = args.ws_port, message_rate = args.rate,
+        trade_rate = args.trade_rate, rest_latency = args.rest_latency, ws_latency = args.ws_latency,
+        rest_rate_limit = args.rest_rate_limit, disconnect_every = args.disconnect_every,
+        rest_stall_probability = args.rest_stall_probability, rest_stall = args.rest_stall,
+        clock_offset = args.clock_offset,
+    )
+    await exchange.start()
+    print('REST {}  websocket {}'.format(exchange.rest_url, exchange.stream_url))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await exchange.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Mock Bit.com exchange')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--rest-port', type = int, default = 8080)
+    parser.add_argument('--ws-port', type = int, default = 8081)
+    parser.add_argument('--rate', type = float, default = 100, help = 'depth updates per second and pair')
+    parser.add_argument('--trade-rate', type = float, default = 10, help = 'trades per second and pair')
+    parser.add_argument('--rest-latency', type = float, default = 0.0)
+    parser.add_argument('--ws-latency', type = float, default = 0.0)
+    parser.add_argument('--rest-rate-limit', type = float, default = None)
+    parser.add_argument('--disconnect-every', type = float, default = None)
+    parser.add_argument('--rest-stall-probability', type = float, default = 0.0, help = 'share of REST responses stalled')
+    parser.add_argument('--rest-stall', type = float, default = 0.0, help = 'seconds a stalled REST response takes')
+    parser.add_argument('--clock-offset', type = float, default = 0.0, help = 'seconds the exchange clock is ahead')
+    logging.basicConfig(level = logging.INFO)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,192 @@
+"""
+Typed objects for websocket messages and REST results.
+
+Models are ``__slots__`` classes built from the decoded payload dicts. Plain fields are copied as
+they are and numeric fields, which the API sends as decimal strings, are parsed to float once when
+the object is built. Nested data such as depth levels or account details is kept raw and converted
+on first access only, then cached in its slot. The source dict is not retained.
+
+Scalars are parsed eagerly on purpose: a lazy first attribute access goes through ``__getattr__``
+and costs several times a ``float()`` call, so it only pays off for the nested data.
+
+Models also support the read-only part of the mapping interface (``data['price']``,
+``data.get('price')``, ``'price' in data``) so that code written for dict payloads keeps working,
+with numbers returned as floats.
+"""
+from typing import Optional
+
+
+def _levels(levels) -> Optional[tuple]:
+    if levels is None:
+        return None
+    return tuple((float(price), float(qty)) for price, qty in levels)
+
+
+def _changes(changes) -> Optional[tuple]:
+    if changes is None:
+        return None
+    return tuple((side, float(price), float(qty)) for side, price, qty in changes)
+
+
+class Model:
+    """
+    Base class of the typed payloads.
+
+    Subclasses declare ``FIELDS`` copied as they are, ``NUMBERS`` parsed to float and ``LAZY``
+    mapping names of fields converted on first access to their converter, and list all of them in
+    ``__slots__``.
+    """
+    __slots__ = ('timestamp', '_raw')
+    FIELDS = ()
+    NUMBERS = ()
+    LAZY = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        lazy = tuple(cls.LAZY)
+        cls._LAZY_INDEX = {name: (i, cls.LAZY[name]) for i, name in enumerate(lazy)}
+        cls._KEYS = frozenset(cls.FIELDS + cls.NUMBERS + lazy + ('timestamp',))
+        # Generated like namedtuple and dataclasses do, a loop of setattr calls is several times slower
+        lines = ['def __init__(self, data, timestamp = None):', '    get = data.get']
+        lines += ['    self.{0} = get({0!r})'.format(name) for name in cls.FIELDS]
+        for name in cls.NUMBERS:
+            lines.append('    value = get({!r})'.format(name))
+            lines.append('    self.{} = value if type(value) is not str else float(value) if value else None'.format(name))
+        lines.append('    self._raw = ({})'.format(''.join('get({!r}), '.format(name) for name in lazy)))
+        lines.append('    self.timestamp = timestamp')
+        namespace = {}
+        exec('\n'.join(lines), {}, namespace)
+        cls.__init__ = namespace['__init__']
+        cls.__init__.__qualname__ = cls.__qualname__ + '.__init__'
+
+    def __getattr__(self, name):
+        # Only called for lazy fields not converted yet, their slots are unset until then
+        try:
+            index, convert = self._LAZY_INDEX[name]
+        except KeyError:
+            raise AttributeError('{!r} object has no attribute {!r}'.format(type(self).__name__, name)) from None
+        value = convert(self._raw[index])
+        setattr(self, name, value)
+        return value
+
+    @classmethod
+    def from_list(cls, items, timestamp = None) -> list:
+        return [cls(item, timestamp) for item in items]
+
+    def __getitem__(self, key):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default = None):
+        if key not in self._KEYS:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def __contains__(self, key) -> bool:
+        return key in self._KEYS and getattr(self, key) is not None
+
+    def to_dict(self) -> dict:
+        """Fields which are set, with numbers parsed."""
+        result = {}
+        for key in self.FIELDS + self.NUMBERS + tuple(self.LAZY) + ('timestamp',):
+            value = getattr(self, key)
+            if value is not None:
+                result[key] = value
+        return result
+
+    def __repr__(self):
+        return '{}({})'.format(
+            type(self).__name__, ', '.join('{}={!r}'.format(k, v) for k, v in self.to_dict().items())
+        )
+
+
+class Trade(Model):
+    """Public trade of the trade channel and spot_market_trades."""
+    FIELDS = ('trade_id', 'pair', 'side', 'created_at')
+    NUMBERS = ('price', 'qty')
+    __slots__ = FIELDS + NUMBERS
+
+
+class DepthUpdate(Model):
+    """Snapshot or incremental update of the depth channel, levels are parsed to (price, qty) floats."""
+    FIELDS = ('type', 'pair', 'sequence', 'prev_sequence')
+    LAZY = {'bids': _levels, 'asks': _levels, 'changes': _changes}
+    __slots__ = FIELDS + tuple(LAZY)
+
+
+class Order(Model):
+    """Order of the order channel and the order query endpoints."""
+    FIELDS = (
+        'order_id', 'pair', 'order_type', 'side', 'status', 'time_in_force', 'label', 'source',
+        'created_at', 'updated_at', 'user_id', 'post_only', 'reduce_only', 'reject_post_only',
+        'is_liquidation', 'hidden', 'mmp', 'auto_price_type', 'cancel_reason',
+    )
+    NUMBERS = (
+        'price', 'qty', 'avg_price', 'filled_qty', 'fee', 'stop_price', 'auto_price', 'maker_fee_rate',
+        'taker_fee_rate',
+    )
+    __slots__ = FIELDS + NUMBERS
+
+
+class UserTrade(Model):
+    """Own trade of the user_trade channel and the trade query endpoints."""
+    FIELDS = (
+        'trade_id', 'order_id', 'pair', 'side', 'order_type', 'label', 'is_taker', 'is_block_trade',
+        'fee_currency', 'created_at',
+    )
+    NUMBERS = ('price', 'qty', 'fee', 'fee_rate', 'index_price', 'usd_price')
+    __slots__ = FIELDS + NUMBERS
+
+
+class UMAccountDetail(Model):
+    """Per currency balances of a unified margin account."""
+    FIELDS = ('currency',)
+    NUMBERS = (
+        'equity', 'liability', 'index_price', 'cash_balance', 'margin_balance', 'available_balance',
+        'initial_margin', 'spot_margin', 'maintenance_margin', 'potential_liability', 'interest',
+        'interest_rate', 'pnl', 'total_delta', 'session_rpl', 'session_upl', 'option_value',
+        'future_value', 'unsettled_amount',
+    )
+    __slots__ = FIELDS + NUMBERS
+
+
+def _details(details) -> Optional[tuple]:
+    if details is None:
+        return None
+    return tuple(UMAccountDetail(detail) for detail in details)
+
+
+class UMAccount(Model):
+    """Unified margin account of the um_account channel and um_query_accounts."""
+    FIELDS = ('user_id', 'created_at', 'um_type')
+    NUMBERS = (
+        'total_collateral', 'total_margin_balance', 'total_available', 'total_initial_margin',
+        'total_maintenance_margin', 'total_initial_margin_ratio', 'total_maintenance_margin_ratio',
+        'total_liability', 'total_unsettled_amount', 'total_future_value', 'total_option_value',
+        'spot_orders_hc_loss', 'total_position_pnl',
+    )
+    LAZY = {'details': _details}
+    __slots__ = FIELDS + NUMBERS + tuple(LAZY)
+
+
+class Position(Model):
+    """Linear position of linear_query_positions."""
+    FIELDS = ('pair', 'category')
+    NUMBERS = (
+        'qty', 'avg_price', 'mark_price', 'index_price', 'liq_price', 'leverage', 'position_value',
+        'initial_margin', 'maintenance_margin', 'session_funding', 'session_rpl', 'session_upl',
+        'unrealized_pnl',
+    )
+    __slots__ = FIELDS + NUMBERS
+
+
+# Websocket channel -> model of its data items
+CHANNEL_MODELS = {
+    'trade': Trade,
+    'depth': DepthUpdate,
+    'order': Order,
+    'user_trade': UserTrade,
+    'um_account': UMAccount,
+}
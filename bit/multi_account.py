@@ -0,0 +1,126 @@
+"""
+Many accounts over one connection pool.
+
+A RestClient per sub-account opens a connection pool of its own, dozens of accounts end up with
+hundreds of sockets and TLS sessions to the same host. ``MultiAccountClient`` keeps one RestClient
+per account, each with the Signer of its secret computed once, all sharing one aiosonic session with
+a TunedConnector pool:
+
+- the exchange limits every account on its own, so with ``rate_limit`` every account gets a
+  RequestScheduler of its own and a busy account only queues behind its own limit
+- an account sends at most ``max_in_flight`` requests at once, half the pool by default, so that a
+  burst of one account can't take all connections from the others
+- ``fan_out`` runs the same call for all accounts at once, an account sweep takes one round trip
+  per ``pool_size`` accounts instead of one per account
+
+Usage::
+
+    client = MultiAccountClient({'main': (ak, sk), 'mm1': (ak1, sk1)}, pool_size = 32)
+    await client.warm_up()
+    accounts = await client.um_query_accounts()
+    await client['mm1'].spot_place_order(pair = 'BTC-USDT', side = 'buy', qty = '1', price = '100')
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import aiosonic
+
+from bit.connections import TunedConnector
+from bit.rest_client import RestClient
+
+
+class MultiAccountClient:
+    # Share of the pool one account can use at once when max_in_flight isn't given
+    MAX_IN_FLIGHT_SHARE = 0.5
+
+    def __init__(
+        self, accounts: Union[Dict[str, Tuple[str, str]], Iterable[Tuple[str, str]]] = (), base_url = RestClient.API_URL,
+        *, pool_size: int = 32, request_timeout: float = 30, max_in_flight: Optional[int] = None, **client_kwargs,
+    ):
+        """
+        :param accounts: account name -> (access key, secret key), or (access key, secret key) pairs named by access key
+        :param pool_size: connections of the shared pool
+        :param max_in_flight: requests of one account sent at once
+        :param client_kwargs: keyword arguments of every RestClient, e.g. rate_limit per account, codec or clock
+        """
+        self._log = logging.getLogger(__name__)
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.max_in_flight = max_in_flight or max(1, int(pool_size * self.MAX_IN_FLIGHT_SHARE))
+        self._client_kwargs = client_kwargs
+        self.session = aiosonic.HTTPClient(
+            connector = TunedConnector(pool_size = pool_size, timeouts = aiosonic.Timeouts(request_timeout = request_timeout)),
+        )
+        self.clients: Dict[str, RestClient] = {}
+        # Public endpoints, warm up and keep-alive of the shared pool, which need all of its connections at once
+        self.public = self._client('', '', None)
+        if not isinstance(accounts, dict):
+            accounts = {ak: (ak, sk) for ak, sk in accounts}
+        for name, (ak, sk) in accounts.items():
+            self.add_account(name, ak, sk)
+
+    def _client(self, ak: str, sk: str, max_in_flight: Optional[int]) -> RestClient:
+        return RestClient(
+            ak, sk, self.base_url, pool_size = self.pool_size, session = self.session,
+            max_in_flight = max_in_flight, **self._client_kwargs,
+        )
+
+    def add_account(self, name: str, ak: str, sk: str) -> RestClient:
+        if name in self.clients:
+            raise ValueError('Account {} already added'.format(name))
+        client = self.clients[name] = self._client(ak, sk, self.max_in_flight)
+        return client
+
+    async def remove_account(self, name: str):
+        """Close the client of an account, its requests in flight finish first."""
+        client = self.clients.pop(name)
+        await client.close()
+
+    def __getitem__(self, name: str) -> RestClient:
+        return self.clients[name]
+
+    def __len__(self):
+        return len(self.clients)
+
+    async def fan_out(self, method: str, *, accounts: Optional[Iterable[str]] = None, **params) -> dict:
+        """
+        Call the RestClient method of every account at once.
+        :param accounts: names of the accounts to call, all by default
+        :return: account name -> result, or the exception raised for that account
+        """
+        names = list(self.clients if accounts is None else accounts)
+        results = await asyncio.gather(
+            *(getattr(self.clients[name], method)(**params) for name in names), return_exceptions = True,
+        )
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                self._log.warning('%s failed for account %s: %r', method, name, result)
+        return dict(zip(names, results))
+
+    async def um_query_accounts(self, *, accounts: Optional[Iterable[str]] = None):
+        return await self.fan_out('um_query_accounts', accounts = accounts)
+
+    async def spot_query_accounts(self, *, accounts: Optional[Iterable[str]] = None, **params):
+        return await self.fan_out('spot_query_accounts', accounts = accounts, **params)
+
+    async def spot_query_open_orders(self, *, accounts: Optional[Iterable[str]] = None, **params):
+        return await self.fan_out('spot_query_open_orders', accounts = accounts, **params)
+
+    async def linear_query_open_orders(self, *, accounts: Optional[Iterable[str]] = None, **params):
+        return await self.fan_out('linear_query_open_orders', accounts = accounts, **params)
+
+    async def linear_query_positions(self, *, accounts: Optional[Iterable[str]] = None, **params):
+        return await self.fan_out('linear_query_positions', accounts = accounts, **params)
+
+    async def warm_up(self, connections: Optional[int] = None, *, keepalive: bool = True):
+        """Open connections of the shared pool, see RestClient.warm_up."""
+        await self.public.warm_up(connections, keepalive = keepalive)
+
+    def pool_stats(self) -> dict:
+        return self.session.connector.pool_stats()
+
+    async def close(self):
+        await asyncio.gather(*(client.close() for client in self.clients.values()), self.public.close())
+        self.clients.clear()
+        await self.session.shutdown()
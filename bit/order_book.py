@@ -0,0 +1,275 @@
+import asyncio
+import logging
+from array import array
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class OrderBook:
+    """
+    Level 2 order book of a single pair.
+
+    Both sides are kept in sorted ``array('d')`` columns ordered so that the best level is always
+    the last element: bids by ascending price, asks by ascending negated price. Updates near the
+    top of the book therefore only shift a few trailing elements and top-of-book reads are O(1).
+    """
+    __slots__ = ('pair', 'sequence', 'timestamp', 'synced', '_bid_px', '_bid_qty', '_ask_px', '_ask_qty')
+
+    def __init__(self, pair: str):
+        self.pair = pair
+        self.sequence = None
+        self.timestamp = None
+        self.synced = False
+        self._bid_px = array('d')
+        self._bid_qty = array('d')
+        self._ask_px = array('d')
+        self._ask_qty = array('d')
+
+    def clear(self):
+        del self._bid_px[:], self._bid_qty[:], self._ask_px[:], self._ask_qty[:]
+        self.sequence = None
+        self.synced = False
+
+    def load_snapshot(self, bids, asks, sequence = None, timestamp = None):
+        """Replace the whole book with ``[price, qty]`` levels in any order."""
+        self.clear()
+        for level in bids:
+            self._set(self._bid_px, self._bid_qty, float(level[0]), float(level[1]))
+        for level in asks:
+            self._set(self._ask_px, self._ask_qty, -float(level[0]), float(level[1]))
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.synced = True
+
+    def update_bid(self, price: float, qty: float):
+        self._set(self._bid_px, self._bid_qty, price, qty)
+
+    def update_ask(self, price: float, qty: float):
+        self._set(self._ask_px, self._ask_qty, -price, qty)
+
+    @staticmethod
+    def _set(keys: array, qtys: array, key: float, qty: float):
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            if qty:
+                qtys[i] = qty
+            else:
+                del keys[i]
+                del qtys[i]
+        elif qty:
+            keys.insert(i, key)
+            qtys.insert(i, qty)
+
+    def best_bid(self) -> Optional[Tuple[float, float]]:
+        if not self._bid_px:
+            return None
+        return self._bid_px[-1], self._bid_qty[-1]
+
+    def best_ask(self) -> Optional[Tuple[float, float]]:
+        if not self._ask_px:
+            return None
+        return -self._ask_px[-1], self._ask_qty[-1]
+
+    def bids(self, n: int = 10) -> List[Tuple[float, float]]:
+        """Best ``n`` bid levels, best first."""
+        px, qty = self._bid_px, self._bid_qty
+        size = len(px)
+        return [(px[i], qty[i]) for i in range(size - 1, max(size - n, 0) - 1, -1)]
+
+    def asks(self, n: int = 10) -> List[Tuple[float, float]]:
+        """Best ``n`` ask levels, best first."""
+        px, qty = self._ask_px, self._ask_qty
+        size = len(px)
+        return [(-px[i], qty[i]) for i in range(size - 1, max(size - n, 0) - 1, -1)]
+
+    def mid(self) -> Optional[float]:
+        if not self._bid_px or not self._ask_px:
+            return None
+        return (self._bid_px[-1] - self._ask_px[-1]) / 2
+
+    def spread(self) -> Optional[float]:
+        if not self._bid_px or not self._ask_px:
+            return None
+        return -self._ask_px[-1] - self._bid_px[-1]
+
+    def __len__(self):
+        return len(self._bid_px) + len(self._ask_px)
+
+    def __repr__(self):
+        return '<OrderBook {} seq={} bid={} ask={}>'.format(self.pair, self.sequence, self.best_bid(), self.best_ask())
+
+
+class OrderBookManager:
+    """
+    Maintains one :class:`OrderBook` per pair from the ``depth`` channel.
+
+    Use :meth:`on_depth` as the websocket subscriber. Every update carrying ``prev_sequence`` is
+    checked against the sequence of the book; on a gap the book is marked unsynced, further updates
+    are buffered and a REST snapshot is fetched with ``RestClient.spot_market_orderbooks``. Buffered
+    updates newer than the snapshot are replayed on top of it before listeners are notified again.
+    """
+    MAX_BUFFERED_UPDATES = 10000
+    RESYNC_RETRY_WAIT = 0.5
+
+    def __init__(self, rest_client, *, level: Optional[int] = None):
+        self._log = logging.getLogger(__name__)
+        self._rest_client = rest_client
+        self._level = level
+        self.books: Dict[str, OrderBook] = {}
+        self._listeners: Dict[str, List[Callable[[str, OrderBook], Awaitable]]] = {}
+        self._buffers: Dict[str, list] = {}
+        self._resyncs: Dict[str, asyncio.Task] = {}
+        # Pair -> event set when its book gets synced, see wait_synced
+        self._synced_events: Dict[str, asyncio.Event] = {}
+        self.gaps = 0
+
+    def get(self, pair: str) -> Optional[OrderBook]:
+        return self.books.get(pair)
+
+    def track(self, pair: str, coro: Optional[Callable[[str, OrderBook], Awaitable]] = None) -> OrderBook:
+        """Start tracking ``pair``, optionally awaiting ``coro(pair, book)`` after every applied update."""
+        book = self.books.get(pair)
+        if book is None:
+            book = self.books[pair] = OrderBook(pair)
+        if coro is not None:
+            self._listeners.setdefault(pair, []).append(coro)
+        return book
+
+    async def wait_synced(self, pairs: Optional[Iterable[str]] = None):
+        """Wait until the books of pairs, all tracked books by default, are synced."""
+        for pair in list(self.books if pairs is None else pairs):
+            book = self.books.get(pair)
+            while book is None or not book.synced:
+                event = self._synced_events.get(pair)
+                if event is None:
+                    event = self._synced_events[pair] = asyncio.Event()
+                await event.wait()
+                book = self.books.get(pair)
+
+    def _set_synced(self, pair: str):
+        event = self._synced_events.pop(pair, None)
+        if event is not None:
+            event.set()
+
+    def remove_pair(self, pair: str):
+        self.books.pop(pair, None)
+        self._listeners.pop(pair, None)
+        self._buffers.pop(pair, None)
+        task = self._resyncs.pop(pair, None)
+        if task:
+            task.cancel()
+
+    async def on_depth(self, channel, pair, data):
+        if type(data) == list:
+            for submessage in data:
+                await self.on_depth(channel, submessage['pair'], submessage)
+            return
+        book = self.books.get(pair)
+        if book is None:
+            book = self.books[pair] = OrderBook(pair)
+
+        if data.get('type') == 'snapshot':
+            book.load_snapshot(data.get('bids', ()), data.get('asks', ()), data.get('sequence'), data.get('timestamp'))
+            self._buffers.pop(pair, None)
+            task = self._resyncs.pop(pair, None)
+            if task:
+                task.cancel()
+            self._set_synced(pair)
+        elif not book.synced:
+            self._buffer(pair, data)
+            self._start_resync(book)
+            return
+        elif not self._apply_update(book, data):
+            self._start_resync(book)
+            self._buffer(pair, data)
+            return
+
+        for listener in self._listeners.get(pair, ()):
+            await listener(pair, book)
+
+    def _apply_update(self, book: OrderBook, data) -> bool:
+        """Apply one incremental update, returns False when a sequence gap was detected."""
+        prev_sequence = data.get('prev_sequence')
+        if prev_sequence is not None and book.sequence is not None and prev_sequence != book.sequence:
+            if data.get('sequence') is not None and data['sequence'] <= book.sequence:
+                # Stale update already included in the snapshot
+                return True
+            self.gaps += 1
+            self._log.warning(
+                'Order book gap on %s: expected prev_sequence %s, got %s', book.pair, book.sequence, prev_sequence
+            )
+            return False
+
+        changes = data.get('changes')
+        if changes is not None:
+            for side, price, qty in changes:
+                if side == 'buy':
+                    book.update_bid(float(price), float(qty))
+                else:
+                    book.update_ask(float(price), float(qty))
+        else:
+            for price, qty in data.get('bids', ()):
+                book.update_bid(float(price), float(qty))
+            for price, qty in data.get('asks', ()):
+                book.update_ask(float(price), float(qty))
+        if 'sequence' in data:
+            book.sequence = data['sequence']
+        book.timestamp = data.get('timestamp', book.timestamp)
+        return True
+
+    def _buffer(self, pair: str, data):
+        buffer = self._buffers.setdefault(pair, [])
+        if len(buffer) >= self.MAX_BUFFERED_UPDATES:
+            del buffer[:len(buffer) // 2]
+        buffer.append(data)
+
+    def _start_resync(self, book: OrderBook):
+        book.synced = False
+        if book.pair not in self._resyncs:
+            self._resyncs[book.pair] = asyncio.create_task(self._resync(book))
+
+    async def _resync(self, book: OrderBook):
+        pair = book.pair
+        params = {'pair': pair}
+        if self._level:
+            params['level'] = self._level
+        try:
+            while not book.synced:
+                try:
+                    snapshot = await self._rest_client.spot_market_orderbooks(**params)
+                except Exception:
+                    # API errors as well as timeouts and connection errors, the book stays unsynced
+                    # and keeps buffering until a snapshot arrives
+                    self._log.exception('Failed to fetch order book snapshot for %s, retrying in %s s', pair, self.RESYNC_RETRY_WAIT)
+                    await asyncio.sleep(self.RESYNC_RETRY_WAIT)
+                    continue
+                if book.synced:
+                    # A websocket snapshot arrived meanwhile
+                    return
+                book.load_snapshot(
+                    snapshot.get('bids', ()), snapshot.get('asks', ()),
+                    snapshot.get('sequence'), snapshot.get('timestamp'),
+                )
+                buffer = self._buffers.pop(pair, ())
+                for i, data in enumerate(buffer):
+                    sequence = data.get('sequence')
+                    if sequence is not None and book.sequence is not None and sequence <= book.sequence:
+                        continue
+                    if not self._apply_update(book, data):
+                        # Snapshot is older than the buffered updates, keep them and try again
+                        book.synced = False
+                        self._buffers[pair] = buffer[i:]
+                        self._log.warning('Order book %s not consistent after resync, retrying', pair)
+                        await asyncio.sleep(self.RESYNC_RETRY_WAIT)
+                        break
+        finally:
+            if self._resyncs.get(pair) is asyncio.current_task():
+                del self._resyncs[pair]
+        self._set_synced(pair)
+        for listener in self._listeners.get(pair, ()):
+            await listener(pair, book)
+
+    async def close(self):
+        for task in self._resyncs.values():
+            task.cancel()
+        self._resyncs.clear()
@@ -0,0 +1,115 @@
+"""
+Async iterators over paginated history endpoints.
+
+The history queries take a page number (``offset``, starting at 1) and a page size (``limit``).
+``paginate`` keeps several pages in flight and yields their records in page order as soon as the
+next page is in. A ``start_time``/``end_time`` range can be split into windows fetched in parallel,
+records are then yielded window after window, oldest window first.
+
+Memory doesn't depend on the length of the history: every window holds at most ``concurrency``
+pages in flight and ``buffer_pages`` fetched pages waiting for the consumer, fetching stops while
+the buffer is full. Closing the iterator early, with ``aclose`` or ``contextlib.aclosing``, cancels
+the requests in flight. ``concurrency`` also caps the requests in flight over all windows, so the
+window being consumed gets the connections the others don't need while their buffers are full.
+"""
+import asyncio
+import collections
+import contextlib
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+OFFSET_PARAM = 'offset'
+LIMIT_PARAM = 'limit'
+FIRST_OFFSET = 1
+PAGE_SIZE = 100
+
+
+async def paginate(
+    fetch: Callable[..., Awaitable[list]], params: Optional[dict] = None, *, page_size: int = PAGE_SIZE,
+    concurrency: int = 4, windows: int = 1, buffer_pages: int = 2,
+) -> AsyncIterator:
+    """
+    Yield the records of all pages of a paginated query.
+
+    :param fetch: query coroutine function taking the params as keywords and returning a page list,
+        e.g. RestClient.spot_query_trades
+    :param params: query params, start_time and end_time (ms) are needed to split into windows
+    :param page_size: records per page, a shorter page ends a window
+    :param concurrency: requests in flight at most
+    :param windows: number of equal time windows start_time..end_time is split into, useful when the
+        endpoint limits the time range or page depth of one query. Every window may spend up to
+        concurrency requests on pages past its end.
+    :param buffer_pages: fetched pages kept per window until the consumer gets to them
+    """
+    params = dict(params or {})
+    semaphore = asyncio.Semaphore(concurrency)
+    ranges = _split(params, windows)
+    queues = [asyncio.Queue(maxsize = buffer_pages) for _ in ranges]
+    producers = [
+        asyncio.create_task(_produce(fetch, dict(params, **time_range), page_size, concurrency, semaphore, queue))
+        for time_range, queue in zip(ranges, queues)
+    ]
+    completed = False
+    try:
+        for queue in queues:
+            while True:
+                page = await queue.get()
+                if page is None:
+                    break
+                if isinstance(page, BaseException):
+                    raise page
+                for record in page:
+                    yield record
+        completed = True
+    finally:
+        if not completed:
+            for producer in producers:
+                producer.cancel()
+        for producer in producers:
+            with contextlib.suppress(asyncio.CancelledError):
+                await producer
+
+
+def _split(params: dict, windows: int) -> List[dict]:
+    start, end = params.get('start_time'), params.get('end_time')
+    if windows <= 1 or start is None or end is None:
+        return [{}]
+    start, end = int(start), int(end)
+    step = max(1, -(-(end - start + 1) // windows))
+    return [
+        {'start_time': window_start, 'end_time': min(window_start + step - 1, end)}
+        for window_start in range(start, end + 1, step)
+    ]
+
+
+async def _produce(fetch, params: dict, page_size: int, prefetch: int, semaphore: asyncio.Semaphore, queue: asyncio.Queue):
+    async def fetch_page(offset):
+        async with semaphore:
+            return await fetch(**dict(params, **{OFFSET_PARAM: offset, LIMIT_PARAM: page_size}))
+
+    pending = collections.deque()
+    offset = FIRST_OFFSET
+    try:
+        while True:
+            while len(pending) < prefetch:
+                pending.append(asyncio.create_task(fetch_page(offset)))
+                offset += 1
+            page = await pending.popleft()
+            await queue.put(page)
+            if len(page) < page_size:
+                break
+        await queue.put(None)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await queue.put(e)
+    finally:
+        # Prefetched pages past the end of the window, or of an iterator closed early, aren't needed
+        for task in pending:
+            task.cancel()
+            # Retrieve the results so that errors aren't logged as unhandled
+            task.add_done_callback(_discard)
+
+
+def _discard(task: asyncio.Task):
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,152 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Optional
+
+
+class Priority:
+    CANCEL = 0
+    AMEND = 1
+    ORDER = 2
+    QUERY = 3
+
+    NAMES = ('cancel', 'amend', 'order', 'query')
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self) -> bool:
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """Seconds until the next token is available."""
+        now = time.monotonic()
+        self._refill(now)
+        return max(self.paused_until - now, (1 - self.tokens) / self.rate, 0)
+
+
+class _Lane:
+    __slots__ = ('requests', 'queued', 'max_queued', 'waited', 'wait_total', 'max_wait')
+
+    def __init__(self):
+        self.requests = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.max_wait = 0.0
+
+
+class RequestScheduler:
+    """
+    Client side rate limiter with priority lanes.
+
+    Requests take a token from a shared bucket refilled at ``rate`` tokens per second. When no token
+    is available the request is queued in its priority lane and woken up as soon as one is, lower
+    ``Priority`` values first: cancels before amends before new orders before queries.
+
+    The bucket follows the exchange: ``LIMIT_HEADER`` resizes it (per ``LIMIT_WINDOW`` seconds),
+    ``REMAINING_HEADER`` caps the tokens left and a 429 response empties it for ``RETRY_AFTER_HEADER``
+    seconds (or ``DEFAULT_PENALTY``).
+    """
+    LIMIT_HEADER = 'X-RateLimit-Limit'
+    REMAINING_HEADER = 'X-RateLimit-Remaining'
+    RETRY_AFTER_HEADER = 'Retry-After'
+    LIMIT_WINDOW = 1.0
+    DEFAULT_PENALTY = 1.0
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.bucket = TokenBucket(rate, burst or rate)
+        self._waiters = []
+        self._seq = itertools.count()
+        self._lanes = [_Lane() for _ in Priority.NAMES]
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def acquire(self, priority: int = Priority.QUERY):
+        lane = self._lanes[priority]
+        lane.requests += 1
+        if not self._waiters and self.bucket.try_take():
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future, time.monotonic()))
+        lane.queued += 1
+        lane.max_queued = max(lane.max_queued, lane.queued)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        waiters = self._waiters
+        while waiters:
+            priority, _, future, queued_at = waiters[0]
+            if future.done():
+                # Cancelled while waiting
+                heapq.heappop(waiters)
+                self._lanes[priority].queued -= 1
+            elif self.bucket.try_take():
+                heapq.heappop(waiters)
+                lane = self._lanes[priority]
+                lane.queued -= 1
+                wait = time.monotonic() - queued_at
+                lane.waited += 1
+                lane.wait_total += wait
+                lane.max_wait = max(lane.max_wait, wait)
+                future.set_result(None)
+            else:
+                await asyncio.sleep(self.bucket.wait_time())
+
+    def update(self, headers, status_code: int):
+        """Adjust the bucket from the rate limit headers of a response."""
+        limit = headers.get(self.LIMIT_HEADER)
+        if limit:
+            limit = float(limit)
+            if limit != self.bucket.capacity:
+                self.bucket.capacity = limit
+                self.bucket.rate = limit / self.LIMIT_WINDOW
+        remaining = headers.get(self.REMAINING_HEADER)
+        if remaining:
+            self.bucket.tokens = min(self.bucket.tokens, float(remaining))
+        if status_code == 429:
+            retry_after = headers.get(self.RETRY_AFTER_HEADER)
+            self.bucket.tokens = 0
+            self.bucket.paused_until = time.monotonic() + (float(retry_after) if retry_after else self.DEFAULT_PENALTY)
+
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def stats(self) -> dict:
+        """Per lane request count, current and max queue depth and wait times in seconds."""
+        return {
+            name: {
+                'requests': lane.requests,
+                'queued': lane.queued,
+                'max_queued': lane.max_queued,
+                'waited': lane.waited,
+                'avg_wait': lane.wait_total / lane.waited if lane.waited else 0.0,
+                'max_wait': lane.max_wait,
+            }
+            for name, lane in zip(Priority.NAMES, self._lanes)
+        }
+
+    def close(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
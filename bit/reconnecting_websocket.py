@@ -1,10 +1,14 @@
 import asyncio
 import contextlib
-import ujson
 import logging
+import time
 from random import random
 import websockets as ws
 
+from bit.codec import get_codec
+from bit.connections import tune_socket
+from bit.metrics import WS_DECODE, WS_HANDLE
+
 
 class ReconnectingWebsocket:
     STREAM_URL = "wss://spot-ws.bit.com"
@@ -14,22 +18,48 @@ class ReconnectingWebsocket:
     MIN_RECONNECT_WAIT = 0.1
     TIMEOUT = 30
 
-    def __init__(self, loop, path, coro, prefix='', reconnect_auth_coro = None):
+    def __init__(self, loop, path, coro, prefix='', reconnect_auth_coro = None, *, codec = None, frame_filter = None, metrics = None, recorder = None, connect = True, stream_url = None, max_reconnects = MAX_RECONNECTS):
+        """
+        :param codec: bit.codec.Codec (or backend name) used to decode frames, the default codec when not set
+        :param frame_filter: optional callable getting the raw frame and returning False for frames which
+            should be dropped without decoding
+        :param metrics: optional bit.metrics.Metrics recording decode and handling latencies
+        :param recorder: optional bit.capture.FrameRecorder getting every raw frame received
+        :param connect: connect right away, without connecting frames are only fed with feed()
+        :param stream_url: websocket server, STREAM_URL by default
+        :param max_reconnects: failed connection attempts in a row after which reconnecting stops, None never stops
+        """
         async def empty_coro():
             pass
 
         self._loop = loop
         self._log = logging.getLogger(__name__)
         self._path = path
+        self._stream_url = stream_url or self.STREAM_URL
         self._coro = coro
         self._prefix = prefix
         self._reconnect_auth_coro = reconnect_auth_coro or empty_coro
+        self._codec = get_codec(codec) if codec is None or isinstance(codec, str) else codec
+        self._frame_filter = frame_filter
+        self.skipped_frames = 0
+        self._metrics = metrics
+        self._recorder = recorder
+        # Receive wall clock time and perf_counter times of the current message, only kept with metrics
+        self.received_time = 0.0
+        self.received_at = 0.0
+        self.decoded_at = 0.0
+        # monotonic times of the last disconnect and of the last connection established
+        self.disconnected_at = 0.0
+        self.connected_at = 0.0
+        self.max_reconnects = max_reconnects
         self._reconnects = 0
+        self._reconnect_task = None
         self._conn = None
         self._socket = None
         self.connected = asyncio.Event()
 
-        self._connect()
+        if connect:
+            self._connect()
 
     def _connect(self):
         self._conn = asyncio.ensure_future(self._run(), loop=self._loop)
@@ -39,9 +69,12 @@ class ReconnectingWebsocket:
         await self.connected.wait()
 
     async def _run(self):
-        ws_url = self.STREAM_URL + self._prefix + self._path
+        ws_url = self._stream_url + self._prefix + self._path
         async with ws.connect(ws_url) as socket:
+            tune_socket(socket.transport.get_extra_info('socket'))
             self._socket = socket
+            self.connected_at = time.monotonic()
+            self._reconnects = 0
             self._messages_in_a_row = 0
             self.connected.set()
 
@@ -58,27 +91,49 @@ class ReconnectingWebsocket:
 
                     evt = await self._socket.recv()
                     self._messages_in_a_row += 1
-                    try:
-                        evt_obj = ujson.loads(evt)
-                    except ValueError:
-                        self._log.info('error parsing evt json:{}'.format(evt))
-                    else:
-                        await self._coro(evt_obj)
+                    if self._recorder is not None:
+                        self._recorder.record(evt)
+                    await self.feed(evt)
 
                     # Yield every now and then to let new tasks being processed
                     if queue_len > 1 and self._messages_in_a_row % 5 == 0:
                         await asyncio.sleep(0)
             except ws.ConnectionClosed as e:
                 self._log.info('ws connection closed: %r', e)
-                asyncio.create_task(self._reconnect())
+                self._start_reconnect()
             except asyncio.CancelledError:
                 self._log.debug('ws connection cancelled')
                 raise
             except Exception as e:
                 self._log.exception('ws exception')
-                asyncio.create_task(self._reconnect())
+                self._start_reconnect()
         self.connected.clear()
 
+    async def feed(self, evt):
+        """Handle one raw frame: filter, decode and pass it to the callback coroutine."""
+        if self._metrics is not None:
+            self.received_time = time.time()
+            self.received_at = time.perf_counter()
+        if self._frame_filter is not None and not self._frame_filter(evt):
+            self.skipped_frames += 1
+            return
+        try:
+            evt_obj = self._codec.loads(evt)
+        except ValueError:
+            self._log.info('error parsing evt json:{}'.format(evt))
+        else:
+            if self._metrics is None:
+                await self._coro(evt_obj)
+            else:
+                await self._handle_measured(evt_obj)
+
+    async def _handle_measured(self, evt_obj):
+        self.decoded_at = time.perf_counter()
+        self._metrics.observe(WS_DECODE, self.decoded_at - self.received_at)
+        await self._coro(evt_obj)
+        channel = (evt_obj.get('channel') or evt_obj.get('type', '')) if type(evt_obj) is dict else ''
+        self._metrics.observe(WS_HANDLE, time.perf_counter() - self.received_at, channel)
+
     def _handle_conn_done(self, task: asyncio.Task):
         self.connected.clear()
         try:
@@ -88,25 +143,34 @@ class ReconnectingWebsocket:
         except Exception:
             self._log.exception('connection finished with exception')
 
-    def _get_reconnect_wait(self, attempts: int) -> int:
-        expo = 2 ** attempts
-        return round(random() * min(self.MAX_RECONNECT_SECONDS, expo - 1))
+    def _get_reconnect_wait(self, attempts: int) -> float:
+        # The first attempt only waits MIN_RECONNECT_WAIT, then jittered exponential backoff
+        expo = 2 ** (attempts - 1)
+        return self.MIN_RECONNECT_WAIT + random() * min(self.MAX_RECONNECT_SECONDS, expo - 1)
+
+    def _start_reconnect(self):
+        self._reconnect_task = asyncio.create_task(self._reconnect())
 
     async def _reconnect(self):
+        self.disconnected_at = time.monotonic()
         await self.cancel()
-        self._reconnects += 1
-        if self._reconnects < self.MAX_RECONNECTS:
-
-            self._log.info("websocket {} reconnecting {} reconnects left".format(
-                self._path, self.MAX_RECONNECTS - self._reconnects)
-            )
+        # Counts failed attempts in a row, reset once connected
+        while self.max_reconnects is None or self._reconnects < self.max_reconnects:
+            self._reconnects += 1
             reconnect_wait = self._get_reconnect_wait(self._reconnects)
+            self._log.info("websocket {} reconnecting in {:.2f} s, attempt {}".format(
+                self._path, reconnect_wait, self._reconnects)
+            )
             await asyncio.sleep(reconnect_wait)
             self._connect()
-            await self.connected.wait()
-            await self._reconnect_auth_coro()
-        else:
-            self._log.error('Max reconnections {} reached:'.format(self.MAX_RECONNECTS))
+            connected = asyncio.ensure_future(self.connected.wait())
+            # The connection task ends right away when connecting fails
+            await asyncio.wait((connected, self._conn), return_when = asyncio.FIRST_COMPLETED)
+            if self.connected.is_set():
+                await self._reconnect_auth_coro()
+                return
+            connected.cancel()
+        self._log.error('Max reconnections {} reached:'.format(self.max_reconnects))
 
     async def send(self, data):
         if not self.connected.is_set():
@@ -127,5 +191,14 @@ class ReconnectingWebsocket:
             with contextlib.suppress(asyncio.CancelledError):
                 await self._conn
         self._socket = None
-        self._reconnects = 0
         self._log.debug('Done')
+
+    async def close(self):
+        """Close the connection and stop reconnecting."""
+        task = self._reconnect_task
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._reconnect_task = None
+        await self.cancel()
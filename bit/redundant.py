@@ -0,0 +1,213 @@
+"""
+Hot-standby websocket: several live connections with the same subscriptions, duplicates dropped.
+
+Every copy is a regular WebSocketClient with its own connection, possibly to another host, that
+never stops reconnecting. Subscribers get each message from whichever copy delivers it first, so a
+dying connection costs nothing while the other one is up: no backoff, resubscribe or snapshot gap.
+
+Duplicates are recognized per channel:
+
+- ``depth``: the update ``sequence``, only updates newer than the last delivered one of the pair pass
+- ``trade`` and ``user_trade``: ``trade_id``
+- ``order``: order_id, updated_at, status and filled_qty
+- other channels: the exchange timestamp of the message (``timestamp``, ``time`` or ``created_at``)
+  and a hash of its content. Different messages of the same millisecond differ in content, identical
+  ones are counted per copy: the n-th occurrence of a key passes when no copy delivered n of them
+  yet. Data without a timestamp is always delivered
+"""
+import asyncio
+import collections
+import logging
+from typing import Dict, List, Optional
+
+from bit.auth import TokenCache
+from bit.rest_client import RestClient
+from bit.web_socket_client import WebSocketClient
+
+
+def _trade_key(item):
+    return item.get('trade_id')
+
+
+def _order_key(item):
+    return item.get('order_id'), item.get('updated_at'), item.get('status'), item.get('filled_qty')
+
+
+def _content_key(item):
+    timestamp = item.get('timestamp') or item.get('time') or item.get('created_at')
+    if timestamp is None:
+        return None
+    # Models have a repr of their fields too
+    return timestamp, hash(repr(item))
+
+
+class Deduplicator:
+    """Remembers recent message keys per channel and pair, see the module docstring."""
+    KEYS = {
+        'trade': _trade_key,
+        'user_trade': _trade_key,
+        'order': _order_key,
+    }
+    # Keys remembered per channel and pair
+    WINDOW = 4096
+
+    def __init__(self):
+        self._sequences: Dict[str, int] = {}
+        self._seen: Dict[tuple, tuple] = {}
+        # (channel, pair) -> (content key -> [occurrences delivered, {copy: occurrences received}], keys in order)
+        self._occurrences: Dict[tuple, tuple] = {}
+        self.duplicates = 0
+
+    def filter(self, channel: str, pair: str, data, copy: int = 0):
+        """
+        data without the items delivered before, None when nothing is left.
+        :param copy: index of the connection data was received from
+        """
+        if type(data) is list:
+            fresh = [item for item in data if self._first(channel, pair, item, copy)]
+            return fresh or None
+        return data if self._first(channel, pair, data, copy) else None
+
+    def _first(self, channel: str, pair: str, item, copy: int) -> bool:
+        if channel == 'depth':
+            sequence = item.get('sequence')
+            if sequence is not None:
+                last = self._sequences.get(pair)
+                if last is not None and sequence <= last:
+                    self.duplicates += 1
+                    return False
+                self._sequences[pair] = sequence
+                return True
+        get_key = self.KEYS.get(channel)
+        if get_key is None:
+            return self._first_occurrence(channel, pair, _content_key(item), copy)
+        key = get_key(item)
+        if key is None:
+            return True
+        seen = self._seen.get((channel, pair))
+        if seen is None:
+            seen = self._seen[(channel, pair)] = (set(), collections.deque())
+        keys, order = seen
+        if key in keys:
+            self.duplicates += 1
+            return False
+        keys.add(key)
+        order.append(key)
+        if len(order) > self.WINDOW:
+            keys.discard(order.popleft())
+        return True
+
+    def _first_occurrence(self, channel: str, pair: str, key, copy: int) -> bool:
+        if key is None:
+            return True
+        seen = self._occurrences.get((channel, pair))
+        if seen is None:
+            seen = self._occurrences[(channel, pair)] = ({}, collections.deque())
+        counts, order = seen
+        entry = counts.get(key)
+        if entry is None:
+            entry = counts[key] = [0, {}]
+            order.append(key)
+            if len(order) > self.WINDOW:
+                del counts[order.popleft()]
+        received = entry[1][copy] = entry[1].get(copy, 0) + 1
+        if received <= entry[0]:
+            self.duplicates += 1
+            return False
+        entry[0] = received
+        return True
+
+
+class RedundantWebSocketClient:
+    """
+    Subscribes the same channels on several WebSocketClients and delivers every message once.
+
+    The subscribe API is the same as WebSocketClient's. All copies share one auth token.
+    """
+
+    def __init__(
+        self, api_key, api_secret, *, copies: int = 2, stream_urls: Optional[List[str]] = None,
+        rest_client: Optional[RestClient] = None, **client_kwargs,
+    ):
+        """
+        :param copies: number of connections, ignored when stream_urls are given
+        :param stream_urls: one websocket server per connection, e.g. different hosts of the exchange
+        :param rest_client: RestClient fetching the shared token, closed with this client. It isn't passed on
+            to the copies, which would each close it, they create their own when they need one.
+        :param client_kwargs: passed on to every WebSocketClient
+        """
+        self._log = logging.getLogger(__name__)
+        if stream_urls is None:
+            stream_urls = [client_kwargs.pop('stream_url', None)] * copies
+        client_kwargs.pop('stream_url', None)
+        client_kwargs.setdefault('max_reconnects', None)
+        self._rest_client = rest_client or RestClient(
+            api_key, api_secret, client_kwargs.get('rest_url') or RestClient.API_URL, clock = client_kwargs.get('clock'),
+        )
+        self.tokens = TokenCache(self._fetch_token)
+        self.clients: List[WebSocketClient] = [
+            WebSocketClient(api_key, api_secret, token_coro = self.tokens.get, stream_url = url, **client_kwargs)
+            for url in stream_urls
+        ]
+        # Subscriber coroutine -> (deduplicator, forwarding coroutine of every copy)
+        self._forwarders: Dict[object, tuple] = {}
+        # Messages delivered first by each copy
+        self.firsts = [0] * len(self.clients)
+
+    async def _fetch_token(self):
+        ret = await self._rest_client.spot_ws_auth()
+        return ret['token']
+
+    async def start(self):
+        await asyncio.gather(*(client.start() for client in self.clients))
+
+    def _forwarders_of(self, coro) -> tuple:
+        entry = self._forwarders.get(coro)
+        if entry is None:
+            deduplicator = Deduplicator()
+            entry = self._forwarders[coro] = (
+                deduplicator, [self._make_forwarder(coro, deduplicator, i) for i in range(len(self.clients))],
+            )
+        return entry
+
+    def _make_forwarder(self, coro, deduplicator: Deduplicator, index: int):
+        firsts = self.firsts
+
+        async def forward(channel, pair, data):
+            data = deduplicator.filter(channel, pair, data, index)
+            if data is not None:
+                firsts[index] += 1
+                await coro(channel, pair, data)
+        return forward
+
+    async def subscribe(self, *, coro, channels: List[str], pairs: List[str], interval: Optional[str] = '', **kwargs):
+        """Subscribe data on every connection, see WebSocketClient.subscribe."""
+        _, forwarders = self._forwarders_of(coro)
+        await asyncio.gather(*(
+            client.subscribe(coro = forward, channels = channels, pairs = pairs, interval = interval, **kwargs)
+            for client, forward in zip(self.clients, forwarders)
+        ))
+
+    async def unsubscribe(self, channel, id_):
+        """unsubscribe a symbol/account from channel"""
+        await asyncio.gather(*(client.unsubscribe(channel, id_) for client in self.clients))
+        active = {
+            s for client in self.clients for channel_data in client.subscribers.values() for subscribers in channel_data.values()
+            for s in subscribers
+        }
+        for coro, (_, forwarders) in list(self._forwarders.items()):
+            if not active.intersection(forwarders):
+                del self._forwarders[coro]
+
+    def stats(self) -> dict:
+        """Connection state and first deliveries per copy, duplicates dropped."""
+        return {
+            'connected': [client.ws.connected.is_set() for client in self.clients],
+            'firsts': list(self.firsts),
+            'duplicates': sum(deduplicator.duplicates for deduplicator, _ in self._forwarders.values()),
+        }
+
+    async def close(self):
+        await asyncio.gather(*(client.close() for client in self.clients))
+        await self.tokens.close()
+        await self._rest_client.close()
@@ -11,12 +11,20 @@
 # https://www.bit.com/docs/en-us/spot.html#spot-api-hosts-production
 
 import aiosonic
-import hashlib
-import hmac
+import asyncio
+import contextlib
+import functools
+import logging
 import time
-import ujson
 
+from bit.codec import get_codec
+from bit.connections import TunedConnector
 from bit.exceptions import BitAPIException
+from bit.metrics import REST_LATENCY, REST_QUEUE_WAIT
+from bit.models import Order, Position, Trade, UMAccount, UserTrade
+from bit.pagination import PAGE_SIZE, paginate
+from bit.rate_limit import Priority, RequestScheduler
+from bit.signing import Signer
 
 class HttpMethod:
 	GET = 'GET'
@@ -30,6 +38,7 @@ class HttpMethod:
 V1_SPOT_INSTRUMENTS = '/spot/v1/instruments'
 V1_SPOT_MARKET_TRADES = '/spot/v1/market/trades'
 V1_SPOT_MARKET_ORDERBOOKS = '/spot/v1/market/orderbooks'
+V1_SPOT_SYSTEM_TIME = '/spot/v1/system/time'
 # TODO more
 
 # SPOT
@@ -73,80 +82,137 @@ V1_LINEAR_PLATFORM_BLOCK_TRADES = '/linear/v1/platform_blocktrades'
 V1_LINEAR_ACCOUNT_CONFIGS = "/linear/v1/account_configs"
 V1_LINEAR_LEVERAGE_RATIO = "/linear/v1/leverage_ratio"
 
+CANCEL_PATHS = frozenset((V1_SPOT_CANCEL_ORDERS, V1_LINEAR_CANCEL_ORDERS))
+AMEND_PATHS = frozenset((V1_SPOT_AMEND_ORDERS, V1_SPOT_AMEND_BATCH_ORDERS, V1_LINEAR_AMEND_ORDERS, V1_LINEAR_AMEND_BATCH_ORDERS))
+# Order placements which may be hedged, with the endpoint cancelling a duplicate. Their orders are
+# queried with a GET request to the same path.
+HEDGED_ORDER_PATHS = {V1_SPOT_ORDERS: V1_SPOT_CANCEL_ORDERS, V1_LINEAR_ORDERS: V1_LINEAR_CANCEL_ORDERS}
+OPEN_STATUSES = frozenset(('open', 'pending'))
+
 class RestClient(object):
 	API_URL = "https://api.bit.com"
 	# API_URL = "https://betaapi.bitexch.dev"
+	RATE_LIMIT_RETRIES = 3
+	# Seconds a pooled connection may stay unused before the keep-alive task sends a request over it
+	KEEPALIVE_INTERVAL = 20
 
-	def __init__(self, ak, sk, base_url = API_URL, *, pool_size = 10, request_timeout = 30):
+	def __init__(self, ak, sk, base_url = API_URL, *, pool_size = 10, request_timeout = 30, rate_limit = None, rate_limit_burst = None, codec = None, typed = False, metrics = None, instruments = None, hedge = None, clock = None, session = None, max_in_flight = None):
+		"""
+		:param rate_limit: requests per second allowed by the client side scheduler, None disables it.
+			Requests over the limit are queued by priority (cancels, amends, orders, queries) instead of
+			being sent, see RequestScheduler.
+		:param rate_limit_burst: scheduler bucket size, defaults to rate_limit
+		:param codec: bit.codec.Codec (or backend name) for request and response bodies, the default codec when not set
+		:param typed: return trades, orders, user trades, positions and UM accounts of the query endpoints
+			as bit.models objects instead of dicts
+		:param metrics: optional bit.metrics.Metrics recording request latency per method, path and status,
+			where status is ok, the HTTP status or API error code, or the exception name
+		:param instruments: optional bit.instruments.InstrumentCache, spot orders and amends are then rounded
+			to the price and qty steps of their pair and checked against its minimum size before being sent,
+			raising OrderValidationException instead of spending a request
+		:param hedge: optional bit.hedging.HedgePolicy sending a second attempt of slow GET requests, and
+			of labelled orders when enabled by the policy. Second attempts bypass the rate limit scheduler
+			and are capped by the policy budget instead.
+		:param clock: optional bit.clock.ClockSync learning the exchange clock offset from the timestamps of
+			responses, request timestamps are then taken from the exchange clock
+		:param session: aiosonic.HTTPClient shared with other clients, e.g. by bit.multi_account.MultiAccountClient,
+			instead of a connection pool of its own. pool_size is then ignored and close leaves the session open.
+			Its connector must be a bit.connections.TunedConnector.
+		:param max_in_flight: requests of this client sent at once, further requests wait for one to finish.
+			Bounds the share of a shared session's pool the client can take.
+		"""
 		self.access_key = ak
 		self.secret_key = sk
+		self._signer = Signer(sk)
 		self.base_url = base_url
 		self._pool_size = pool_size
 		self.last_response_headers = {}
 		self._timeouts = aiosonic.Timeouts(request_timeout = request_timeout)
-		self.session = self._init_session()
+		self.scheduler = RequestScheduler(rate_limit, rate_limit_burst) if rate_limit else None
+		self._codec = get_codec(codec) if codec is None or isinstance(codec, str) else codec
+		self.typed = typed
+		self.metrics = metrics
+		self.instruments = instruments
+		self.hedge = hedge
+		self.clock = clock
+		self._log = logging.getLogger(__name__)
+		self._keepalive_task = None
+		self._in_flight = asyncio.Semaphore(max_in_flight) if max_in_flight else None
+		if session is not None and not isinstance(session.connector, TunedConnector):
+			# pool_stats and the keep-alive need its counters, and plain aiosonic never reuses a connection
+			raise ValueError('session needs a bit.connections.TunedConnector, got {}'.format(type(session.connector).__name__))
+		self._owns_session = session is None
+		self.session = self._init_session() if session is None else session
 
 	def _init_session(self) -> aiosonic.HTTPClient:
+		# TunedConnector reuses pooled connections, plain aiosonic opens one per request
 		session = aiosonic.HTTPClient(
-			connector=aiosonic.TCPConnector(
+			connector=TunedConnector(
 				pool_size=self._pool_size,
 				timeouts=self._timeouts,
 			),
 		)
 		return session
 
+	@property
+	def pool_size(self) -> int:
+		"""Max number of pooled connections."""
+		return self._pool_size
+
+	async def warm_up(self, connections = None, *, keepalive = True):
+		"""
+		Open pooled connections ahead of the first orders with concurrent system time requests.
+		:param connections: number of connections to open, pool_size by default
+		:param keepalive: keep idle connections open in the background by sending a system time
+			request over each connection unused for KEEPALIVE_INTERVAL seconds
+		"""
+		count = min(connections or self._pool_size, self._pool_size)
+		await asyncio.gather(*(self.spot_system_time() for _ in range(count)))
+		if keepalive and self._keepalive_task is None:
+			self._keepalive_task = asyncio.create_task(self._keepalive())
+
+	async def _keepalive(self):
+		connector = self.session.connector
+		while True:
+			await asyncio.sleep(self.KEEPALIVE_INTERVAL / 2)
+			idle = connector.idle_connections(self.KEEPALIVE_INTERVAL)
+			if idle:
+				results = await asyncio.gather(*(self.spot_system_time() for _ in range(idle)), return_exceptions = True)
+				for result in results:
+					if isinstance(result, Exception):
+						self._log.warning('Keep-alive request failed: %r', result)
+
+	def pool_stats(self) -> dict:
+		"""Connections in use and idle in the pool, connections created and requests over reused connections."""
+		return self.session.connector.pool_stats()
+
 	async def close(self):
-		await self.session.shutdown()
+		if self._keepalive_task is not None:
+			self._keepalive_task.cancel()
+			with contextlib.suppress(asyncio.CancelledError):
+				await self._keepalive_task
+			self._keepalive_task = None
+		if self.hedge is not None:
+			await self.hedge.close()
+		if self.scheduler:
+			self.scheduler.close()
+		if self._owns_session:
+			await self.session.shutdown()
 
 	#############################
 	# call private API
 	#############################
-	def _get_nonce(self):
-		return str(int(round(time.time() * 1000)))
-
-	def _encode_list(self, item_list):
-		list_val = []
-		for item in item_list:
-			obj_val = self._encode_object(item)
-			list_val.append(obj_val)
-			print(list_val)
-		# list_val = sorted(list_val)
-		output = '&'.join(list_val)
-		output = '[' + output + ']'
-		return output
-
-	def _encode_object(self, obj):
-		if isinstance(obj, (str, int)):
-			return obj
-
-		# treat obj as dict
-		sorted_keys = sorted(obj.keys())
-		ret_list = []
-		for key in sorted_keys:
-			val = obj[key]
-			if isinstance(val, list):
-				list_val = self._encode_list(val)
-				ret_list.append(f'{key}={list_val}')
-			elif isinstance(val, dict):
-				# call encode_object recursively
-				dict_val = self._encode_object(val)
-				ret_list.append(f'{key}={dict_val}')
-			elif isinstance(val, bool):
-				bool_val = str(val).lower()
-				ret_list.append(f'{key}={bool_val}')
-			else:
-				general_val = str(val)
-				ret_list.append(f'{key}={general_val}')
+	def now_ms(self) -> int:
+		"""Exchange time in milliseconds, the local time unless the client has a clock."""
+		if self.clock is not None:
+			return self.clock.now_ms()
+		return int(round(time.time() * 1000))
 
-		sorted_list = sorted(ret_list)
-		output = '&'.join(sorted_list)
-		return output
+	def _get_nonce(self):
+		return str(self.now_ms())
 
 	def _get_signature(self, http_method, api_path, param_map):
-		str_to_sign = api_path + '&' + self._encode_object(param_map)
-		sig = hmac.new(self.secret_key.encode('utf-8'), str_to_sign.encode('utf-8'),
-					   digestmod=hashlib.sha256).hexdigest()
-		return sig
+		return self._signer.sign(api_path, param_map)
 
 	def _get_str(self, x):
 		if isinstance(x, bool):
@@ -154,11 +220,120 @@ class RestClient(object):
 		else:
 			return str(x)
 
+	def _to_models(self, model, data):
+		if not self.typed:
+			return data
+		if type(data) is list:
+			return [model(item) for item in data]
+		return model(data, data.get('timestamp'))
+
+	def _normalize_order(self, req):
+		if self.instruments is None or 'pair' not in req:
+			return req
+		return self.instruments.normalize(req)
+
+	def _normalize_batch(self, req):
+		if self.instruments is None or not req.get('orders_data'):
+			return req
+		return dict(req, orders_data = [self._normalize_order(order) for order in req['orders_data']])
+
+	def _get_priority(self, path, method):
+		if path in CANCEL_PATHS:
+			return Priority.CANCEL
+		if path in AMEND_PATHS:
+			return Priority.AMEND
+		if method != HttpMethod.GET:
+			return Priority.ORDER
+		return Priority.QUERY
+
 	async def _call_private_api(self, path, method="GET", param_map=None, private=True):
 		if param_map is None:
 			param_map = {}
 
+		send = self._send_request if self.metrics is None else self._send_measured
+		if self._in_flight is not None:
+			send = functools.partial(self._send_limited, send)
+		if self.hedge is not None and self._is_hedged(path, method, param_map):
+			send = functools.partial(self._send_hedged, send)
+		if self.scheduler is None:
+			return await send(path, method, param_map, private)
+
+		# Wait for the scheduler before signing so that queued requests don't carry stale timestamps
+		priority = self._get_priority(path, method)
+		for attempt in range(self.RATE_LIMIT_RETRIES + 1):
+			if self.metrics is None:
+				await self.scheduler.acquire(priority)
+			else:
+				start = time.perf_counter()
+				await self.scheduler.acquire(priority)
+				self.metrics.observe(REST_QUEUE_WAIT, time.perf_counter() - start, Priority.NAMES[priority])
+			try:
+				return await send(path, method, param_map, private)
+			except BitAPIException as e:
+				if e.code != 429 or attempt == self.RATE_LIMIT_RETRIES:
+					raise
+
+	def _is_hedged(self, path, method, param_map):
+		if method == HttpMethod.GET:
+			return self.hedge.paths is None or path in self.hedge.paths
+		return self.hedge.orders and path in HEDGED_ORDER_PATHS and bool(param_map.get('label'))
+
+	async def _send_hedged(self, send, path, method, param_map, private):
+		settle = None
+		if method != HttpMethod.GET:
+			settle = functools.partial(self._cancel_duplicates, path, param_map)
+		# Every attempt gets its own copy, _send_request adds the timestamp and signature to it
+		return await self.hedge.run(path, lambda: send(path, method, dict(param_map), private), settle)
+
+	async def _cancel_duplicates(self, path, order_req, kept):
+		"""
+		Cancel the orders placed by the attempts of a hedged order, found by its label, except the kept
+		one, or the oldest one when the caller got none. Returns the number of duplicates found.
+		"""
+		query = {'label': order_req['label']}
+		if order_req.get('pair'):
+			query['pair'] = order_req['pair']
+		orders = await self._call_private_api(path, HttpMethod.GET, query)
+		if not orders:
+			return 0
+		kept_id = kept.get('order_id') if kept else min(orders, key = lambda order: order.get('created_at') or 0)['order_id']
+		duplicates = 0
+		for order in orders:
+			if order['order_id'] == kept_id:
+				continue
+			if float(order.get('filled_qty') or 0):
+				self._log.error('Duplicate order %s of a hedged request filled %s before it was cancelled', order['order_id'], order['filled_qty'])
+			if order.get('status') not in OPEN_STATUSES:
+				continue
+			self._log.warning('Cancelling duplicate order %s of a hedged request', order['order_id'])
+			params = {'order_id': order['order_id']}
+			if order.get('pair'):
+				params['pair'] = order['pair']
+			await self._call_private_api(HEDGED_ORDER_PATHS[path], HttpMethod.POST, params)
+			duplicates += 1
+		return duplicates
+
+	async def _send_limited(self, send, path, method, param_map, private):
+		async with self._in_flight:
+			return await send(path, method, param_map, private)
+
+	async def _send_measured(self, path, method, param_map, private):
+		start = time.perf_counter()
+		status = 'ok'
+		try:
+			return await self._send_request(path, method, param_map, private)
+		except BitAPIException as e:
+			status = str(e.code)
+			raise
+		except BaseException as e:
+			status = type(e).__name__
+			raise
+		finally:
+			self.metrics.observe(REST_LATENCY, time.perf_counter() - start, method, path, status)
+
+	async def _send_request(self, path, method, param_map, private):
 		if private:
+			param_map.pop('signature', None)
 			nonce = self._get_nonce()
 			param_map['timestamp'] = nonce
 
@@ -173,7 +348,6 @@ class RestClient(object):
 			query_string = '&'.join([f'{k}={self._get_str(v)}' for k, v in param_map.items()])
 			url += '?' + query_string
 		else:
-			# js = ujson.loads(ujson.dumps(param_map))
 			js = param_map
 			js['timestamp'] = int(js['timestamp'])
 
@@ -181,21 +355,30 @@ class RestClient(object):
 		if js:
 			headers['Content-Type'] = 'application/json'
 
+		if self.clock is None:
+			res = await self.session.request(
+				url = url, method = method, headers = headers, data = self._codec.dumps(js)
+			)
+			return await self._handle_response(url, js, res)
+		sent = time.time()
 		res = await self.session.request(
-			url = url, method = method, headers = headers, data = ujson.dumps(js)
+			url = url, method = method, headers = headers, data = self._codec.dumps(js)
 		)
-		return await self._handle_response(url, js, res)
+		return await self._handle_response(url, js, res, (sent, time.time()))
 
-	async def _handle_response(self, uri: str, params: str, response: aiosonic.HttpResponse):
+	async def _handle_response(self, uri: str, params: str, response: aiosonic.HttpResponse, timing = None):
 		"""Internal helper for handling API responses from the Binance server.
 		Raises the appropriate exceptions when necessary; otherwise, returns the
 		response.
+		:param timing: local send and receive times of the request, sampled by the clock with the response timestamp
 		"""
+		if self.scheduler:
+			self.scheduler.update(response.headers, response.status_code)
 		if not str(response.status_code).startswith("2"):
 			raise BitAPIException(uri, params, response, response.status_code, await response.text())
 		self.last_response_headers = response.headers
 		try:
-			content = ujson.loads(await response.content())
+			content = self._codec.loads(await response.content())
 		except ValueError:
 			raise BitAPIException(uri, params, response, 2, await response.text())
 		except AttributeError:
@@ -205,10 +388,12 @@ class RestClient(object):
 			# AttributeError: 'NoneType' object has no attribute 'reader'
 			raise BitAPIException(uri, params, response, 1, 'Connection lost during _handle_response')
 
+		if timing is not None and 'timestamp' in content:
+			self.clock.sample(timing[0], timing[1], content['timestamp'])
 		if content['code'] != 0:
 			raise BitAPIException(uri, params, response, content['code'], content['message'])
 		# Unwrap nexted data key and drop code/message keys
-		if 'timestamp' in content:
+		if 'timestamp' in content and type(content['data']) is dict:
 			content['data']['timestamp'] = content['timestamp']
 		return content['data']
 
@@ -217,11 +402,17 @@ class RestClient(object):
 	######################
 
 	async def spot_market_trades(self, **params):
-		return await self._call_private_api(V1_SPOT_MARKET_TRADES, HttpMethod.GET, private = False, param_map = params)
+		return self._to_models(Trade, await self._call_private_api(V1_SPOT_MARKET_TRADES, HttpMethod.GET, private = False, param_map = params))
+
+	async def spot_market_orderbooks(self, **params):
+		return await self._call_private_api(V1_SPOT_MARKET_ORDERBOOKS, HttpMethod.GET, private = False, param_map = params)
 
 	async def spot_query_instruments(self, **params):
 		return await self._call_private_api(V1_SPOT_INSTRUMENTS, HttpMethod.GET, private = False, param_map = params)
 
+	async def spot_system_time(self):
+		return await self._call_private_api(V1_SPOT_SYSTEM_TIME, HttpMethod.GET, private = False)
+
 
 	######################
 	# SPOT endpoints
@@ -236,31 +427,39 @@ class RestClient(object):
 		return await self._call_private_api(V1_SPOT_TRANSACTION_LOGS, HttpMethod.GET, params)
 
 	async def spot_query_orders(self, **params):
-		return await self._call_private_api(V1_SPOT_ORDERS, HttpMethod.GET, params)
+		return self._to_models(Order, await self._call_private_api(V1_SPOT_ORDERS, HttpMethod.GET, params))
 
 	async def spot_query_open_orders(self, **params):
-		return await self._call_private_api(V1_SPOT_OPENORDERS, HttpMethod.GET, params)
+		return self._to_models(Order, await self._call_private_api(V1_SPOT_OPENORDERS, HttpMethod.GET, params))
 
 	async def spot_query_trades(self, **params):
-		return await self._call_private_api(V1_SPOT_USER_TRADES, HttpMethod.GET, params)
+		return self._to_models(UserTrade, await self._call_private_api(V1_SPOT_USER_TRADES, HttpMethod.GET, params))
+
+	def spot_iter_trades(self, *, concurrency = 4, windows = 1, page_size = PAGE_SIZE, **params):
+		"""Async iterator over all pages of spot_query_trades, see bit.pagination.paginate."""
+		return paginate(self.spot_query_trades, params, page_size = page_size, concurrency = concurrency, windows = windows)
+
+	def spot_iter_transactions(self, *, concurrency = 4, windows = 1, page_size = PAGE_SIZE, **params):
+		"""Async iterator over all pages of spot_query_transactions, see bit.pagination.paginate."""
+		return paginate(self.spot_query_transactions, params, page_size = page_size, concurrency = concurrency, windows = windows)
 
 	async def spot_place_order(self, **order_req):
-		return await self._call_private_api(V1_SPOT_ORDERS, HttpMethod.POST, order_req)
+		return await self._call_private_api(V1_SPOT_ORDERS, HttpMethod.POST, self._normalize_order(order_req))
 
 	async def spot_cancel_order(self, **cancel_req):
 		return await self._call_private_api(V1_SPOT_CANCEL_ORDERS, HttpMethod.POST, cancel_req)
 
 	async def spot_amend_order(self, **req):
-		return await self._call_private_api(V1_SPOT_AMEND_ORDERS, HttpMethod.POST, req)
+		return await self._call_private_api(V1_SPOT_AMEND_ORDERS, HttpMethod.POST, self._normalize_order(req))
 
 	async def spot_ws_auth(self):
 		return await self._call_private_api(V1_SPOT_WS_AUTH, HttpMethod.GET)
 
 	async def spot_new_batch_orders(self, **req):
-		return await self._call_private_api(V1_SPOT_BATCH_ORDERS, HttpMethod.POST, req)
+		return await self._call_private_api(V1_SPOT_BATCH_ORDERS, HttpMethod.POST, self._normalize_batch(req))
 
 	async def spot_amend_batch_orders(self, **req):
-		return await self._call_private_api(V1_SPOT_AMEND_BATCH_ORDERS, HttpMethod.POST, req)
+		return await self._call_private_api(V1_SPOT_AMEND_BATCH_ORDERS, HttpMethod.POST, self._normalize_batch(req))
 
 	async def spot_query_mmp_state(self, **req):
 		return await self._call_private_api(V1_SPOT_MMP_STATE, HttpMethod.GET, req)
@@ -284,11 +483,15 @@ class RestClient(object):
 		return await self._call_private_api(V1_UM_ACCOUNT_MODE, HttpMethod.GET)
 
 	async def um_query_accounts(self):
-		return await self._call_private_api(V1_UM_ACCOUNTS, HttpMethod.GET)
+		return self._to_models(UMAccount, await self._call_private_api(V1_UM_ACCOUNTS, HttpMethod.GET))
 
 	async def um_query_transactions(self, **param):
 		return await self._call_private_api(V1_UM_TRANSACTIONS, HttpMethod.GET, param)
 
+	def um_iter_transactions(self, *, concurrency = 4, windows = 1, page_size = PAGE_SIZE, **params):
+		"""Async iterator over all pages of um_query_transactions, see bit.pagination.paginate."""
+		return paginate(self.um_query_transactions, params, page_size = page_size, concurrency = concurrency, windows = windows)
+
 	async def um_query_interest_records(self, **param):
 		return await self._call_private_api(V1_UM_INTEREST_RECORDS, HttpMethod.GET, param)
 
@@ -299,16 +502,20 @@ class RestClient(object):
 		return await self._call_private_api(V1_LINEAR_ACCOUNT_CONFIGS, HttpMethod.GET, req)
 
 	async def linear_query_positions(self, **params):
-		return await self._call_private_api(V1_LINEAR_POSITIONS, HttpMethod.GET, params)
+		return self._to_models(Position, await self._call_private_api(V1_LINEAR_POSITIONS, HttpMethod.GET, params))
 
 	async def linear_query_orders(self, **params):
-		return await self._call_private_api(V1_LINEAR_ORDERS, HttpMethod.GET, params)
+		return self._to_models(Order, await self._call_private_api(V1_LINEAR_ORDERS, HttpMethod.GET, params))
 
 	async def linear_query_open_orders(self, **params):
-		return await self._call_private_api(V1_LINEAR_OPENORDERS, HttpMethod.GET, params)
+		return self._to_models(Order, await self._call_private_api(V1_LINEAR_OPENORDERS, HttpMethod.GET, params))
 
 	async def linear_query_trades(self, **params):
-		return await self._call_private_api(V1_LINEAR_USER_TRADES, HttpMethod.GET, params)
+		return self._to_models(UserTrade, await self._call_private_api(V1_LINEAR_USER_TRADES, HttpMethod.GET, params))
+
+	def linear_iter_trades(self, *, concurrency = 4, windows = 1, page_size = PAGE_SIZE, **params):
+		"""Async iterator over all pages of linear_query_trades, see bit.pagination.paginate."""
+		return paginate(self.linear_query_trades, params, page_size = page_size, concurrency = concurrency, windows = windows)
 
 	async def linear_place_order(self, **order_req):
 		return await self._call_private_api(V1_LINEAR_ORDERS, HttpMethod.POST, order_req)
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import zlib
+from typing import Dict, List, Optional
+
+from bit.auth import TokenCache
+from bit.rest_client import RestClient
+from bit.web_socket_client import WebSocketClient
+
+
+class ShardedWebSocketClient:
+    """
+    Spreads subscriptions over several websocket connections.
+
+    Every shard is a regular WebSocketClient with its own connection and receive loop, so decoding
+    and dispatch of busy pairs don't hold up the others and a disconnect only affects one shard.
+    Subscriptions are assigned by pair (``shard_by='pair'``) or by channel (``shard_by='channel'``):
+    a new key goes to the least loaded shard, ties broken by the key hash, and keys are moved from
+    the most to the least loaded shard when unsubscribing leaves the shards unbalanced.
+
+    All shards share one auth token fetched over a single RestClient. The subscribe API is the same
+    as WebSocketClient's.
+    """
+    def __init__(
+        self, api_key, api_secret, *, shards: int = 4, shard_by: str = 'pair', rest_client: Optional[RestClient] = None,
+        **client_kwargs,
+    ):
+        """
+        :param rest_client: RestClient fetching the shared token, closed with this client. It isn't passed on
+            to the shards, which would each close it, they create their own when they need one.
+        :param client_kwargs: passed on to every WebSocketClient
+        """
+        if shard_by not in ('pair', 'channel'):
+            raise ValueError('shard_by must be pair or channel')
+        self._log = logging.getLogger(__name__)
+        self.key = api_key
+        self.secret = api_secret
+        self.shard_by = shard_by
+        self._rest_client = rest_client or RestClient(
+            api_key, api_secret, client_kwargs.get('rest_url') or RestClient.API_URL, clock = client_kwargs.get('clock'),
+        )
+        self.tokens = TokenCache(self._fetch_token)
+        self.shards: List[WebSocketClient] = [
+            WebSocketClient(api_key, api_secret, token_coro = self.tokens.get, **client_kwargs) for _ in range(shards)
+        ]
+        # Pair or channel -> shard index
+        self._assignments: Dict[str, int] = {}
+        self._loads = [0] * shards
+
+    async def _fetch_token(self):
+        ret = await self._rest_client.spot_ws_auth()
+        return ret['token']
+
+    async def start(self):
+        await asyncio.gather(*(shard.start() for shard in self.shards))
+
+    def shard_of(self, key: str) -> Optional[WebSocketClient]:
+        """Shard serving a pair or a channel, depending on shard_by."""
+        index = self._assignments.get(key)
+        return None if index is None else self.shards[index]
+
+    def _assign(self, key: str) -> int:
+        index = self._assignments.get(key)
+        if index is None:
+            n = len(self.shards)
+            offset = zlib.crc32(key.encode()) % n
+            index = min(range(n), key = lambda i: (self._loads[i], (i - offset) % n))
+            self._assignments[key] = index
+            self._loads[index] += 1
+        return index
+
+    async def subscribe(self, *, coro, channels: List[str], pairs: List[str], interval: Optional[str] = '', **kwargs):
+        """Subscribe data on the shards owning the pairs or channels, see WebSocketClient.subscribe."""
+        if not pairs:
+            pairs = ['']
+        if self.shard_by == 'pair':
+            groups = {}
+            for p in pairs:
+                groups.setdefault(self._assign(p), []).append(p)
+            await asyncio.gather(*(
+                self.shards[index].subscribe(coro = coro, channels = channels, pairs = group, interval = interval, **kwargs)
+                for index, group in groups.items()
+            ))
+        else:
+            groups = {}
+            for ch in channels:
+                groups.setdefault(self._assign(ch), []).append(ch)
+            await asyncio.gather(*(
+                self.shards[index].subscribe(coro = coro, channels = group, pairs = pairs, interval = interval, **kwargs)
+                for index, group in groups.items()
+            ))
+
+    async def unsubscribe(self, channel, id_):
+        """unsubscribe a symbol/account from channel"""
+        key = id_ if self.shard_by == 'pair' else channel
+        index = self._assignments[key]
+        shard = self.shards[index]
+        await shard.unsubscribe(channel, id_)
+        if not self._has_key(shard, key):
+            del self._assignments[key]
+            self._loads[index] -= 1
+            await self._rebalance()
+
+    def _has_key(self, shard: WebSocketClient, key: str) -> bool:
+        if self.shard_by == 'channel':
+            return key in shard.subscribers
+        return any(key in channel_data for channel_data in shard.subscribers.values())
+
+    async def _rebalance(self):
+        while True:
+            source = max(range(len(self.shards)), key = self._loads.__getitem__)
+            target = min(range(len(self.shards)), key = self._loads.__getitem__)
+            if self._loads[source] - self._loads[target] <= 1:
+                return
+            key = next(k for k, index in self._assignments.items() if index == source)
+            await self._move(key, source, target)
+
+    async def _move(self, key: str, source: int, target: int):
+        old, new = self.shards[source], self.shards[target]
+        if self.shard_by == 'pair':
+            subscriptions = [
+                (channel, key) for channel, channel_data in old.subscribers.items() if key in channel_data
+            ]
+        else:
+            subscriptions = [(key, pair) for pair in old.subscribers.get(key, ())]
+        self._log.info('Moving %s from shard %d to shard %d', key, source, target)
+
+        # Subscribe on the new shard first so that no message is missed, duplicates are possible meanwhile
+        for channel, pair in subscriptions:
+            interval = old.intervals[channel][pair]
+            for coro in old.subscribers[channel][pair]:
+                # Not a truth test, an empty mailbox has len 0
+                mailbox = old.mailbox_of(coro)
+                await new.subscribe(
+                    coro = coro, channels = [channel], pairs = [pair], interval = interval,
+                    delivery = None if mailbox is None else mailbox.policy,
+                    max_queue = None if mailbox is None else mailbox.max_queue,
+                )
+        self._assignments[key] = target
+        self._loads[source] -= 1
+        self._loads[target] += 1
+        for channel, pair in subscriptions:
+            await old.unsubscribe(channel, pair)
+
+    def stats(self) -> List[dict]:
+        """Per shard number of assigned keys, subscriptions and connection state."""
+        return [
+            {
+                'keys': self._loads[i],
+                'subscriptions': sum(len(channel_data) for channel_data in shard.subscribers.values()),
+                'connected': shard.ws.connected.is_set(),
+            }
+            for i, shard in enumerate(self.shards)
+        ]
+
+    async def close(self):
+        await asyncio.gather(*(shard.close() for shard in self.shards))
+        await self.tokens.close()
+        await self._rest_client.close()
@@ -0,0 +1,444 @@
+"""
+Fan-out of decoded market data to worker processes through a shared memory ring buffer.
+
+One process owns the websocket connections: ``SharedMemoryPublisher`` subscribes channels on its
+WebSocketClient and writes every message it receives, as delivered to subscribers, into a
+``multiprocessing.shared_memory`` block. Worker processes attach a ``SharedMemorySubscriber`` to the
+block by name and subscribe coroutines with the (channel, pair) API of WebSocketClient, so the
+exchange sees one connection however many processes consume the data.
+
+Layout: a header (write position, messages written, reader slots) followed by the ring of records.
+A record holds its length, channel, pair and the JSON encoded data, it never wraps around the end
+of the ring, a zero length marks the rest of the ring as unused. Positions only grow, the offset in
+the ring is the position modulo its capacity.
+
+The publisher never waits for readers. It announces the end of the record it is about to write
+before writing it, a reader checks after decoding a record that it wasn't being overwritten
+meanwhile, otherwise the reader fell more than the ring capacity behind: it counts an overrun and
+the messages it lost and continues from the newest message. Readers decode records straight from
+the shared buffer (orjson and msgspec accept memoryviews), records of channels and pairs nobody in
+the reader subscribed to are skipped without decoding.
+
+Every reader publishes its position, messages read and overruns in its header slot, so
+``SharedMemoryPublisher.stats`` shows the lag of every worker.
+
+The publisher owns the block: it creates it and removes it on close. Readers only map it, they don't
+register it with the multiprocessing resource tracker, whose cleanup would otherwise remove the block
+when the first reader started outside of multiprocessing exits. On Linux readers map the file of the
+block in /dev/shm, elsewhere they need Python 3.13 to attach untracked (Windows has no tracker).
+
+Publisher process::
+
+    publisher = SharedMemoryPublisher(client, name = 'bit-market')
+    await publisher.subscribe(channels = ['depth', 'trade'], pairs = ['BTC-USDT'])
+
+Worker processes::
+
+    reader = SharedMemorySubscriber('bit-market')
+    await reader.subscribe(coro = on_trade, channels = ['trade'], pairs = ['BTC-USDT'])
+    await reader.start()
+"""
+import asyncio
+import contextlib
+import logging
+import mmap
+import os
+import struct
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from bit.codec import get_codec
+from bit.models import CHANNEL_MODELS, Model
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MAGIC = b'BITSHM01'
+
+# Header fields, 8 bytes each
+_CAPACITY = 8
+_MAX_READERS = 16
+_WRITE_POS = 24
+_MESSAGES = 32
+_RESERVE_POS = 40
+_CLOSED = 48
+_SLOTS = 64
+# Reader slot: pid, position, messages read, overruns
+_SLOT_SIZE = 32
+
+_U64 = struct.Struct('<Q')
+_U32 = struct.Struct('<I')
+_SLOT = struct.Struct('<QQQQ')
+# Record header: length including header and padding, data length, channel length, pair length
+_RECORD = struct.Struct('<IIHH')
+
+# Codecs decoding memoryviews, the others get a copy of the record
+_BUFFER_CODECS = frozenset(('orjson', 'msgspec'))
+
+# Files of POSIX shared memory blocks on Linux
+_SHM_DIR = '/dev/shm'
+
+
+def _data_offset(max_readers: int) -> int:
+    return (_SLOTS + max_readers * _SLOT_SIZE + 63) // 64 * 64
+
+
+class SharedMemoryPublisher:
+    """Writes the messages of a WebSocketClient's subscriptions into a shared memory ring."""
+    SIZE = 64 * 1024 * 1024
+    MAX_READERS = 64
+
+    def __init__(
+        self, ws_client, *, name: Optional[str] = None, size: int = SIZE, max_readers: int = MAX_READERS, codec = None,
+    ):
+        """
+        :param ws_client: WebSocketClient whose messages are published
+        :param name: name of the shared memory block the readers attach to, a random one by default
+        :param size: ring capacity in bytes, a record can use at most a quarter of it
+        :param max_readers: reader slots for lag tracking
+        :param codec: bit.codec.Codec or backend name, the default codec by default
+        """
+        self._log = logging.getLogger(__name__)
+        self.ws_client = ws_client
+        self._codec = get_codec(codec) if codec is None or isinstance(codec, str) else codec
+        self.capacity = size // 8 * 8
+        self.max_readers = max_readers
+        self._data = _data_offset(max_readers)
+        self.shm = shared_memory.SharedMemory(name = name, create = True, size = self._data + self.capacity)
+        self.name = self.shm.name
+        self._buf = self.shm.buf
+        self._buf[:self._data] = bytes(self._data)
+        self._buf[0:8] = MAGIC
+        _U64.pack_into(self._buf, _CAPACITY, self.capacity)
+        _U64.pack_into(self._buf, _MAX_READERS, max_readers)
+        self.position = 0
+        self.messages = 0
+        self._names: Dict[str, bytes] = {}
+
+    async def subscribe(self, *, channels: List[str], pairs: List[str], interval: Optional[str] = ''):
+        """Subscribe channels of pairs on the websocket client and publish their messages."""
+        await self.ws_client.subscribe(coro = self.publish, channels = channels, pairs = pairs, interval = interval)
+
+    async def publish(self, channel, pair, data):
+        """WebSocketClient subscriber writing the message into the ring."""
+        self.write(channel, pair, data)
+
+    def write(self, channel: str, pair: str, data):
+        if isinstance(data, Model):
+            data = data.to_dict()
+        elif type(data) is list and data and isinstance(data[0], Model):
+            data = [item.to_dict() for item in data]
+        payload = self._codec.dumps(data).encode()
+        channel_b = self._name(channel)
+        pair_b = self._name(pair)
+        header = _RECORD.size + len(channel_b) + len(pair_b)
+        length = (header + len(payload) + 7) // 8 * 8
+        if length > self.capacity // 4:
+            raise ValueError('Message of {} bytes too large for a ring of {} bytes'.format(length, self.capacity))
+
+        buf = self._buf
+        position = self.position
+        offset = position % self.capacity
+        wrap = offset + length > self.capacity
+        end = position + length + (self.capacity - offset if wrap else 0)
+        # Readers of the data overwritten from here on detect the overrun
+        _U64.pack_into(buf, _RESERVE_POS, end)
+        if wrap:
+            _U32.pack_into(buf, self._data + offset, 0)
+            offset = 0
+        start = self._data + offset
+        _RECORD.pack_into(buf, start, length, len(payload), len(channel_b), len(pair_b))
+        start += _RECORD.size
+        buf[start:start + len(channel_b)] = channel_b
+        start += len(channel_b)
+        buf[start:start + len(pair_b)] = pair_b
+        start += len(pair_b)
+        buf[start:start + len(payload)] = payload
+        self.position = end
+        self.messages += 1
+        _U64.pack_into(buf, _MESSAGES, self.messages)
+        _U64.pack_into(buf, _WRITE_POS, end)
+
+    def _name(self, name: str) -> bytes:
+        encoded = self._names.get(name)
+        if encoded is None:
+            encoded = self._names[name] = (name or '').encode()
+        return encoded
+
+    def stats(self) -> dict:
+        """Messages and bytes written and lag, messages read and overruns of every attached reader."""
+        readers = []
+        for slot in range(self.max_readers):
+            pid, position, messages, overruns = _SLOT.unpack_from(self._buf, _SLOTS + slot * _SLOT_SIZE)
+            if not pid:
+                continue
+            readers.append({
+                'pid': pid, 'slot': slot, 'lag_bytes': self.position - position, 'lag_messages': self.messages - messages,
+                'messages': messages, 'overruns': overruns,
+            })
+        return {'messages': self.messages, 'bytes': self.position, 'capacity': self.capacity, 'readers': readers}
+
+    def close(self):
+        """Tell readers the publisher stopped and remove the shared memory block."""
+        _U64.pack_into(self._buf, _CLOSED, 1)
+        self._buf = None
+        self.shm.close()
+        with contextlib.suppress(FileNotFoundError):
+            self.shm.unlink()
+
+
+class SharedMemorySubscriber:
+    """
+    Reads a SharedMemoryPublisher's ring from another process and delivers the messages to
+    subscribers like WebSocketClient does.
+    """
+    # Seconds slept when the ring has no new message
+    POLL_INTERVAL = 0.0005
+    # Messages handled before yielding to the event loop
+    BATCH = 1000
+    # Messages read between updates of the reader slot within a batch
+    SLOT_UPDATE = 64
+
+    def __init__(self, name: str, *, codec = None, typed: bool = False, poll_interval: float = POLL_INTERVAL):
+        """
+        :param name: name of the publisher's shared memory block
+        :param codec: bit.codec.Codec or backend name, same encoding as the publisher's
+        :param typed: deliver trade, depth, order, user_trade and um_account data as bit.models objects
+        :param poll_interval: seconds slept when there is no new message
+        """
+        self._log = logging.getLogger(__name__)
+        self._codec = get_codec(codec) if codec is None or isinstance(codec, str) else codec
+        self._from_buffer = self._codec.name in _BUFFER_CODECS
+        self._models = CHANNEL_MODELS if typed else {}
+        self.poll_interval = poll_interval
+        self.shm = _attach(name)
+        self._buf = self.shm.buf
+        if bytes(self._buf[0:8]) != MAGIC:
+            self.shm.close()
+            raise ValueError('Shared memory block {} was not created by SharedMemoryPublisher'.format(name))
+        self.capacity = _U64.unpack_from(self._buf, _CAPACITY)[0]
+        self.max_readers = _U64.unpack_from(self._buf, _MAX_READERS)[0]
+        self._data = _data_offset(self.max_readers)
+        self.slot: Optional[int] = None
+        self.position = 0
+        self.messages = 0
+        self.overruns = 0
+        # Messages overwritten before this reader got to them
+        self.lost = 0
+        self.subscribers: Dict[str, Dict[str, set]] = {}
+        # (channel, pair) as bytes -> (channel, pair, subscribers)
+        self._dispatch: Dict[Tuple[bytes, bytes], tuple] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def subscribe(self, *, coro, channels: List[str], pairs: List[str], interval: Optional[str] = ''):
+        """
+        Deliver messages of channels and pairs the publisher publishes to coro(channel, pair, data).
+        interval is accepted for compatibility with WebSocketClient.subscribe, the publisher's applies.
+        """
+        if not pairs:
+            pairs = ['']
+        for channel in channels:
+            channel_data = self.subscribers.setdefault(channel, {})
+            for pair in pairs:
+                channel_data.setdefault(pair, set()).add(coro)
+        self._rebuild_dispatch()
+
+    async def unsubscribe(self, channel, id_):
+        del self.subscribers[channel][id_]
+        if not self.subscribers[channel]:
+            del self.subscribers[channel]
+        self._rebuild_dispatch()
+
+    def _rebuild_dispatch(self):
+        self._dispatch = {
+            (channel.encode(), pair.encode()): (channel, pair, tuple(subscribers))
+            for channel, channel_data in self.subscribers.items() for pair, subscribers in channel_data.items()
+        }
+
+    async def start(self):
+        """Claim a reader slot and deliver the messages published from now on."""
+        if self._task is not None:
+            return
+        self._claim_slot()
+        self.position = _U64.unpack_from(self._buf, _WRITE_POS)[0]
+        self.messages = _U64.unpack_from(self._buf, _MESSAGES)[0]
+        self._update_slot()
+        self._task = asyncio.create_task(self._run())
+
+    def _claim_slot(self):
+        fd = getattr(self.shm, 'fd', -1)
+        locked = fcntl is not None and fd >= 0
+        if locked:
+            # Readers starting at the same time would claim the same free slot
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            for slot in range(self.max_readers):
+                pid = _U64.unpack_from(self._buf, _SLOTS + slot * _SLOT_SIZE)[0]
+                if not pid or not _alive(pid):
+                    self.slot = slot
+                    _SLOT.pack_into(self._buf, _SLOTS + slot * _SLOT_SIZE, os.getpid(), 0, 0, 0)
+                    return
+        finally:
+            if locked:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        self._log.warning('No free reader slot in %s, lag of this reader is not published', self.shm.name)
+
+    def _update_slot(self):
+        if self.slot is not None:
+            _SLOT.pack_into(self._buf, _SLOTS + self.slot * _SLOT_SIZE, os.getpid(), self.position, self.messages, self.overruns)
+
+    @property
+    def closed(self) -> bool:
+        """Whether the publisher closed the ring."""
+        return bool(_U64.unpack_from(self._buf, _CLOSED)[0])
+
+    def lag(self) -> Tuple[int, int]:
+        """Bytes and messages published and not read yet."""
+        return (
+            _U64.unpack_from(self._buf, _WRITE_POS)[0] - self.position,
+            _U64.unpack_from(self._buf, _MESSAGES)[0] - self.messages,
+        )
+
+    async def _run(self):
+        while True:
+            try:
+                read = await self.read()
+            except Exception:
+                self._log.exception('Shared memory subscriber failed')
+                read = 0
+            if not read:
+                if self.closed:
+                    self._log.warning('Publisher of %s closed', self.shm.name)
+                    return
+                await asyncio.sleep(self.poll_interval)
+            else:
+                await asyncio.sleep(0)
+
+    async def read(self) -> int:
+        """Deliver up to BATCH pending messages, returns how many were read."""
+        buf = self._buf
+        data_offset = self._data
+        capacity = self.capacity
+        dispatch = self._dispatch
+        loads = self._codec.loads
+        read = 0
+        while read < self.BATCH:
+            write_pos = _U64.unpack_from(buf, _WRITE_POS)[0]
+            position = self.position
+            if position >= write_pos:
+                break
+            offset = data_offset + position % capacity
+            if not _U32.unpack_from(buf, offset)[0]:
+                if not self._overwritten(position):
+                    self.position = position + capacity - position % capacity
+                continue
+            length, size, channel_size, pair_size = _RECORD.unpack_from(buf, offset)
+            start = offset + _RECORD.size
+            entry = dispatch.get((bytes(buf[start:start + channel_size]), bytes(buf[start + channel_size:start + channel_size + pair_size])))
+            data = None
+            if entry is not None:
+                start += channel_size + pair_size
+                view = buf[start:start + size]
+                try:
+                    data = loads(view if self._from_buffer else bytes(view))
+                except ValueError:
+                    # Torn by the publisher, the overrun check below discards it
+                    pass
+                finally:
+                    view.release()
+            if self._overwritten(position):
+                continue
+            self.position = position + length
+            self.messages += 1
+            read += 1
+            if not read % self.SLOT_UPDATE:
+                self._update_slot()
+            if entry is not None:
+                channel, pair, subscribers = entry
+                model = self._models.get(channel) if self._models else None
+                if model is not None:
+                    data = model.from_list(data) if type(data) is list else model(data, data.get('timestamp'))
+                for subscriber in subscribers:
+                    await subscriber(channel, pair, data)
+        if read:
+            self._update_slot()
+        return read
+
+    def _overwritten(self, position: int) -> bool:
+        # The publisher may have started overwriting the record at position
+        reserved = _U64.unpack_from(self._buf, _RESERVE_POS)[0]
+        if reserved - position <= self.capacity:
+            return False
+        messages = _U64.unpack_from(self._buf, _MESSAGES)[0]
+        self.position = _U64.unpack_from(self._buf, _WRITE_POS)[0]
+        self.overruns += 1
+        self.lost += messages - self.messages
+        self._log.warning('Reader of %s overrun, %d messages lost', self.shm.name, messages - self.messages)
+        self.messages = messages
+        self._update_slot()
+        return True
+
+    def stats(self) -> dict:
+        lag_bytes, lag_messages = self.lag()
+        return {
+            'slot': self.slot, 'messages': self.messages, 'lag_bytes': lag_bytes, 'lag_messages': lag_messages,
+            'overruns': self.overruns, 'lost': self.lost,
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self.slot is not None:
+            _SLOT.pack_into(self._buf, _SLOTS + self.slot * _SLOT_SIZE, 0, 0, 0, 0)
+            self.slot = None
+        self._buf = None
+        self.shm.close()
+
+
+class _MappedBlock:
+    """Shared memory block mapped from its file in /dev/shm, unknown to the resource tracker."""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.fd = os.open(path, os.O_RDWR)
+        try:
+            self._mmap = mmap.mmap(self.fd, os.fstat(self.fd).st_size)
+        except BaseException:
+            os.close(self.fd)
+            raise
+        self.buf = memoryview(self._mmap)
+
+    def close(self):
+        if self.buf is not None:
+            self.buf.release()
+            self.buf = None
+            self._mmap.close()
+            os.close(self.fd)
+
+
+def _attach(name: str):
+    """Map the block of a publisher without taking ownership of it."""
+    path = os.path.join(_SHM_DIR, name.lstrip('/'))
+    if os.path.exists(path):
+        return _MappedBlock(name, path)
+    try:
+        return shared_memory.SharedMemory(name = name, track = False)
+    except TypeError:
+        # Before Python 3.13 the block is registered with the resource tracker of this process, which
+        # removes it at exit unless the process was started by multiprocessing from the publisher's
+        return shared_memory.SharedMemory(name = name)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
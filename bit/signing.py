@@ -0,0 +1,67 @@
+import hashlib
+import hmac
+
+
+def encode_object(obj) -> str:
+    """
+    Canonical string of request parameters used for signing.
+
+    ``key=val`` pairs of a dict are sorted and joined by ``&``, nested dicts are encoded inline,
+    lists are wrapped in ``[...]`` with items joined by ``&`` and booleans are lowercased.
+    The payload is walked once with an explicit stack instead of recursion and every dict is sorted
+    only once, on its formatted ``key=val`` strings.
+    """
+    if not isinstance(obj, (dict, list)):
+        return 'true' if obj is True else 'false' if obj is False else str(obj)
+
+    stack = []
+    node = obj
+    parts = []
+    # List items are iterated as (None, item) so that they share the loop with dict items
+    items = iter(obj.items()) if isinstance(obj, dict) else zip([None] * len(obj), obj)
+    while True:
+        for key, val in items:
+            if isinstance(val, str):
+                pass
+            elif isinstance(val, bool):
+                val = 'true' if val else 'false'
+            elif isinstance(val, dict):
+                stack.append((node, parts, items, key))
+                node, parts, items = val, [], iter(val.items())
+                break
+            elif isinstance(val, list):
+                stack.append((node, parts, items, key))
+                node, parts, items = val, [], zip([None] * len(val), val)
+                break
+            else:
+                val = str(val)
+            parts.append(val if key is None else key + '=' + val)
+        else:
+            # Current container is exhausted, hand its encoding to the parent
+            if isinstance(node, list):
+                encoded = '[' + '&'.join(parts) + ']'
+            else:
+                parts.sort()
+                encoded = '&'.join(parts)
+            if not stack:
+                return encoded
+            node, parts, items, key = stack.pop()
+            parts.append(encoded if key is None else key + '=' + encoded)
+
+
+class Signer:
+    """
+    HMAC-SHA256 request signer.
+
+    The keyed HMAC state (inner and outer pads) is computed once per secret and copied for every
+    request, which saves re-deriving it from the key on each signature.
+    """
+    __slots__ = ('_hmac',)
+
+    def __init__(self, secret_key: str):
+        self._hmac = hmac.new(secret_key.encode('utf-8'), digestmod = hashlib.sha256)
+
+    def sign(self, api_path: str, param_map) -> str:
+        h = self._hmac.copy()
+        h.update((api_path + '&' + encode_object(param_map)).encode('utf-8'))
+        return h.hexdigest()
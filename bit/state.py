@@ -0,0 +1,382 @@
+"""
+Local state of own orders, fills and positions kept from the private websocket channels.
+
+``StateTracker`` consumes the ``order``, ``user_trade`` and ``um_account`` channels and answers
+open order, fill and position queries from memory instead of polling the REST query endpoints.
+REST snapshots are only fetched on reconnect, when the websocket may have missed updates, and when
+a gap shows up: a while after a fill arrived, its order is still unknown or its filled qty is still
+below the sum of the fills received, so an order update was missed.
+
+Orders and fills are kept as delivered, dicts or bit.models objects of a typed client.
+"""
+import asyncio
+import collections
+import contextlib
+import logging
+from typing import Dict, Iterable, List, Optional
+
+OPEN = 'open'
+FILLED = 'filled'
+CANCELLED = 'cancelled'
+# Statuses after which an order doesn't change anymore
+FINAL_STATUSES = frozenset((FILLED, CANCELLED, 'rejected', 'closed', 'expired'))
+
+
+def _number(value) -> float:
+    if value is None or value == '':
+        return 0.0
+    return float(value)
+
+
+class StateTracker:
+    """
+    Open orders by order_id, label and pair, recent fills and linear positions by pair.
+
+    Use :meth:`on_message` as the websocket subscriber of the order, user_trade and um_account
+    channels and :meth:`on_reconnect` as reconnect listener, ``WebSocketClient.track_state`` does both.
+    Positions of linear pairs are moved by their fills and replaced by REST snapshots on reconciles.
+    """
+    # Final orders kept for lookups after they left the open orders
+    MAX_CLOSED_ORDERS = 1000
+    MAX_FILLS = 10000
+    # Seconds a fill of an unknown or outdated order waits for its order update before a reconcile is started
+    GAP_GRACE = 1.0
+    # Qty by which the fills of an order may exceed its filled qty, rounding of the decimal strings
+    FILL_TOLERANCE = 1e-9
+    # Seconds before retrying a failed reconcile, doubled after every failure in a row up to the max
+    RECONCILE_RETRY_WAIT = 1.0
+    RECONCILE_MAX_RETRY_WAIT = 30.0
+    # Missing open orders whose final state is queried at once during a reconcile
+    RECONCILE_CONCURRENCY = 8
+
+    def __init__(self, rest_client, *, spot_pairs: Iterable[str] = (), linear_pairs: Iterable[str] = ()):
+        """
+        :param rest_client: RestClient used for the snapshots of reconciles
+        :param spot_pairs: spot pairs whose orders are tracked
+        :param linear_pairs: USD-M linear pairs whose orders and positions are tracked
+        """
+        self._log = logging.getLogger(__name__)
+        self._rest_client = rest_client
+        self.spot_pairs = frozenset(spot_pairs)
+        self.linear_pairs = frozenset(linear_pairs)
+        self.open_orders: Dict[str, object] = {}
+        self._by_label: Dict[str, str] = {}
+        self._by_pair: Dict[str, Dict[str, object]] = {}
+        self.closed_orders: 'collections.OrderedDict[str, object]' = collections.OrderedDict()
+        self.fills = collections.deque(maxlen = self.MAX_FILLS)
+        self._fills_by_order: Dict[str, list] = {}
+        self._trade_ids = set()
+        self.positions: Dict[str, dict] = {}
+        # Exchange time (ms) of the position snapshot per pair, older fills are already included
+        self._position_times: Dict[str, int] = {}
+        self.account = None
+        self._waiters: Dict[str, list] = {}
+        self._label_waiters: Dict[str, list] = {}
+        self._gap_checks: Dict[str, asyncio.TimerHandle] = {}
+        # Orders of fills never seen in order updates -> pair, queried on the next reconcile
+        self._unknown_orders: Dict[str, str] = {}
+        self._reconcile_task: Optional[asyncio.Task] = None
+        self._reconcile_again = False
+        self.synced = asyncio.Event()
+        self.reconciles = 0
+        self.gaps = 0
+
+    ######################
+    # Queries
+    ######################
+
+    def get_order(self, order_id: str):
+        """Open or recently closed order."""
+        order = self.open_orders.get(order_id)
+        if order is None:
+            order = self.closed_orders.get(order_id)
+        return order
+
+    def get_order_by_label(self, label: str):
+        order_id = self._by_label.get(label)
+        return None if order_id is None else self.get_order(order_id)
+
+    def orders_of(self, pair: str) -> List:
+        """Open orders of pair."""
+        return list(self._by_pair.get(pair, {}).values())
+
+    def fills_of(self, order_id: str) -> List:
+        return list(self._fills_by_order.get(order_id, ()))
+
+    def position(self, pair: str) -> Optional[dict]:
+        return self.positions.get(pair)
+
+    async def wait_for(self, order_id: str = None, *, label: str = None, status = FINAL_STATUSES, timeout: Optional[float] = None):
+        """
+        Wait until an order reaches one of the statuses and return it.
+
+        Also returns once the order reached another final status, e.g. cancelled while waiting for
+        filled, so check the status of the result.
+
+        :param order_id: order to wait for, or
+        :param label: client label of the order, which may not have been seen yet
+        :param status: status or collection of statuses
+        :param timeout: seconds, raises asyncio.TimeoutError when over
+        """
+        statuses = frozenset((status,)) if isinstance(status, str) else frozenset(status)
+        order = self.get_order(order_id) if order_id is not None else self.get_order_by_label(label)
+        if order is not None and self._reached(order, statuses):
+            return order
+        future = asyncio.get_event_loop().create_future()
+        waiters = self._waiters.setdefault(order_id, []) if order_id is not None else self._label_waiters.setdefault(label, [])
+        entry = (statuses, future)
+        waiters.append(entry)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            with contextlib.suppress(ValueError):
+                waiters.remove(entry)
+            if not waiters:
+                by_key, key = (self._waiters, order_id) if order_id is not None else (self._label_waiters, label)
+                if by_key.get(key) is waiters:
+                    del by_key[key]
+
+    @staticmethod
+    def _reached(order, statuses) -> bool:
+        status = order.get('status')
+        return status in statuses or status in FINAL_STATUSES
+
+    ######################
+    # Websocket updates
+    ######################
+
+    async def on_message(self, channel, pair, data):
+        items = data if type(data) is list else (data,)
+        if channel == 'order':
+            for order in items:
+                self._apply_order(order)
+        elif channel == 'user_trade':
+            for fill in items:
+                self._apply_fill(fill)
+        elif channel == 'um_account':
+            self._apply_account(data)
+
+    async def on_reconnect(self):
+        """Updates may have been missed while disconnected."""
+        self.reconcile()
+
+    def _apply_order(self, order) -> bool:
+        order_id = str(order.get('order_id'))
+        known = self.open_orders.get(order_id)
+        if known is None:
+            known = self.closed_orders.get(order_id)
+        if known is not None and _number(known.get('updated_at')) > _number(order.get('updated_at')):
+            # Out of date, e.g. a snapshot taken before the last websocket update
+            return False
+        self._remove_open(order_id)
+        label = order.get('label')
+        if label:
+            self._by_label[label] = order_id
+        if order.get('status') in FINAL_STATUSES:
+            self.closed_orders[order_id] = order
+            self.closed_orders.move_to_end(order_id)
+            while len(self.closed_orders) > self.MAX_CLOSED_ORDERS:
+                closed_id, closed = self.closed_orders.popitem(last = False)
+                self._fills_by_order.pop(closed_id, None)
+                if closed.get('label') and self._by_label.get(closed.get('label')) == closed_id:
+                    del self._by_label[closed.get('label')]
+        else:
+            self.open_orders[order_id] = order
+            self._by_pair.setdefault(order.get('pair'), {})[order_id] = order
+        gap_check = self._gap_checks.get(order_id)
+        if gap_check is not None and not self._behind(order_id):
+            del self._gap_checks[order_id]
+            gap_check.cancel()
+        self._notify(self._waiters.get(order_id), order)
+        if label:
+            self._notify(self._label_waiters.get(label), order)
+        return True
+
+    def _remove_open(self, order_id: str):
+        order = self.open_orders.pop(order_id, None)
+        if order is not None:
+            orders = self._by_pair.get(order.get('pair'))
+            if orders is not None:
+                orders.pop(order_id, None)
+                if not orders:
+                    del self._by_pair[order.get('pair')]
+
+    def _notify(self, waiters, order):
+        if not waiters:
+            return
+        for statuses, future in waiters:
+            if not future.done() and self._reached(order, statuses):
+                future.set_result(order)
+
+    def _apply_fill(self, fill):
+        trade_id = fill.get('trade_id')
+        if trade_id in self._trade_ids:
+            return
+        if len(self._trade_ids) >= self.MAX_FILLS * 2:
+            self._trade_ids = {f.get('trade_id') for f in self.fills}
+        self._trade_ids.add(trade_id)
+        self.fills.append(fill)
+        order_id = str(fill.get('order_id'))
+        self._fills_by_order.setdefault(order_id, []).append(fill)
+        pair = fill.get('pair')
+        if pair in self.linear_pairs and _number(fill.get('created_at')) > self._position_times.get(pair, 0):
+            self._move_position(pair, fill.get('side'), _number(fill.get('qty')), _number(fill.get('price')))
+        if order_id not in self._gap_checks and self._behind(order_id):
+            self._gap_checks[order_id] = asyncio.get_event_loop().call_later(self.GAP_GRACE, self._on_gap, order_id, pair)
+
+    def _behind(self, order_id: str) -> bool:
+        """The order is unknown or its filled qty is below its fills, its latest order update is missing."""
+        order = self.get_order(order_id)
+        if order is None:
+            return True
+        filled = sum(_number(fill.get('qty')) for fill in self._fills_by_order.get(order_id, ()))
+        return filled > _number(order.get('filled_qty')) + self.FILL_TOLERANCE
+
+    def _move_position(self, pair: str, side: str, qty: float, price: float):
+        position = self.positions.setdefault(pair, {'pair': pair, 'qty': 0.0, 'avg_price': 0.0})
+        current = position['qty']
+        change = qty if side == 'buy' else -qty
+        total = current + change
+        if total == 0:
+            position['avg_price'] = 0.0
+        elif current == 0 or (current > 0) == (change > 0):
+            position['avg_price'] = (abs(current) * position['avg_price'] + qty * price) / abs(total)
+        elif total != 0 and (total > 0) != (current > 0):
+            # Flipped sides, the remainder was opened at the fill price
+            position['avg_price'] = price
+        position['qty'] = total
+
+    def _on_gap(self, order_id: str, pair: str):
+        self._gap_checks.pop(order_id, None)
+        if not self._behind(order_id):
+            return
+        self.gaps += 1
+        if self.get_order(order_id) is None:
+            self._unknown_orders[order_id] = pair
+            self._log.warning('Fill of unknown order %s, reconciling', order_id)
+        else:
+            # Open orders are updated by the snapshot, or queried when missing from it
+            self._log.warning('Order %s filled less than its fills, reconciling', order_id)
+        self.reconcile()
+
+    def _apply_account(self, data):
+        self.account = data
+        positions = data.get('positions') if hasattr(data, 'get') else None
+        if positions:
+            now = self._rest_client.now_ms()
+            for position in positions:
+                if position.get('pair') in self.linear_pairs:
+                    self._set_position(position, now)
+
+    def _set_position(self, position, timestamp: int):
+        pair = position.get('pair')
+        position = position.to_dict() if hasattr(position, 'to_dict') else dict(position)
+        position['qty'] = _number(position.get('qty'))
+        position['avg_price'] = _number(position.get('avg_price'))
+        self.positions[pair] = position
+        self._position_times[pair] = timestamp
+
+    ######################
+    # REST reconcile
+    ######################
+
+    def reconcile(self) -> asyncio.Task:
+        """Start a reconcile against REST snapshots, or another one after the one running."""
+        if self._reconcile_task is not None and not self._reconcile_task.done():
+            self._reconcile_again = True
+        else:
+            self._reconcile_task = asyncio.create_task(self._reconcile_loop())
+        return self._reconcile_task
+
+    async def _reconcile_loop(self):
+        self.synced.clear()
+        retry_wait = self.RECONCILE_RETRY_WAIT
+        while True:
+            self._reconcile_again = False
+            try:
+                await self._reconcile()
+            except Exception:
+                # API errors as well as timeouts and connection errors of the transport
+                self._log.exception('State reconcile failed, retrying in %.1f s', retry_wait)
+                await asyncio.sleep(retry_wait)
+                retry_wait = min(retry_wait * 2, self.RECONCILE_MAX_RETRY_WAIT)
+                self._reconcile_again = True
+                continue
+            retry_wait = self.RECONCILE_RETRY_WAIT
+            if not self._reconcile_again:
+                break
+        self.reconciles += 1
+        self.synced.set()
+
+    async def _reconcile(self):
+        started = self._rest_client.now_ms()
+        queries = []
+        if self.spot_pairs:
+            queries.append(self._rest_client.spot_query_open_orders())
+        if self.linear_pairs:
+            queries.append(self._rest_client.linear_query_open_orders())
+            queries.append(self._rest_client.linear_query_positions())
+        results = await asyncio.gather(*queries)
+        positions = results.pop() if self.linear_pairs else ()
+        pairs = self.spot_pairs | self.linear_pairs
+        snapshot = {}
+        for orders in results:
+            for order in orders or ():
+                if order.get('pair') in pairs:
+                    snapshot[str(order.get('order_id'))] = order
+        for order in snapshot.values():
+            self._apply_order(order)
+
+        # Open orders missing from the snapshot were closed while updates were missed
+        missing = [
+            order for order_id, order in self.open_orders.items()
+            if order_id not in snapshot and _number(order.get('created_at')) < started
+        ]
+        unknown = [
+            {'order_id': order_id, 'pair': pair} for order_id, pair in self._unknown_orders.items()
+            if self.get_order(order_id) is None
+        ]
+        self._unknown_orders.clear()
+        semaphore = asyncio.Semaphore(self.RECONCILE_CONCURRENCY)
+        await asyncio.gather(*(self._reconcile_order(order, semaphore) for order in missing + unknown))
+
+        if self.linear_pairs:
+            snapshot_pairs = set()
+            for position in positions or ():
+                if position.get('pair') in self.linear_pairs:
+                    snapshot_pairs.add(position.get('pair'))
+                    self._set_position(position, started)
+            for pair in list(self.positions):
+                if pair not in snapshot_pairs:
+                    self._set_position({'pair': pair, 'qty': 0, 'avg_price': 0}, started)
+
+    async def _reconcile_order(self, order, semaphore: asyncio.Semaphore):
+        order_id = str(order.get('order_id'))
+        pair = order.get('pair')
+        query = self._rest_client.linear_query_orders if pair in self.linear_pairs else self._rest_client.spot_query_orders
+        async with semaphore:
+            orders = await query(pair = pair, order_id = order_id)
+        for found in orders or ():
+            if str(found.get('order_id')) == order_id:
+                self._apply_order(found)
+                return
+        if order.get('status') is None:
+            self._log.warning('Order %s of a fill not found', order_id)
+            return
+        self._log.warning('Open order %s not found, dropping it', order_id)
+        closed = order.to_dict() if hasattr(order, 'to_dict') else dict(order)
+        closed['status'] = 'closed'
+        self._apply_order(closed)
+
+    async def close(self):
+        for gap_check in self._gap_checks.values():
+            gap_check.cancel()
+        self._gap_checks.clear()
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._reconcile_task
+            self._reconcile_task = None
+        for waiters in list(self._waiters.values()) + list(self._label_waiters.values()):
+            for _, future in waiters:
+                future.cancel()
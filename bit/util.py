@@ -6,3 +6,14 @@ def get_message_topic(message):
     else:
         topic = None
     return topic
+
+
+def linear_currency(params: dict) -> str:
+    """Settlement currency of linear order params, e.g. USD for BTC-USD-PERPETUAL."""
+    # Linear batch endpoints take orders of a single settlement currency
+    if 'currency' in params:
+        return params['currency']
+    parts = str(params.get('pair') or '').split('-')
+    if len(parts) < 2:
+        raise ValueError('Linear order params need a currency or a pair like BTC-USD-PERPETUAL: {}'.format(params))
+    return parts[1]
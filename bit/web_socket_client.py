@@ -1,33 +1,113 @@
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import asyncio
 import collections
+import contextlib
 import logging
 import uuid
 import time
 
-import ujson
 import websockets.exceptions
 
-from bit.util import *
 from bit.reconnecting_websocket import ReconnectingWebsocket
 from bit.exceptions import BitAPIException, SubscribeException
 from bit.rest_client import RestClient
+from bit.order_book import OrderBookManager
+from bit.state import StateTracker
+from bit.delivery import DeliveryPolicy, Mailbox
+from bit.codec import get_codec, peek_envelope
+from bit.models import CHANNEL_MODELS
+from bit.metrics import WS_CALLBACK, WS_DISPATCH, WS_EXCHANGE_LATENCY, WS_RECOVERY
+from bit.auth import TokenCache
 
 
 
 class WebSocketClient:
-    def __init__(self, api_key, api_secret):
+    # Frames of these channels are always decoded by lazy_decode
+    CONTROL_CHANNELS = frozenset(('subscription', 'pong'))
+    # Seconds from reconnected to the first data message above which a warning is logged
+    RECOVERY_TARGET = 0.5
+
+    def __init__(
+        self, api_key, api_secret, *, concurrent_dispatch: bool = False, token_coro = None,
+        codec = None, lazy_decode: bool = False, typed: bool = False, metrics = None,
+        recorder = None, offline: bool = False, stream_url: Optional[str] = None, rest_url: Optional[str] = None,
+        max_reconnects: Optional[int] = ReconnectingWebsocket.MAX_RECONNECTS, clock = None,
+        rest_client: Optional[RestClient] = None,
+    ):
+        """
+        :param concurrent_dispatch: deliver messages to each subscriber through its own queue and task
+            instead of awaiting subscribers one after another in the receive loop
+        :param token_coro: coroutine function returning the websocket auth token, used to share one token
+            between several clients. By default a token is fetched with spot_ws_auth and cached in
+            self.tokens, a bit.auth.TokenCache refreshing it in the background.
+        :param codec: bit.codec.Codec or backend name (orjson, msgspec, ujson, json) used for frames
+        :param lazy_decode: read only the channel and pair of incoming frames first and drop frames
+            nobody subscribed to without decoding them, pays off with the slower JSON backends or when
+            most of the stream isn't subscribed
+        :param typed: deliver trade, depth, order, user_trade and um_account data as bit.models objects
+            instead of dicts. Their numbers are parsed to float when the message arrives, which makes
+            dispatch slower (about 1.3x for trades and 2x for orders in benchmarks/bench_models.py) and
+            only pays off for consumers reading the numeric fields several times
+        :param metrics: optional bit.metrics.Metrics recording exchange to receive, decode, dispatch and
+            callback latencies of incoming messages
+        :param recorder: optional bit.capture.FrameRecorder capturing all raw frames received
+        :param offline: don't connect nor send subscriptions, frames are fed to ws.feed() instead, e.g. by
+            bit.capture.ReplaySource
+        :param stream_url: websocket server, ReconnectingWebsocket.STREAM_URL by default
+        :param rest_url: REST server used for auth tokens and order book snapshots, RestClient.API_URL by default
+        :param max_reconnects: failed connection attempts in a row before giving up, None keeps trying
+        :param clock: optional bit.clock.ClockSync, shared with the RestClient of this client, correcting the
+            exchange latency metric by the exchange clock offset
+        :param rest_client: RestClient used for auth tokens, order book snapshots and state reconciles, closed
+            with this client. By default one is created on first use.
+        """
         self.loop = asyncio.get_event_loop()
+        self._codec = get_codec(codec) if codec is None or isinstance(codec, str) else codec
+        self._subscribed_channels = frozenset()
+        self._models = CHANNEL_MODELS if typed else {}
+        self._metrics = metrics
+        self.clock = clock
         self.ws = ReconnectingWebsocket(
             loop=self.loop,
             path='',
             coro=self.on_message,
             # TODO port reconnecting logic from python-ascendex version
             reconnect_auth_coro = self._on_reconnect,
+            codec = self._codec,
+            frame_filter = self._accept_frame if lazy_decode else None,
+            metrics = metrics,
+            recorder = recorder,
+            connect = not offline,
+            stream_url = stream_url,
+            max_reconnects = max_reconnects,
         )
+        self._rest_url = rest_url or RestClient.API_URL
+        self._offline = offline
         self.subscribers = {}
         self.intervals = {}
+        # (channel, pair) -> (inline subscribers, mailbox put callbacks)
+        self._dispatch: Dict[Tuple[str, str], Tuple[tuple, tuple]] = {}
+        self._concurrent_dispatch = concurrent_dispatch
+        self._mailboxes: Dict[object, Mailbox] = {}
+        self.order_books: Optional[OrderBookManager] = None
+        self.state: Optional[StateTracker] = None
+        self._reconnect_listeners = []
+        self._rest_client: Optional[RestClient] = rest_client
+        self._token_coro = token_coro
+        self.tokens = TokenCache(self._fetch_ws_token) if token_coro is None else None
+        # Reconnect recovery: (seconds from disconnect, seconds from reconnect) to the first data message
+        self.recoveries = collections.deque(maxlen = 100)
+        # The first data message after connecting is recorded in first_data_at (monotonic time) and sets first_data
+        self._recovering = not offline
+        self.first_data_at: Optional[float] = None
+        self.first_data = asyncio.Event()
+        # Subscribe and unsubscribe messages sent and replies received on the current connection
+        self.subscription_messages = 0
+        self.subscription_replies = 0
+        self._replied = asyncio.Event()
+        # Subscribe requests collected by batch_subscriptions, None when sent right away
+        self._batched: Optional[list] = None
 
         self.key = api_key
         self.secret = api_secret
@@ -38,11 +118,27 @@ class WebSocketClient:
     #     tm = time.time()
     #     return int(tm * 1e3)
 
-    async def _get_ws_token(self):
-        restClient = RestClient(self.key, self.secret)
-        ret = await restClient.spot_ws_auth()
+    @property
+    def rest_client(self) -> RestClient:
+        """RestClient of this client, created on first use when none was passed."""
+        if self._rest_client is None:
+            self._rest_client = RestClient(self.key, self.secret, self._rest_url, clock = self.clock)
+        return self._rest_client
+
+    async def _fetch_ws_token(self):
+        ret = await self.rest_client.spot_ws_auth()
         return ret["token"]
 
+    async def _get_ws_token(self):
+        if self._token_coro is not None:
+            return await self._token_coro()
+        return await self.tokens.get()
+
+    async def fetch_token(self) -> str:
+        """Get the auth token used by subscribe messages, can run while the websocket is still connecting."""
+        self._token = await self._get_ws_token()
+        return self._token
+
     # def make_user_trade_req(token):
     #     return {
     #         "type": "subscribe",
@@ -74,16 +170,63 @@ class WebSocketClient:
     #     }
 
     async def _on_reconnect(self):
-        # print('Reconnceting')
+        # The cached token is still valid after a short disconnect, no REST round trip before resubscribing
+        self._recovering = bool(self.subscribers)
+        self.subscription_messages = self.subscription_replies = 0
         await self.start()
-        # Resubscribe
-        for channel, ids in self.subscribers.items():
-            # Assume all intervals are same for all ids/pairs in channel
-            ids = list(ids)
-            await self._send_subscribe(ids, [channel], self.intervals[channel][ids[0]])
+        for (interval, pairs), channels in self._subscription_groups().items():
+            await self._send_subscribe(list(pairs), channels, interval)
+        for listener in self._reconnect_listeners:
+            await listener()
+
+    def _subscription_groups(self) -> Dict[Tuple[str, tuple], List[str]]:
+        """Subscriptions as (interval, pairs) -> channels, one subscribe message each."""
+        groups = {}
+        for channel, intervals in self.intervals.items():
+            by_interval = {}
+            for pair, interval in intervals.items():
+                by_interval.setdefault(interval, []).append(pair)
+            for interval, pairs in by_interval.items():
+                groups.setdefault((interval, tuple(sorted(pairs))), []).append(channel)
+        return groups
+
+    def _record_recovery(self):
+        self._recovering = False
+        now = time.monotonic()
+        if self.first_data_at is None:
+            self.first_data_at = now
+            self.first_data.set()
+            return
+        since_disconnect = now - self.ws.disconnected_at
+        since_connect = now - self.ws.connected_at
+        self.recoveries.append((since_disconnect, since_connect))
+        if self._metrics is not None:
+            self._metrics.observe(WS_RECOVERY, since_disconnect, 'disconnect')
+            self._metrics.observe(WS_RECOVERY, since_connect, 'connect')
+        if since_connect > self.RECOVERY_TARGET:
+            logging.warning('First data %.3f s after reconnecting, %.3f s after the disconnect', since_connect, since_disconnect)
+
+    def reconnect_stats(self) -> dict:
+        """Number of recoveries and last, average and max seconds from reconnect to the first data message."""
+        if not self.recoveries:
+            return {'count': 0}
+        since_connect = [r[1] for r in self.recoveries]
+        return {
+            'count': len(self.recoveries), 'last': since_connect[-1], 'avg': sum(since_connect) / len(since_connect),
+            'max': max(since_connect), 'last_since_disconnect': self.recoveries[-1][0],
+        }
+
+    def add_reconnect_listener(self, coro):
+        """Await coro() after every reconnect, once the subscriptions were sent again."""
+        self._reconnect_listeners.append(coro)
 
     async def _send_subscribe(self, symbols, channels, interval, unsubscribe=False):
         # if self.ws.connected.is_set():
+        if self._offline:
+            return
+        if self._batched is not None and not unsubscribe:
+            self._batched.append((symbols, channels, interval))
+            return
         msg_type = "unsubscribe" if unsubscribe else "subscribe"
         assert self._token
         msg = {
@@ -97,18 +240,37 @@ class WebSocketClient:
             msg["pairs"] = symbols
         if interval:
             msg["interval"] = interval
-        await self.ws.send(ujson.dumps(msg))
+        self.subscription_messages += 1
+        await self.ws.send(self._codec.dumps(msg))
 
-    async def subscribe(self, *, coro, channels: List[str], pairs: List[str], interval: Optional[str] = ''):
+    async def subscribe(
+        self, *, coro, channels: List[str], pairs: List[str], interval: Optional[str] = '',
+        delivery: Optional[str] = None, max_queue: Optional[int] = None,
+    ):
         """
         Subscribe data. Only one subscriber is allowed per channel-id combination!
         :param coro: callback coroutine accepting channel, id and data parameters
         :param channel:  subscribe channel: order, trades, and so on
         :param id: symbol or account id, depending on channel
+        :param delivery: DeliveryPolicy of the subscriber. By default the subscriber is awaited in the receive
+            loop (or queued without limit with concurrent_dispatch), otherwise it gets its own queue and task:
+            UNBOUNDED keeps every message, DROP_OLDEST keeps the newest max_queue messages and CONFLATE keeps
+            only the latest pending depth/ticker message per pair. Applies to all subscriptions of coro.
+        :param max_queue: queue size limit for the delivery policy
         :return:
         """
         if not pairs:
             pairs = ['']
+        if delivery is None and self._concurrent_dispatch and coro not in self._mailboxes:
+            delivery = DeliveryPolicy.UNBOUNDED
+        if delivery is not None:
+            mailbox = self._mailboxes.get(coro)
+            if mailbox is None or mailbox.policy != delivery or mailbox.max_queue != max_queue:
+                new_mailbox = Mailbox(coro, delivery, max_queue)
+                if mailbox is not None:
+                    await mailbox.stop()
+                self._mailboxes[coro] = new_mailbox
+                new_mailbox.start()
         for ch in channels:
             channel_data = self.subscribers.setdefault(ch, dict())
             interval_data = self.intervals.setdefault(ch, dict())
@@ -116,8 +278,99 @@ class WebSocketClient:
                 subscribers = channel_data.setdefault(p, set())
                 subscribers.add(coro)
                 interval_data[p] = interval
+        self._rebuild_dispatch()
         await self._send_subscribe(pairs, channels, interval)
 
+    @contextlib.asynccontextmanager
+    async def batch_subscriptions(self):
+        """
+        Collect the subscriptions made in the block and send them on exit, one message per interval and
+        set of pairs, like the resubscription after a reconnect.
+        """
+        self._batched = []
+        try:
+            yield
+        finally:
+            batched, self._batched = self._batched, None
+        groups = {}
+        for symbols, channels, interval in batched:
+            group = groups.setdefault((interval, tuple(sorted(symbols))), [])
+            group.extend(channel for channel in channels if channel not in group)
+        for (interval, symbols), channels in groups.items():
+            await self._send_subscribe(list(symbols), channels, interval)
+
+    async def wait_subscribed(self):
+        """Wait for the replies to all subscribe and unsubscribe messages sent, data follows them."""
+        while self.subscription_replies < self.subscription_messages:
+            self._replied.clear()
+            await self._replied.wait()
+
+    def mailbox_of(self, coro) -> Optional[Mailbox]:
+        """Mailbox queueing the messages of a subscriber coroutine, None when it is awaited in the receive loop."""
+        return self._mailboxes.get(coro)
+
+    def delivery_stats(self) -> dict:
+        """Queue depth and delivered, dropped and conflated message counts per queued subscriber coroutine."""
+        return {coro: mailbox.stats() for coro, mailbox in self._mailboxes.items()}
+
+    def _rebuild_dispatch(self):
+        dispatch = {}
+        for channel, channel_data in self.subscribers.items():
+            for pair, subscribers in channel_data.items():
+                inline = tuple(s for s in subscribers if s not in self._mailboxes)
+                queued = tuple(self._mailboxes[s].put for s in subscribers if s in self._mailboxes)
+                dispatch[(channel, pair)] = (inline, queued)
+        self._dispatch = dispatch
+        self._subscribed_channels = frozenset(self.subscribers)
+
+    def _accept_frame(self, raw) -> bool:
+        channel, pair = peek_envelope(raw)
+        if channel is None or channel in self.CONTROL_CHANNELS:
+            return True
+        if channel not in self._subscribed_channels:
+            return False
+        return pair is None or (channel, pair) in self._dispatch
+
+    async def subscribe_order_book(self, *, pairs: List[str], coro = None, interval: Optional[str] = '', level: Optional[int] = None):
+        """
+        Maintain local L2 order books of pairs from the depth channel, resynced from REST snapshots on gaps.
+        :param coro: optional callback coroutine accepting pair and OrderBook parameters, fired after each update
+        :param level: depth of REST snapshots used for resync
+        :return: OrderBookManager holding the books, see OrderBookManager.get
+        """
+        if self.order_books is None:
+            self.order_books = OrderBookManager(self.rest_client, level = level)
+        for p in pairs:
+            self.order_books.track(p, coro)
+        await self.subscribe(coro = self.order_books.on_depth, channels = ['depth'], pairs = pairs, interval = interval)
+        return self.order_books
+
+    async def track_state(
+        self, *, spot_pairs: List[str] = (), linear_pairs: List[str] = (), um_account: bool = True,
+        interval: Optional[str] = 'raw', reconcile: bool = True,
+    ) -> StateTracker:
+        """
+        Keep open orders, fills and linear positions of pairs from the private channels, see StateTracker.
+        The state is reconciled with REST snapshots now and after every reconnect.
+        :param um_account: also subscribe the um_account channel, kept in StateTracker.account
+        :param reconcile: reconcile right away, False leaves it to the caller, e.g. once the subscriptions were confirmed
+        :return: StateTracker, await its synced event before relying on it
+        """
+        if self.state is None:
+            self.state = StateTracker(self.rest_client, spot_pairs = spot_pairs, linear_pairs = linear_pairs)
+            self.add_reconnect_listener(self.state.on_reconnect)
+        else:
+            self.state.spot_pairs |= frozenset(spot_pairs)
+            self.state.linear_pairs |= frozenset(linear_pairs)
+        pairs = list(spot_pairs) + list(linear_pairs)
+        if pairs:
+            await self.subscribe(coro = self.state.on_message, channels = ['order', 'user_trade'], pairs = pairs, interval = interval)
+        if um_account:
+            await self.subscribe(coro = self.state.on_message, channels = ['um_account'], pairs = [], interval = '100ms')
+        if reconcile:
+            self.state.reconcile()
+        return self.state
+
     async def unsubscribe(self, channel, id_):
         """unsubscribe a symbol/account from channel"""
         await self._send_subscribe([id_], [channel], None, unsubscribe = True)
@@ -127,6 +380,12 @@ class WebSocketClient:
         if not self.subscribers[channel]:
             del self.subscribers[channel]
             del self.intervals[channel]
+        if channel == 'depth' and self.order_books is not None:
+            self.order_books.remove_pair(id_)
+        active = set().union(*(s for channel_data in self.subscribers.values() for s in channel_data.values()))
+        for coro in [coro for coro in self._mailboxes if coro not in active]:
+            await self._mailboxes.pop(coro).stop()
+        self._rebuild_dispatch()
 
     # async def ping(self):
     #     """ping pong to keep connection live"""
@@ -139,54 +398,121 @@ class WebSocketClient:
         callback fired when a complete WebSocket message was received.
         You usually need to override this method to consume the data.
 
+        List payloads are split by pair and each subscriber gets the list of its pair's items.
+
         :param dict message: message dictionary.
         """
-        topic = get_message_topic(message)
+        topic = message.get('channel')
+        if topic is None:
+            topic = message.get('type')
 
         if topic == 'pong':
             # Ignore pong replies
             return
         if topic == 'subscription':
+            self.subscription_replies += 1
+            self._replied.set()
             if message['data']['code'] != 0:
                 raise SubscribeException(message['data']['code'], message['data']['message'])
             return
 
-        if "data" in message:
-            data = message["data"]
-            if 'timestamp' in message and type(data) == dict:
-                data['timestamp'] = message['timestamp']
-
-            if 'pair' in data:
-                pair = data['pair']
-            elif type(data) == list:
-                for submessage in data:
-                    pair = submessage['pair']
-                    try:
-                        subscribers = self.subscribers[topic][pair]
-                    except KeyError:
-                        logging.info(f'no subscribers for submessage {message}')
-                    else:
-                        for subscriber in subscribers:
-                            await subscriber(topic, pair, data)
-                        return
+        data = message.get('data')
+        if data is None:
+            logging.warning(f"unhandled message {message}")
+            return
+        if self._recovering:
+            self._record_recovery()
+        if self._metrics is not None and 'timestamp' in message:
+            latency = self.ws.received_time - message['timestamp'] / 1000
+            if self.clock is not None:
+                latency += self.clock.offset
+            self._metrics.observe(WS_EXCHANGE_LATENCY, latency, topic)
+
+        if type(data) is dict:
+            model = self._models.get(topic) if self._models else None
+            if model is not None:
+                pair = data.get('pair', '')
+                data = model(data, message.get('timestamp'))
             else:
-                pair = ''
-            try:
-                subscribers = self.subscribers[topic][pair]
-            except KeyError:
-                logging.info(f'no subscribers {message}')
+                if 'timestamp' in message:
+                    data['timestamp'] = message['timestamp']
+                pair = data.get('pair', '')
+        elif type(data) is list:
+            if self._metrics is None:
+                await self._dispatch_list(topic, data, message)
             else:
-                for subscriber in subscribers:
-                    await subscriber(topic, pair, data)
+                start = self._observe_dispatch(topic)
+                await self._dispatch_list(topic, data, message)
+                self._metrics.observe(WS_CALLBACK, time.perf_counter() - start, topic)
+            return
         else:
-            logging.warning(f"unhandled message {message}")
+            pair = ''
+        entry = self._dispatch.get((topic, pair))
+        if entry is None:
+            logging.info(f'no subscribers {message}')
+            return
+        inline, queued = entry
+        if self._metrics is not None:
+            start = self._observe_dispatch(topic)
+        if queued:
+            for put in queued:
+                put(topic, pair, data)
+        for subscriber in inline:
+            await subscriber(topic, pair, data)
+        if self._metrics is not None:
+            self._metrics.observe(WS_CALLBACK, time.perf_counter() - start, topic)
+
+    def _observe_dispatch(self, topic) -> float:
+        now = time.perf_counter()
+        self._metrics.observe(WS_DISPATCH, now - self.ws.decoded_at, topic)
+        return now
+
+    async def _dispatch_list(self, topic, data, message):
+        # Group submessages by pair in a single pass
+        model = self._models.get(topic) if self._models else None
+        timestamp = message.get('timestamp')
+        groups = {}
+        for submessage in data:
+            pair = submessage.get('pair', '')
+            if model is not None:
+                submessage = model(submessage, timestamp)
+            group = groups.get(pair)
+            if group is None:
+                groups[pair] = [submessage]
+            else:
+                group.append(submessage)
+        dispatch = self._dispatch
+        for pair, group in groups.items():
+            entry = dispatch.get((topic, pair))
+            if entry is None:
+                logging.info(f'no subscribers for submessage {message}')
+                continue
+            inline, queued = entry
+            for put in queued:
+                put(topic, pair, group)
+            for subscriber in inline:
+                await subscriber(topic, pair, group)
 
     async def start(self):
+        if self._offline:
+            return
         await self.ws.connected.wait()
-        self._token = await self._get_ws_token()
+        await self.fetch_token()
 
     async def close(self):
-        # TODO more graceful cancel
-        await self.ws.cancel()
+        await self.ws.close()
         self.subscribers.clear()
         self.intervals.clear()
+        self._dispatch = {}
+        self._subscribed_channels = frozenset()
+        for mailbox in self._mailboxes.values():
+            await mailbox.stop()
+        self._mailboxes.clear()
+        if self.order_books is not None:
+            await self.order_books.close()
+        if self.state is not None:
+            await self.state.close()
+        if self.tokens is not None:
+            await self.tokens.close()
+        if self._rest_client is not None:
+            await self._rest_client.close()
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+from bit.mock_exchange import MockExchange
+from bit.rest_client import RestClient
+
+
+@pytest.fixture
+async def exchange():
+    exchange = MockExchange()
+    await exchange.start()
+    yield exchange
+    await exchange.close()
+
+
+@pytest.fixture
+async def rest_client(exchange):
+    client = RestClient('key', 'secret', exchange.rest_url)
+    yield client
+    await client.close()
+
+
+async def wait_until(predicate, timeout: float = 5.0):
+    """Poll predicate() until it is true, fails the test after timeout seconds."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        if loop.time() > deadline:
+            pytest.fail('Condition not met within {} s'.format(timeout))
+        await asyncio.sleep(0.005)
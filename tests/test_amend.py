@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from bit.amend import AmendManager
+
+ORDER = {'pair': 'BTC-USDT', 'side': 'buy', 'order_type': 'limit', 'qty': '1', 'price': '100'}
+
+
+def record_amends(exchange):
+    """Order params of every amend request the exchange gets, one list per request."""
+    requests = []
+    amend_order = exchange.routes[('POST', '/spot/v1/amend_orders')]
+    amend_batch = exchange.routes[('POST', '/spot/v1/amend_batchorders')]
+
+    def single(params):
+        requests.append([params])
+        return amend_order(params)
+
+    def batch(params):
+        requests.append(params['orders_data'])
+        return amend_batch(params)
+
+    exchange.routes[('POST', '/spot/v1/amend_orders')] = single
+    exchange.routes[('POST', '/spot/v1/amend_batchorders')] = batch
+    return requests
+
+
+class LinearClient:
+    """Linear amend endpoints answering with the params they got."""
+
+    def __init__(self):
+        self.singles = []
+        self.batches = []
+
+    async def linear_amend_order(self, **req):
+        self.singles.append(req)
+        return req
+
+    async def linear_amend_batch(self, **req):
+        self.batches.append(req)
+        return {'orders': [dict(order, code = 0) for order in req['orders_data']]}
+
+
+async def test_one_amend_in_flight_per_order(exchange, rest_client):
+    order_id = (await rest_client.spot_place_order(**ORDER))['order_id']
+    requests = record_amends(exchange)
+    exchange.rest_latency = 0.05
+    amends = AmendManager(rest_client)
+    first = asyncio.ensure_future(amends.spot_amend_order(order_id = order_id, price = '101'))
+    await asyncio.sleep(0.02)
+    later = [asyncio.ensure_future(amends.spot_amend_order(order_id = order_id, price = price)) for price in ('102', '103', '104')]
+    await asyncio.sleep(0)
+    assert amends.stats()['in_flight'] == 1 and amends.stats()['pending'] == 1
+    assert (await first)['price'] == '101'
+    assert [result['price'] for result in await asyncio.gather(*later)] == ['104'] * 3
+    assert [[params['price'] for params in request] for request in requests] == [['101'], ['104']]
+    assert exchange.orders[order_id]['price'] == '104'
+    stats = amends.stats()
+    assert stats['amends'] == 4 and stats['saved'] == 2 and stats['sent'] == 2 and stats['requests'] == 2
+    assert stats['in_flight'] == 0 and stats['pending'] == 0
+    assert 0.05 <= stats['age_max'] < 1 and stats['age_p50'] is not None
+    await amends.close()
+
+
+async def test_newer_fields_replace_pending_ones(exchange, rest_client):
+    order_id = (await rest_client.spot_place_order(**ORDER))['order_id']
+    requests = record_amends(exchange)
+    amends = AmendManager(rest_client, window = 0.01)
+    results = await asyncio.gather(
+        amends.spot_amend_order(order_id = order_id, price = '101'),
+        amends.spot_amend_order(order_id = order_id, qty = '2'),
+        amends.spot_amend_order(order_id = order_id, price = '99'),
+    )
+    assert len(requests) == 1 and requests[0][0]['price'] == '99' and requests[0][0]['qty'] == '2'
+    assert all(result['price'] == '99' and result['qty'] == '2' for result in results)
+    await amends.close()
+
+
+async def test_different_orders_are_amended_in_one_batch(exchange, rest_client):
+    order_ids = [(await rest_client.spot_place_order(**ORDER))['order_id'] for _ in range(3)]
+    requests = record_amends(exchange)
+    amends = AmendManager(rest_client)
+    results = await asyncio.gather(*(
+        amends.spot_amend_order(order_id = order_id, price = str(101 + n)) for n, order_id in enumerate(order_ids)
+    ))
+    assert [result['price'] for result in results] == ['101', '102', '103']
+    assert len(requests) == 1 and [params['order_id'] for params in requests[0]] == order_ids
+    assert amends.stats()['requests'] == 1 and amends.stats()['sent'] == 3
+    await amends.close()
+
+
+async def test_linear_amends_are_batched_by_currency():
+    client = LinearClient()
+    amends = AmendManager(client)
+    await asyncio.gather(
+        amends.linear_amend_order(order_id = 1, pair = 'BTC-USD-PERPETUAL', price = '50000'),
+        amends.linear_amend_order(order_id = 2, pair = 'ETH-USD-PERPETUAL', price = '3000'),
+        amends.linear_amend_order(order_id = 3, currency = 'USDC', price = '20'),
+    )
+    assert len(client.batches) == 1 and client.batches[0]['currency'] == 'USD'
+    assert [order['order_id'] for order in client.batches[0]['orders_data']] == [1, 2]
+    assert client.singles == [{'order_id': 3, 'currency': 'USDC', 'price': '20'}]
+    with pytest.raises(ValueError, match = 'currency or a pair'):
+        await amends.linear_amend_order(order_id = 4, price = '1')
+    await amends.close()
@@ -0,0 +1,99 @@
+import asyncio
+
+from bit.auth import TokenCache
+from bit.web_socket_client import WebSocketClient
+
+from conftest import wait_until
+
+PAIRS = ['BTC-USDT', 'ETH-USDT']
+
+
+class Tokens:
+    """Token fetch returning token-1, token-2... and raising the given errors first."""
+
+    def __init__(self, failures = (), delay = 0.0):
+        self.failures = list(failures)
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            raise self.failures.pop(0)
+        return 'token-{}'.format(self.calls)
+
+
+async def test_reconnect_reuses_token_and_resubscribes_in_one_message(exchange):
+    auth_requests = []
+    ws_auth = exchange.routes[('GET', '/spot/v1/ws/auth')]
+    exchange.routes[('GET', '/spot/v1/ws/auth')] = lambda params: auth_requests.append(params) or ws_auth(params)
+    subscribes = []
+    handle_ws = exchange._handle_ws
+
+    async def record(connection, message):
+        if message.get('type') == 'subscribe':
+            subscribes.append(message)
+        await handle_ws(connection, message)
+
+    exchange._handle_ws = record
+
+    async def on_data(channel, pair, data):
+        pass
+
+    client = WebSocketClient('key', 'secret', stream_url = exchange.stream_url, rest_url = exchange.rest_url)
+    await client.start()
+    for channel in ('trade', 'ticker', 'depth'):
+        await client.subscribe(coro = on_data, channels = [channel], pairs = PAIRS)
+    await client.wait_subscribed()
+    assert len(subscribes) == 3 and len(auth_requests) == 1
+    reconnected = asyncio.Event()
+
+    async def on_reconnect():
+        reconnected.set()
+
+    client.add_reconnect_listener(on_reconnect)
+    subscribes.clear()
+    await exchange.disconnect()
+    await asyncio.wait_for(reconnected.wait(), 5)
+    await client.wait_subscribed()
+    assert len(auth_requests) == 1 and client.tokens.fetches == 1
+    assert len(subscribes) == 1
+    assert sorted(subscribes[0]['channels']) == ['depth', 'ticker', 'trade']
+    assert sorted(subscribes[0]['pairs']) == PAIRS and subscribes[0]['token'] == exchange.TOKEN
+    await client.close()
+
+
+async def test_concurrent_callers_share_one_fetch():
+    fetch = Tokens(delay = 0.01)
+    cache = TokenCache(fetch)
+    assert await asyncio.gather(*(cache.get() for _ in range(5))) == ['token-1'] * 5
+    assert await cache.get() == 'token-1'
+    assert fetch.calls == 1 and cache.fetches == 1
+    await cache.close()
+
+
+async def test_background_refresh_replaces_token_before_expiry():
+    fetch = Tokens()
+    cache = TokenCache(fetch, ttl = 0.1, refresh_ahead = 0.08)
+    assert await cache.get() == 'token-1'
+    await wait_until(lambda: cache.token == 'token-2')
+    assert cache.valid
+    assert await cache.get() == 'token-2'
+    assert fetch.calls == 2
+    await cache.close()
+
+
+async def test_expired_token_is_fetched_by_get():
+    fetch = Tokens()
+    cache = TokenCache(fetch, ttl = 0.1, refresh_ahead = 0.05)
+    # The background refresh fails and retries only long after the token expired
+    cache.RETRY_WAIT = 10
+    assert await cache.get() == 'token-1'
+    fetch.failures.append(ConnectionResetError('reset'))
+    await wait_until(lambda: fetch.calls == 2)
+    assert cache.token == 'token-1'
+    await wait_until(lambda: not cache.valid)
+    assert await cache.get() == 'token-3'
+    assert cache.valid and cache.fetches == 2
+    await cache.close()
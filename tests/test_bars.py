@@ -0,0 +1,19 @@
+import pytest
+
+from bit.web_socket_client import WebSocketClient
+
+pytest.importorskip('numpy')
+
+from bit.bars import TICK, BarAggregator, BarSpec  # noqa: E402
+
+PAIR = 'BTC-USDT'
+
+
+async def test_start_seeds_from_the_rest_client(exchange):
+    client = WebSocketClient('key', 'secret', stream_url = exchange.stream_url, rest_url = exchange.rest_url)
+    await client.start()
+    bars = BarAggregator([BarSpec(TICK, 10)])
+    await bars.start(client, [PAIR], seed = 50)
+    assert len(bars.trades(PAIR)) >= 50
+    assert len(bars.bars(PAIR, BarSpec(TICK, 10))) >= 5
+    await client.close()
@@ -0,0 +1,99 @@
+import asyncio
+
+from bit.batching import OrderCoalescer
+from bit.exceptions import BitAPIException
+
+
+def order(i):
+    return {'pair': 'BTC-USDT', 'side': 'buy', 'order_type': 'limit', 'qty': '1', 'price': str(100 + i)}
+
+
+async def test_concurrent_orders_sent_as_batches(exchange, rest_client):
+    coalescer = OrderCoalescer(rest_client, window = 0.01, max_batch_size = 4)
+    requests = exchange.rest_requests
+    results = await asyncio.gather(*(coalescer.spot_place_order(**order(i)) for i in range(10)))
+    # 4 + 4 + 2 orders
+    assert exchange.rest_requests - requests == 3
+    assert coalescer.stats()['spot_place_order'] == {'calls': 10, 'requests': 3}
+    assert [result['price'] for result in results] == [str(100 + i) for i in range(10)]
+    assert len({result['order_id'] for result in results}) == 10
+    await coalescer.close()
+
+
+async def test_single_call_uses_single_endpoint(exchange, rest_client):
+    coalescer = OrderCoalescer(rest_client, window = 0.001)
+    result = await coalescer.spot_place_order(**order(0))
+    assert result['order_id'] in exchange.orders
+    assert 'code' not in result
+    await coalescer.close()
+
+
+async def test_rejected_order_raises_for_its_caller_only(exchange, rest_client):
+    coalescer = OrderCoalescer(rest_client, window = 0.01)
+    invalid = order(1)
+    del invalid['qty']
+    results = await asyncio.gather(
+        coalescer.spot_place_order(**order(0)), coalescer.spot_place_order(**invalid), coalescer.spot_place_order(**order(2)),
+        return_exceptions = True,
+    )
+    assert isinstance(results[1], BitAPIException)
+    assert results[1].code == 18100100
+    assert results[0]['price'] == '100' and results[2]['price'] == '102'
+    assert coalescer.stats()['spot_place_order']['requests'] == 1
+    await coalescer.close()
+
+
+async def test_batch_amends(exchange, rest_client):
+    placed = [await rest_client.spot_place_order(**order(i)) for i in range(3)]
+    coalescer = OrderCoalescer(rest_client, window = 0.01)
+    await asyncio.gather(*(
+        coalescer.spot_amend_order(order_id = o['order_id'], pair = 'BTC-USDT', price = '200') for o in placed
+    ))
+    assert all(exchange.orders[o['order_id']]['price'] == '200' for o in placed)
+    assert coalescer.stats()['spot_amend_order'] == {'calls': 3, 'requests': 1}
+    await coalescer.close()
+
+
+class LinearClient:
+    """Records the linear batch requests instead of sending them."""
+
+    def __init__(self):
+        self.batches = []
+
+    async def linear_place_order(self, **req):
+        return dict(req, order_id = '1')
+
+    async def linear_new_batch(self, **req):
+        self.batches.append(req)
+        return [dict(o, order_id = str(i)) for i, o in enumerate(req['orders_data'])]
+
+    async def spot_place_order(self, **req):
+        raise NotImplementedError
+
+    spot_new_batch_orders = spot_amend_order = spot_amend_batch_orders = spot_place_order
+    linear_amend_order = linear_amend_batch = spot_place_order
+
+
+async def test_linear_batches_split_by_settlement_currency():
+    client = LinearClient()
+    coalescer = OrderCoalescer(client, window = 0.01)
+    pairs = ['BTC-USD-PERPETUAL', 'ETH-USDT-PERPETUAL', 'ETH-USD-PERPETUAL', 'BTC-USDT-PERPETUAL']
+    await asyncio.gather(*(coalescer.linear_place_order(pair = pair, side = 'buy', qty = '1') for pair in pairs))
+    assert sorted((batch['currency'], len(batch['orders_data'])) for batch in client.batches) == [('USD', 2), ('USDT', 2)]
+    await coalescer.close()
+
+
+async def test_batch_result_count_mismatch_fails_all_callers():
+    client = LinearClient()
+
+    async def short_batch(**req):
+        return []
+
+    client.linear_new_batch = short_batch
+    coalescer = OrderCoalescer(client, window = 0.01)
+    results = await asyncio.gather(
+        *(coalescer.linear_place_order(pair = 'BTC-USD-PERPETUAL', side = 'buy', qty = '1') for _ in range(2)),
+        return_exceptions = True,
+    )
+    assert all(isinstance(result, BitAPIException) for result in results)
+    await coalescer.close()
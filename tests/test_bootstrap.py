@@ -0,0 +1,16 @@
+from bit.bootstrap import bootstrap
+
+PAIR = 'BTC-USDT'
+
+
+async def test_bootstrap_waits_for_books_and_first_update(exchange):
+    session = await bootstrap(
+        'key', 'secret', order_books = [PAIR], spot_pairs = [PAIR], snapshots = ['spot_open_orders'],
+        stream_url = exchange.stream_url, rest_url = exchange.rest_url, timeout = 5,
+    )
+    assert session.order_books.get(PAIR).synced
+    assert session.ws_client.first_data.is_set()
+    assert session.state.synced.is_set()
+    assert session.snapshots['spot_open_orders'] == []
+    assert {'connect', 'token', 'subscribe', 'order_books', 'first_update', 'warm_up', 'total'} <= session.timings.keys()
+    await session.close()
@@ -0,0 +1,76 @@
+import asyncio
+import os
+
+from bit.capture import FILE_HEADER, MAGIC, RECORD_HEADER, TEXT, FrameRecorder, ReplaySource
+
+
+def write_capture(path, wall_ns, monotonic_ns, frames):
+    with open(path, 'wb') as f:
+        f.write(MAGIC + FILE_HEADER.pack(wall_ns, monotonic_ns))
+        for timestamp, frame in frames:
+            payload = frame.encode()
+            f.write(RECORD_HEADER.pack(timestamp, len(payload), TEXT) + payload)
+
+
+class Feed:
+    def __init__(self):
+        self.frames = []
+
+    async def feed(self, frame):
+        self.frames.append((asyncio.get_event_loop().time(), frame))
+
+
+async def test_recorders_sharing_a_directory_use_their_own_files(tmp_path):
+    recorders = [FrameRecorder(str(tmp_path)) for _ in range(2)]
+    for i, recorder in enumerate(recorders):
+        recorder.record('frame {}'.format(i))
+    for recorder in recorders:
+        await recorder.close()
+    assert len({path for recorder in recorders for path in recorder.files}) == 2
+    assert sorted(frame for _, frame in ReplaySource(str(tmp_path)).frames()) == ['frame 0', 'frame 1']
+
+
+def test_timestamps_rebased_on_the_wall_clock_of_their_file(tmp_path):
+    # The second file comes from a process whose monotonic clock started later and reads lower
+    second = 10 ** 9
+    write_capture(os.path.join(tmp_path, 'a.cap'), 1000 * second, 500 * second, [(500 * second, 'a0'), (501 * second, 'a1')])
+    write_capture(os.path.join(tmp_path, 'b.cap'), 1002 * second, 20 * second, [(20 * second, 'b0')])
+    assert list(ReplaySource(str(tmp_path)).frames()) == [(1000 * second, 'a0'), (1001 * second, 'a1'), (1002 * second, 'b0')]
+
+
+async def test_replay_paced_across_files(tmp_path):
+    ms = 10 ** 6
+    write_capture(os.path.join(tmp_path, 'a.cap'), 1000 * ms, 900 * ms, [(900 * ms, 'a0')])
+    write_capture(os.path.join(tmp_path, 'b.cap'), 1050 * ms, 10 * ms, [(10 * ms, 'b0')])
+    feed = Feed()
+    await ReplaySource(str(tmp_path)).replay(feed)
+    (start, _), (end, _) = feed.frames
+    assert 0.04 <= end - start < 0.5
+
+
+def test_files_replayed_in_recording_order(tmp_path):
+    # Names sorting against the recording order, e.g. another pid or a 5 digit sequence
+    second = 10 ** 9
+    write_capture(os.path.join(tmp_path, 'frames-1-10000.cap'), 1002 * second, 0, [(0, 'third')])
+    write_capture(os.path.join(tmp_path, 'frames-2-9999.cap'), 1001 * second, 0, [(0, 'second')])
+    write_capture(os.path.join(tmp_path, 'frames-3-0001.cap'), 1000 * second, 0, [(0, 'first')])
+    assert [frame for _, frame in ReplaySource(str(tmp_path)).frames()] == ['first', 'second', 'third']
+
+
+async def test_close_does_not_block_the_event_loop(tmp_path):
+    recorder = FrameRecorder(str(tmp_path))
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    ticker = asyncio.ensure_future(tick())
+    for i in range(20000):
+        recorder.record('frame {}'.format(i))
+    await recorder.close()
+    ticker.cancel()
+    assert ticks > 1
+    assert recorder.frames == 20000
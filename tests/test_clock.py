@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import pytest
+
+from bit.clock import ClockSync
+from bit.metrics import WS_EXCHANGE_LATENCY, Metrics
+from bit.rest_client import RestClient
+from bit.web_socket_client import WebSocketClient
+
+from conftest import wait_until
+
+
+def add_sample(clock, received, rtt, offset):
+    """Sample answered rtt seconds after sending at received, by an exchange clock offset seconds ahead."""
+    sent = received - rtt
+    clock.sample(sent, received, (offset + (sent + received) / 2) * 1000)
+
+
+async def test_start_attaches_clock_and_syncs(exchange):
+    clock = ClockSync()
+    client = RestClient('key', 'secret', exchange.rest_url)
+    clock.start(client)
+    assert client.clock is clock
+    await asyncio.wait_for(clock.synced.wait(), 5)
+    await clock.close()
+    await client.close()
+
+
+async def test_start_rejects_client_with_another_clock(exchange):
+    client = RestClient('key', 'secret', exchange.rest_url, clock = ClockSync())
+    clock = ClockSync()
+    with pytest.raises(ValueError):
+        clock.start(client)
+    assert clock._task is None
+    await client.close()
+
+
+def test_long_and_negative_round_trips_are_rejected():
+    clock = ClockSync(max_rtt = 0.5)
+    add_sample(clock, 100, 0.6, 3.0)
+    add_sample(clock, 100, -0.01, 3.0)
+    assert clock.rejected == 2 and clock.stats()['samples'] == 0 and clock.offset == 0
+    add_sample(clock, 100, 0.2, 3.0)
+    assert clock.offset == pytest.approx(3.0) and clock.stats()['samples'] == 1
+
+
+def test_offset_is_the_median_of_the_shortest_round_trips():
+    clock = ClockSync()
+    # Slow and asymmetric round trips give offsets far off
+    for n in range(6):
+        add_sample(clock, 100 + n, 0.5, 3.0 + n)
+    add_sample(clock, 110, 0.02, 1.002)
+    add_sample(clock, 111, 0.01, 1.0)
+    # The best quarter of 8 samples is the 2 shortest round trips
+    assert clock.offset == pytest.approx(1.001)
+    assert clock.error == pytest.approx(0.02 / 2 + 0.0005)
+    add_sample(clock, 112, 0.03, 1.01)
+    add_sample(clock, 113, 0.04, 1.02)
+    add_sample(clock, 114, 0.05, 5.0)
+    add_sample(clock, 115, 0.06, 5.0)
+    # 3 of 12 samples, rtt 0.01, 0.02 and 0.03
+    assert clock.offset == pytest.approx(1.002)
+
+
+def test_samples_older_than_max_age_are_dropped():
+    clock = ClockSync(max_age = 60)
+    add_sample(clock, 1000, 0.001, 1.0)
+    add_sample(clock, 1030, 0.2, 2.0)
+    assert clock.offset == pytest.approx(1.0) and clock.stats()['samples'] == 2
+    add_sample(clock, 1061, 0.3, 3.0)
+    assert clock.offset == pytest.approx(2.0) and clock.stats()['samples'] == 2
+
+
+async def test_close_cancels_the_probe_loop(exchange):
+    clock = ClockSync()
+    client = RestClient('key', 'secret', exchange.rest_url)
+    clock.start(client, interval = 0.01)
+    await asyncio.wait_for(clock.synced.wait(), 5)
+    task = clock._task
+    await asyncio.wait_for(clock.close(), 0.1)
+    assert task.cancelled()
+    await client.close()
+
+
+async def test_rest_and_websocket_clients_use_the_offset(exchange):
+    exchange.clock_offset = 5.0
+    clock = ClockSync()
+    metrics = Metrics()
+    client = WebSocketClient('key', 'secret', stream_url = exchange.stream_url, rest_url = exchange.rest_url, clock = clock, metrics = metrics)
+    clock.start(client.rest_client)
+    await asyncio.wait_for(clock.synced.wait(), 5)
+    assert clock.offset == pytest.approx(5.0, abs = 0.05)
+    assert client.rest_client.now_ms() == pytest.approx(time.time() * 1000 + 5000, abs = 50)
+    assert abs(client.rest_client.now_ms() - exchange.now_ms()) < 50
+
+    async def on_ticker(channel, pair, data):
+        pass
+
+    await client.start()
+    await client.subscribe(coro = on_ticker, channels = ['ticker'], pairs = ['BTC-USDT'])
+    await wait_until(lambda: metrics.merged(WS_EXCHANGE_LATENCY).count >= 10)
+    latency = metrics.merged(WS_EXCHANGE_LATENCY)
+    # Without the offset every message would arrive 5 s before it was sent
+    assert latency.min > -0.05 and latency.max < 0.5
+    await clock.close()
+    await client.close()
@@ -0,0 +1,79 @@
+import pytest
+
+from bit import codec
+from bit.codec import get_codec, peek_envelope
+from bit.web_socket_client import WebSocketClient
+
+COMPACT = '{"channel":"depth","timestamp":1,"module":"spot","data":{"type":"update","pair":"BTC-USDT","sequence":2}}'
+SPACED = '{"channel": "depth", "timestamp": 1, "module": "spot", "data": {"type": "update", "pair": "BTC-USDT", "sequence": 2}}'
+REORDERED = '{"data":{"pair":"BTC-USDT","sequence":2},"timestamp":1,"channel":"depth"}'
+REORDERED_SPACED = '{"data" : {"pair" : "BTC-USDT"}, "channel" : "depth"}'
+MIXED = '{"channel":"depth","data": {"pair": "BTC-USDT"}}'
+
+
+@pytest.mark.parametrize('frame', [COMPACT, SPACED, REORDERED, REORDERED_SPACED, MIXED])
+def test_peek_envelope_layouts(frame):
+    assert peek_envelope(frame) == ('depth', 'BTC-USDT')
+    assert peek_envelope(frame.encode()) == ('depth', 'BTC-USDT')
+
+
+@pytest.mark.parametrize('frame', [
+    # List payload, the pairs of the items aren't read
+    '{"channel":"trade","data":[{"pair":"BTC-USDT","trade_id":"1"}]}',
+    '{"channel": "trade", "data": [{"pair": "BTC-USDT", "trade_id": "1"}]}',
+    # Pair of a nested object only
+    '{"channel":"um_account","data":{"details":[{"pair":"BTC-USDT"}],"user_id":1}}',
+    '{"channel": "um_account", "data": {"details": [{"pair": "BTC-USDT"}], "user_id": 1}}',
+    # No pair at all
+    '{"channel":"ticker","data":{"last_price":"1"}}',
+])
+def test_peek_envelope_without_own_pair(frame):
+    assert peek_envelope(frame) == (frame.split('"')[3], None)
+
+
+def test_peek_envelope_without_channel():
+    assert peek_envelope('{"type":"subscription","data":{"code":0}}') == (None, None)
+    assert peek_envelope(b'{"type": "pong"}') == (None, None)
+
+
+async def test_lazy_decode_falls_back_to_full_decode():
+    client = WebSocketClient('key', 'secret', offline = True, lazy_decode = True)
+    received = []
+
+    async def on_ticker(channel, pair, data):
+        received.append((pair, data['last_price']))
+
+    await client.subscribe(coro = on_ticker, channels = ['ticker'], pairs = ['BTC-USDT'])
+    await client.ws.feed('{"channel": "ticker", "timestamp": 1, "data": {"pair": "ETH-USDT", "last_price": "1"}}')
+    await client.ws.feed('{"timestamp": 2, "data": {"last_price": "2", "pair": "BTC-USDT"}, "channel": "ticker"}')
+    # Unknown layout without a channel key is decoded fully instead of dropped
+    await client.ws.feed('{"type":"subscription","data":{"code":0,"subscription":["ticker"]}}')
+    assert received == [('BTC-USDT', '2')]
+    assert client.ws.skipped_frames == 1
+    await client.close()
+
+
+def test_default_backend_is_ujson(monkeypatch):
+    monkeypatch.setattr(codec, '_default', None)
+    assert get_codec().name == 'ujson'
+
+
+def test_missing_backend_falls_back_to_default(monkeypatch):
+    def missing():
+        raise ImportError('orjson')
+    monkeypatch.setitem(codec._FACTORIES, 'orjson', missing)
+    monkeypatch.setattr(codec, '_codecs', {})
+    assert get_codec('orjson').name == 'ujson'
+    with pytest.raises(ValueError):
+        get_codec('simplejson')
+
+
+@pytest.mark.parametrize('name', codec.BACKENDS)
+def test_backends_round_trip(name):
+    backend = get_codec(name)
+    if backend.name != name:
+        pytest.skip('{} not installed'.format(name))
+    assert backend.loads(backend.dumps({'a': [1, '2']})) == {'a': [1, '2']}
+    assert backend.loads(b'{"a":1}') == {'a': 1}
+    with pytest.raises(ValueError):
+        backend.loads('{')
@@ -0,0 +1,31 @@
+import asyncio
+
+from bit.rest_client import RestClient
+
+from conftest import wait_until
+
+
+async def test_requests_reuse_pooled_connections(rest_client):
+    await rest_client.warm_up(2, keepalive = False)
+    assert rest_client.pool_stats()['created'] == 2
+    for _ in range(20):
+        await rest_client.spot_system_time()
+    await asyncio.gather(*(rest_client.spot_system_time() for _ in range(2)))
+    stats = rest_client.pool_stats()
+    assert stats['created'] == 2
+    assert stats['reused'] == 22 and stats['requests'] == 24
+    assert stats['in_use'] == 0 and stats['idle'] == 2
+
+
+async def test_keepalive_refreshes_idle_connections_until_close(exchange):
+    client = RestClient('key', 'secret', exchange.rest_url, pool_size = 2)
+    client.KEEPALIVE_INTERVAL = 0.02
+    await client.warm_up()
+    await wait_until(lambda: client.pool_stats()['requests'] >= 6)
+    assert client.pool_stats()['created'] == 2
+    task = client._keepalive_task
+    await asyncio.wait_for(client.close(), 0.1)
+    assert task.cancelled()
+    requests = exchange.rest_requests
+    await asyncio.sleep(0.05)
+    assert exchange.rest_requests == requests
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from bit.delivery import DeliveryPolicy, Mailbox
+from bit.web_socket_client import WebSocketClient
+
+from conftest import wait_until
+
+PAIR = 'BTC-USDT'
+
+
+class SlowConsumer:
+    """Blocks on its first message until released, records everything it gets."""
+
+    def __init__(self):
+        self.messages = []
+        self.released = asyncio.Event()
+
+    async def __call__(self, channel, pair, data):
+        self.messages.append((channel, data['n']))
+        await self.released.wait()
+
+
+def message(channel, n, pair = PAIR):
+    return {'channel': channel, 'timestamp': n, 'data': {'pair': pair, 'n': n}}
+
+
+@pytest.fixture
+async def client():
+    client = WebSocketClient('key', 'secret', offline = True)
+    yield client
+    await client.close()
+
+
+async def test_conflate_keeps_latest_depth_and_ticker(client):
+    consumer = SlowConsumer()
+    await client.subscribe(coro = consumer, channels = ['depth', 'ticker', 'trade'], pairs = [PAIR], delivery = DeliveryPolicy.CONFLATE)
+    await client.on_message(message('depth', 1))
+    await wait_until(lambda: consumer.messages)
+    for n in (2, 3, 4):
+        await client.on_message(message('depth', n))
+    await client.on_message(message('ticker', 5))
+    await client.on_message(message('trade', 6))
+    await client.on_message(message('ticker', 7))
+    await client.on_message(message('trade', 8))
+    consumer.released.set()
+    await wait_until(lambda: len(consumer.messages) == 5)
+    # Conflated data keeps the queue position of the first pending message, trades are all kept
+    assert consumer.messages == [('depth', 1), ('depth', 4), ('ticker', 7), ('trade', 6), ('trade', 8)]
+    stats = client.delivery_stats()[consumer]
+    assert stats['conflated'] == 3 and stats['dropped'] == 0 and stats['delivered'] == 5
+
+
+async def test_conflated_pairs_kept_apart(client):
+    consumer = SlowConsumer()
+    await client.subscribe(coro = consumer, channels = ['ticker'], pairs = [PAIR, 'ETH-USDT'], delivery = DeliveryPolicy.CONFLATE)
+    await client.on_message(message('ticker', 1))
+    await wait_until(lambda: consumer.messages)
+    await client.on_message(message('ticker', 2))
+    await client.on_message(message('ticker', 3, 'ETH-USDT'))
+    await client.on_message(message('ticker', 4))
+    consumer.released.set()
+    await wait_until(lambda: len(consumer.messages) == 3)
+    assert [n for _, n in consumer.messages] == [1, 4, 3]
+
+
+async def test_drop_oldest_keeps_newest_messages(client):
+    consumer = SlowConsumer()
+    await client.subscribe(coro = consumer, channels = ['trade'], pairs = [PAIR], delivery = DeliveryPolicy.DROP_OLDEST, max_queue = 2)
+    await client.on_message(message('trade', 1))
+    await wait_until(lambda: consumer.messages)
+    for n in range(2, 7):
+        await client.on_message(message('trade', n))
+    stats = client.delivery_stats()[consumer]
+    assert stats['queued'] == 2 and stats['dropped'] == 3 and stats['max_queued'] == 2
+    consumer.released.set()
+    await wait_until(lambda: len(consumer.messages) == 3)
+    assert [n for _, n in consumer.messages] == [1, 5, 6]
+
+
+async def test_drop_oldest_forgets_conflated_entries():
+    consumer = SlowConsumer()
+    mailbox = Mailbox(consumer, DeliveryPolicy.CONFLATE, max_queue = 1)
+    mailbox.put('ticker', PAIR, {'n': 1})
+    mailbox.put('trade', PAIR, {'n': 2})
+    # The dropped ticker entry is no longer conflated into
+    mailbox.put('ticker', PAIR, {'n': 3})
+    assert mailbox.stats()['dropped'] == 2 and mailbox.stats()['conflated'] == 0
+    mailbox.start()
+    consumer.released.set()
+    await wait_until(lambda: consumer.messages)
+    assert consumer.messages == [('ticker', 3)]
+    await mailbox.stop()
+
+
+def test_drop_oldest_needs_max_queue():
+    with pytest.raises(ValueError):
+        Mailbox(None, DeliveryPolicy.DROP_OLDEST)
+    with pytest.raises(ValueError):
+        Mailbox(None, 'latest')
@@ -0,0 +1,83 @@
+import pytest
+
+from bit.delivery import DeliveryPolicy
+from bit.models import Trade
+from bit.web_socket_client import WebSocketClient
+
+from conftest import wait_until
+
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+
+    async def __call__(self, channel, pair, data):
+        self.messages.append((channel, pair, data))
+
+
+def trade(pair, trade_id):
+    return {'trade_id': str(trade_id), 'pair': pair, 'price': '100', 'qty': '1', 'side': 'buy', 'created_at': 1}
+
+
+@pytest.fixture
+async def client():
+    client = WebSocketClient('key', 'secret', offline = True)
+    yield client
+    await client.close()
+
+
+async def test_dict_payload_dispatched_by_pair(client):
+    btc, eth = Recorder(), Recorder()
+    await client.subscribe(coro = btc, channels = ['ticker'], pairs = ['BTC-USDT'])
+    await client.subscribe(coro = eth, channels = ['ticker'], pairs = ['ETH-USDT'])
+    await client.on_message({'channel': 'ticker', 'timestamp': 5, 'data': {'pair': 'ETH-USDT', 'last_price': '1'}})
+    assert btc.messages == []
+    assert eth.messages == [('ticker', 'ETH-USDT', {'pair': 'ETH-USDT', 'last_price': '1', 'timestamp': 5})]
+
+
+async def test_list_payload_split_by_pair(client):
+    btc, eth = Recorder(), Recorder()
+    await client.subscribe(coro = btc, channels = ['trade'], pairs = ['BTC-USDT'])
+    await client.subscribe(coro = eth, channels = ['trade'], pairs = ['ETH-USDT'])
+    data = [trade('BTC-USDT', 1), trade('ETH-USDT', 2), trade('BTC-USDT', 3), trade('SOL-USDT', 4)]
+    await client.on_message({'channel': 'trade', 'timestamp': 1, 'data': data})
+    # One call per pair with that pair's items in order, unsubscribed pairs dropped
+    assert btc.messages == [('trade', 'BTC-USDT', [data[0], data[2]])]
+    assert eth.messages == [('trade', 'ETH-USDT', [data[1]])]
+
+
+async def test_subscriber_of_several_pairs(client):
+    both = Recorder()
+    await client.subscribe(coro = both, channels = ['trade'], pairs = ['BTC-USDT', 'ETH-USDT'])
+    data = [trade('ETH-USDT', 1), trade('BTC-USDT', 2)]
+    await client.on_message({'channel': 'trade', 'timestamp': 1, 'data': data})
+    assert sorted((pair, len(items)) for _, pair, items in both.messages) == [('BTC-USDT', 1), ('ETH-USDT', 1)]
+
+
+async def test_typed_list_payload():
+    client = WebSocketClient('key', 'secret', offline = True, typed = True)
+    recorder = Recorder()
+    await client.subscribe(coro = recorder, channels = ['trade'], pairs = ['BTC-USDT'])
+    await client.on_message({'channel': 'trade', 'timestamp': 1, 'data': [trade('BTC-USDT', 1), trade('BTC-USDT', 2)]})
+    (_, _, items), = recorder.messages
+    assert [type(item) for item in items] == [Trade, Trade]
+    assert [item.trade_id for item in items] == ['1', '2']
+    assert items[0].price == 100.0
+    await client.close()
+
+
+async def test_queued_subscriber_gets_list_payload(client):
+    recorder = Recorder()
+    await client.subscribe(coro = recorder, channels = ['trade'], pairs = ['BTC-USDT'], delivery = DeliveryPolicy.UNBOUNDED)
+    data = [trade('BTC-USDT', 1), trade('BTC-USDT', 2)]
+    await client.on_message({'channel': 'trade', 'timestamp': 1, 'data': data})
+    await wait_until(lambda: recorder.messages)
+    assert recorder.messages == [('trade', 'BTC-USDT', data)]
+
+
+async def test_unsubscribe_stops_dispatch(client):
+    recorder = Recorder()
+    await client.subscribe(coro = recorder, channels = ['trade'], pairs = ['BTC-USDT'])
+    await client.unsubscribe('trade', 'BTC-USDT')
+    await client.on_message({'channel': 'trade', 'timestamp': 1, 'data': [trade('BTC-USDT', 1)]})
+    assert recorder.messages == []
@@ -0,0 +1,82 @@
+import asyncio
+
+from bit.hedging import HedgePolicy
+from bit.rest_client import RestClient
+
+ORDER = {'pair': 'BTC-USDT', 'side': 'buy', 'order_type': 'limit', 'qty': '1', 'price': '100'}
+
+
+def open_orders(exchange, label):
+    return [o for o in exchange.orders.values() if o['label'] == label and o['status'] == 'open']
+
+
+async def test_slow_query_is_hedged(exchange):
+    exchange.rest_stall_probability, exchange.rest_stall = 1.0, 0.5
+    hedge = HedgePolicy(max_delay = 0.02)
+    client = RestClient('key', 'secret', exchange.rest_url, hedge = hedge)
+    query = asyncio.ensure_future(client.spot_query_open_orders())
+    await asyncio.sleep(0.01)
+    exchange.rest_stall_probability = 0.0
+    assert await asyncio.wait_for(query, 0.3) == []
+    assert hedge.stats()['hedges'] == 1 and hedge.stats()['wins'] == 1
+    await client.close()
+
+
+async def test_duplicate_order_cancelled_by_label(exchange):
+    exchange.rest_latency = 0.02
+    # Queries aren't hedged, only the order
+    hedge = HedgePolicy(orders = True, max_delay = 0.005, paths = ())
+    client = RestClient('key', 'secret', exchange.rest_url, hedge = hedge)
+    order = await client.spot_place_order(label = 'hedged-1', **ORDER)
+    await hedge.close()
+    assert hedge.hedges == 1 and hedge.duplicates == 1
+    assert [o['order_id'] for o in open_orders(exchange, 'hedged-1')] == [order['order_id']]
+    await client.close()
+
+
+async def test_failed_attempt_that_placed_its_order_is_found(exchange):
+    # The first attempt times out on the client but still places its order, after the second attempt won
+    exchange.rest_stall_probability, exchange.rest_stall = 1.0, 0.3
+    hedge = HedgePolicy(orders = True, max_delay = 0.05, recheck_delay = 0.3)
+    client = RestClient('key', 'secret', exchange.rest_url, hedge = hedge, request_timeout = 0.15)
+    placing = asyncio.ensure_future(client.spot_place_order(label = 'hedged-2', **ORDER))
+    await asyncio.sleep(0.02)
+    exchange.rest_stall_probability = 0.0
+    order = await placing
+    await hedge.close()
+    assert len([o for o in exchange.orders.values() if o['label'] == 'hedged-2']) == 2
+    assert [o['order_id'] for o in open_orders(exchange, 'hedged-2')] == [order['order_id']]
+    assert hedge.duplicates == 1
+    await client.close()
+
+
+async def test_unlabelled_orders_are_not_hedged(exchange):
+    exchange.rest_latency = 0.02
+    hedge = HedgePolicy(orders = True, max_delay = 0.005)
+    client = RestClient('key', 'secret', exchange.rest_url, hedge = hedge)
+    await client.spot_place_order(**ORDER)
+    assert hedge.hedges == 0 and len(exchange.orders) == 1
+    await client.close()
+
+
+async def test_settle_gets_kept_result_when_loser_fails():
+    hedge = HedgePolicy(max_delay = 0.01, recheck_delay = 0.01)
+    settled = []
+    calls = 0
+
+    async def attempt():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(0.05)
+            raise ConnectionError('lost')
+        return 'second'
+
+    async def settle(kept):
+        settled.append(kept)
+        return 0
+
+    assert await hedge.run('key', attempt, settle) == 'second'
+    await hedge.close()
+    # Once after both attempts finished and once more since one failed
+    assert settled == ['second', 'second']
@@ -0,0 +1,72 @@
+import asyncio
+import random
+
+import pytest
+
+from bit.exceptions import OrderValidationException
+from bit.instruments import DOWN, NEAREST, PASSIVE, UP, InstrumentCache
+
+from conftest import wait_until
+
+INSTRUMENT = {'pair': 'BTC-USDT', 'price_step': '0.1', 'qty_step': '0.001', 'qty_min': '0.001'}
+
+
+class FlakyInstrumentsClient:
+    """Instruments query failing with the given errors between successful answers."""
+
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.queries = 0
+
+    async def spot_query_instruments(self):
+        self.queries += 1
+        if self.queries > 1 and self.failures:
+            raise self.failures.pop(0)
+        return [INSTRUMENT]
+
+
+async def test_refresh_loop_survives_transport_errors():
+    client = FlakyInstrumentsClient([ConnectionResetError('reset'), asyncio.TimeoutError(), OSError('unreachable')])
+    cache = InstrumentCache(ttl = 0.01)
+    cache.RETRY_WAIT = 0.01
+    await cache.start(client)
+    await wait_until(lambda: client.queries >= 6)
+    assert not cache._task.done()
+    assert cache['BTC-USDT'].price_step == 0.1
+    await cache.close()
+
+
+def test_normalize_many_matches_normalize():
+    cache = InstrumentCache()
+    cache._set([
+        INSTRUMENT,
+        {'pair': 'ETH-USDT', 'price_step': '0.01', 'qty_step': '0.0001', 'qty_min': '0.01'},
+        {'pair': 'DOGE-USDT', 'price_step': '0.00001', 'qty_step': '1', 'qty_min': '10'},
+    ], 0)
+    rng = random.Random(7)
+    orders = []
+    for _ in range(2000):
+        pair = rng.choice(list(cache.instruments))
+        order = {'pair': pair, 'side': rng.choice(['buy', 'sell', None]), 'qty': rng.uniform(20, 100)}
+        if rng.random() < 0.9:
+            order['price'] = rng.uniform(0.5, 30000)
+        orders.append(order)
+    for mode in (PASSIVE, NEAREST, DOWN, UP):
+        assert cache.normalize_many(orders, mode) == [cache.normalize(order, mode) for order in orders]
+
+
+def test_normalize_many_raises_for_first_invalid_order():
+    cache = InstrumentCache()
+    cache._set([INSTRUMENT, dict(INSTRUMENT, pair = 'LTC-USDT', active = False)], 0)
+    orders = [
+        {'pair': 'BTC-USDT', 'side': 'buy', 'price': '100.05', 'qty': '1'},
+        {'pair': 'BTC-USDT', 'side': 'buy', 'price': '100', 'qty': '0.0004'},
+        {'pair': 'XRP-USDT', 'side': 'buy', 'price': '1', 'qty': '1'},
+    ]
+    with pytest.raises(OrderValidationException, match = 'below the minimum'):
+        cache.normalize_many(orders)
+    with pytest.raises(OrderValidationException, match = 'Unknown instrument XRP-USDT'):
+        cache.normalize_many([orders[0], orders[2]])
+    with pytest.raises(OrderValidationException, match = 'not active'):
+        cache.normalize_many([{'pair': 'LTC-USDT', 'price': '1', 'qty': '1'}])
+    assert cache.normalize_many(orders[:1]) == [{'pair': 'BTC-USDT', 'side': 'buy', 'price': '100.0', 'qty': '1.000'}]
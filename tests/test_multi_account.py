@@ -0,0 +1,62 @@
+import asyncio
+
+import aiosonic
+import pytest
+
+from bit.multi_account import MultiAccountClient
+from bit.rest_client import RestClient
+
+ACCOUNTS = {'main': ('ak0', 'sk0'), 'mm1': ('ak1', 'sk1'), 'mm2': ('ak2', 'sk2')}
+
+
+def track_concurrency(exchange):
+    """Requests the exchange is answering at once, current and max."""
+    counts = {'current': 0, 'max': 0}
+    handle_http = exchange._handle_http
+
+    async def handle(method, target, body):
+        counts['current'] += 1
+        counts['max'] = max(counts['max'], counts['current'])
+        try:
+            return await handle_http(method, target, body)
+        finally:
+            counts['current'] -= 1
+
+    exchange._handle_http = handle
+    return counts
+
+
+async def test_accounts_share_one_pool(exchange):
+    client = MultiAccountClient(ACCOUNTS, exchange.rest_url, pool_size = 4)
+    assert all(account.session is client.session for account in client.clients.values())
+    await client.warm_up(keepalive = False)
+    for _ in range(5):
+        results = await client.um_query_accounts()
+        assert sorted(results) == sorted(ACCOUNTS)
+        assert not any(isinstance(result, Exception) for result in results.values())
+    stats = client.pool_stats()
+    assert stats['created'] == 4 and stats['reused'] == 15
+    assert all(account.pool_stats() == stats for account in client.clients.values())
+    await client.close()
+
+
+async def test_max_in_flight_per_account(exchange):
+    counts = track_concurrency(exchange)
+    exchange.rest_latency = 0.05
+    client = MultiAccountClient(ACCOUNTS, exchange.rest_url, pool_size = 8, max_in_flight = 2)
+    busy = asyncio.ensure_future(asyncio.gather(*(client['main'].spot_system_time() for _ in range(6))))
+    await asyncio.sleep(0.01)
+    assert counts['current'] == 2
+    # Another account isn't queued behind the busy one
+    await asyncio.wait_for(asyncio.gather(*(client['mm1'].spot_system_time() for _ in range(2))), 0.09)
+    assert not busy.done()
+    await busy
+    assert counts['max'] == 4
+    await client.close()
+
+
+async def test_session_needs_a_tuned_connector(exchange):
+    session = aiosonic.HTTPClient()
+    with pytest.raises(ValueError, match = 'TunedConnector'):
+        RestClient('key', 'secret', exchange.rest_url, session = session)
+    await session.shutdown()
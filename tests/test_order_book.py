@@ -0,0 +1,135 @@
+import asyncio
+
+from bit.order_book import OrderBook, OrderBookManager
+
+from conftest import wait_until
+
+PAIR = 'BTC-USDT'
+
+
+def levels(side):
+    return [(float(price), float(qty)) for price, qty in side]
+
+
+def test_order_book_levels():
+    book = OrderBook(PAIR)
+    book.load_snapshot([['99', '1'], ['100', '2'], ['98', '3']], [['102', '1'], ['101', '4']], sequence = 7)
+    assert book.synced and book.sequence == 7
+    assert book.best_bid() == (100.0, 2.0)
+    assert book.best_ask() == (101.0, 4.0)
+    assert book.mid() == 100.5 and book.spread() == 1.0
+    book.update_bid(100.5, 1)
+    book.update_ask(101, 0)
+    assert book.bids(2) == [(100.5, 1.0), (100.0, 2.0)]
+    assert book.asks(5) == [(102.0, 1.0)]
+    assert len(book) == 5
+
+
+async def test_depth_updates_applied_in_sequence(exchange, rest_client):
+    manager = OrderBookManager(rest_client)
+    mock_book = exchange.book(PAIR)
+    await manager.on_depth('depth', PAIR, dict(mock_book.snapshot(), type = 'snapshot'))
+    for _ in range(20):
+        prev_sequence = mock_book.sequence
+        changes = mock_book.step()
+        await manager.on_depth('depth', PAIR, {
+            'type': 'update', 'pair': PAIR, 'sequence': mock_book.sequence, 'prev_sequence': prev_sequence, 'changes': changes,
+        })
+    book = manager.get(PAIR)
+    snapshot = mock_book.snapshot()
+    assert manager.gaps == 0 and book.synced
+    assert book.sequence == snapshot['sequence']
+    assert book.bids(100) == levels(snapshot['bids'])
+    assert book.asks(100) == levels(snapshot['asks'])
+    await manager.close()
+
+
+async def test_gap_resyncs_from_rest_snapshot(exchange, rest_client):
+    manager = OrderBookManager(rest_client)
+    mock_book = exchange.book(PAIR)
+    await manager.on_depth('depth', PAIR, dict(mock_book.snapshot(), type = 'snapshot'))
+    # Two updates get lost, the third reveals the gap
+    mock_book.step()
+    mock_book.step()
+    prev_sequence = mock_book.sequence
+    changes = mock_book.step()
+    notified = []
+
+    async def on_book(pair, book):
+        notified.append(book.sequence)
+
+    manager.track(PAIR, on_book)
+    await manager.on_depth('depth', PAIR, {
+        'type': 'update', 'pair': PAIR, 'sequence': mock_book.sequence, 'prev_sequence': prev_sequence, 'changes': changes,
+    })
+    book = manager.get(PAIR)
+    assert manager.gaps == 1 and not book.synced
+
+    await wait_until(lambda: book.synced)
+    snapshot = mock_book.snapshot()
+    assert book.sequence == snapshot['sequence']
+    assert book.bids(100) == levels(snapshot['bids'])
+    assert book.asks(100) == levels(snapshot['asks'])
+    await wait_until(lambda: notified)
+    await manager.close()
+
+
+async def test_buffered_updates_replayed_after_snapshot(exchange, rest_client):
+    manager = OrderBookManager(rest_client)
+    mock_book = exchange.book(PAIR)
+    # Updates arrive before any snapshot: they are buffered and a REST snapshot is fetched
+    prev_sequence = mock_book.sequence
+    changes = mock_book.step()
+    await manager.on_depth('depth', PAIR, {
+        'type': 'update', 'pair': PAIR, 'sequence': mock_book.sequence, 'prev_sequence': prev_sequence, 'changes': changes,
+    })
+    book = manager.get(PAIR)
+    assert not book.synced
+    await wait_until(lambda: book.synced)
+    assert book.sequence == mock_book.sequence
+    assert book.bids(100) == levels(mock_book.snapshot()['bids'])
+    await manager.close()
+
+
+class FlakySnapshotClient:
+    """Snapshot query failing with the given errors before answering from the mock."""
+
+    def __init__(self, rest_client, failures):
+        self.rest_client = rest_client
+        self.failures = list(failures)
+        self.queries = 0
+
+    async def spot_market_orderbooks(self, **params):
+        self.queries += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return await self.rest_client.spot_market_orderbooks(**params)
+
+
+async def test_resync_retries_transport_errors(exchange, rest_client):
+    client = FlakySnapshotClient(rest_client, [ConnectionResetError('reset'), asyncio.TimeoutError(), OSError('unreachable')])
+    manager = OrderBookManager(client)
+    manager.RESYNC_RETRY_WAIT = 0.01
+    mock_book = exchange.book(PAIR)
+    prev_sequence = mock_book.sequence
+    changes = mock_book.step()
+    await manager.on_depth('depth', PAIR, {
+        'type': 'update', 'pair': PAIR, 'sequence': mock_book.sequence, 'prev_sequence': prev_sequence, 'changes': changes,
+    })
+    book = manager.get(PAIR)
+    await wait_until(lambda: book.synced)
+    assert client.queries == 4
+    assert book.sequence == mock_book.sequence
+    await manager.close()
+
+
+async def test_wait_synced_wakes_on_snapshot(exchange, rest_client):
+    manager = OrderBookManager(rest_client)
+    manager.track(PAIR)
+    waiting = asyncio.ensure_future(manager.wait_synced([PAIR]))
+    await asyncio.sleep(0.01)
+    assert not waiting.done()
+    await manager.on_depth('depth', PAIR, dict(exchange.book(PAIR).snapshot(), type = 'snapshot'))
+    await asyncio.wait_for(waiting, 1)
+    assert manager._synced_events == {}
+    await manager.close()
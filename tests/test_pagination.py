@@ -0,0 +1,91 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from bit.mock_exchange import MockExchange
+from bit.pagination import paginate
+from bit.rest_client import RestClient
+
+START = MockExchange.HISTORY_START
+
+
+@pytest.fixture
+async def history():
+    exchange = MockExchange(history_size = 1050, rest_latency = 0.002)
+    await exchange.start()
+    client = RestClient('key', 'secret', exchange.rest_url)
+    yield exchange, client
+    await client.close()
+    await exchange.close()
+
+
+async def test_all_pages_in_order(history):
+    exchange, client = history
+    trades = [trade async for trade in client.spot_iter_trades(pair = 'BTC-USDT', concurrency = 3)]
+    # Newest first, the last page is short
+    assert [trade['created_at'] for trade in trades] == [START + i * 1000 for i in range(1049, -1, -1)]
+    # 11 pages and the prefetched pages past the end
+    assert 11 <= exchange.rest_requests <= 11 + 3
+
+
+async def test_windows_yielded_oldest_first(history):
+    exchange, client = history
+    end = START + 999 * 1000
+    transactions = [
+        tx['tx_time'] async for tx in client.spot_iter_transactions(start_time = START, end_time = end, windows = 4, page_size = 50)
+    ]
+    assert len(transactions) == len(set(transactions)) == 1000
+    # Newest first within each window of 250 seconds, windows from the oldest
+    expected = [START + i * 1000 for window in range(4) for i in range(window * 250 + 249, window * 250 - 1, -1)]
+    assert transactions == expected
+
+
+async def test_window_errors_raised():
+    async def fetch(**params):
+        if params['offset'] == 2:
+            raise ConnectionResetError('reset')
+        return [params['offset']] * 10
+
+    records = []
+    with pytest.raises(ConnectionResetError):
+        async for record in paginate(fetch, page_size = 10):
+            records.append(record)
+    assert records == [1] * 10
+
+
+async def test_closing_early_cancels_prefetches():
+    started, finished, cancelled = [], [], []
+
+    async def fetch(**params):
+        started.append(params['offset'])
+        try:
+            await asyncio.sleep(0.05 * params['offset'])
+        except asyncio.CancelledError:
+            cancelled.append(params['offset'])
+            raise
+        finished.append(params['offset'])
+        return [params['offset']] * 10
+
+    async with contextlib.aclosing(paginate(fetch, page_size = 10, concurrency = 4)) as records:
+        async for record in records:
+            assert record == 1
+            break
+    await asyncio.sleep(0.3)
+    assert finished == [1]
+    assert sorted(cancelled) == sorted(set(started) - {1})
+
+
+async def test_buffer_bounds_fetching():
+    requested = []
+
+    async def fetch(**params):
+        requested.append(params['offset'])
+        return [params['offset']] * 10
+
+    records = paginate(fetch, page_size = 10, concurrency = 2, buffer_pages = 2)
+    assert await records.__anext__() == 1
+    await asyncio.sleep(0.05)
+    # One page being consumed, two buffered, one fetched waiting for room and one more in flight
+    assert len(requested) <= 6
+    await records.aclose()
@@ -0,0 +1,68 @@
+import asyncio
+
+from bit.mock_exchange import MockExchange
+from bit.rate_limit import Priority, RequestScheduler
+from bit.rest_client import RestClient
+
+ORDER = {'pair': 'BTC-USDT', 'side': 'buy', 'order_type': 'limit', 'qty': '1', 'price': '100'}
+
+
+async def test_queued_cancel_goes_before_queries():
+    scheduler = RequestScheduler(20, 1)
+    await scheduler.acquire(Priority.QUERY)
+    done = []
+
+    async def request(name, priority):
+        await scheduler.acquire(priority)
+        done.append(name)
+
+    queries = [asyncio.ensure_future(request('query {}'.format(i), Priority.QUERY)) for i in range(3)]
+    await asyncio.sleep(0)
+    cancel = asyncio.ensure_future(request('cancel', Priority.CANCEL))
+    await asyncio.gather(*queries, cancel)
+    assert done == ['cancel', 'query 0', 'query 1', 'query 2']
+    stats = scheduler.stats()
+    assert stats['query']['requests'] == 4 and stats['query']['max_queued'] == 3 and stats['query']['waited'] == 3
+    assert stats['cancel']['waited'] == 1 and 0 < stats['cancel']['max_wait'] < stats['query']['max_wait']
+    assert scheduler.queue_depth() == 0
+    scheduler.close()
+
+
+async def test_cancel_overtakes_queries_against_the_exchange():
+    exchange = MockExchange(rest_rate_limit = 20)
+    await exchange.start()
+    client = RestClient('key', 'secret', exchange.rest_url, rate_limit = 20, rate_limit_burst = 1)
+    order = await client.spot_place_order(**ORDER)
+    done = []
+
+    async def query(i):
+        await client.spot_query_open_orders()
+        done.append(i)
+
+    queries = [asyncio.ensure_future(query(i)) for i in range(5)]
+    await asyncio.sleep(0.01)
+    assert client.scheduler.queue_depth() > 0
+    await client.spot_cancel_order(order_id = order['order_id'])
+    done.append('cancel')
+    await asyncio.gather(*queries)
+    assert done.index('cancel') < 3
+    assert exchange.orders[order['order_id']]['status'] == 'cancelled'
+    assert client.scheduler.stats()['query']['max_queued'] >= 4
+    await client.close()
+    await exchange.close()
+
+
+async def test_limit_learnt_from_headers_and_429_retried():
+    # The client believes in a limit ten times higher than the exchange's
+    exchange = MockExchange(rest_rate_limit = 10)
+    await exchange.start()
+    client = RestClient('key', 'secret', exchange.rest_url, rate_limit = 100)
+    results = await asyncio.gather(*(client.spot_query_open_orders() for _ in range(15)))
+    assert results == [[]] * 15
+    assert client.scheduler.bucket.capacity == 10 and client.scheduler.bucket.rate == 10
+    # Requests answered with 429 were queued again instead of failing
+    assert exchange.rest_requests > 15
+    stats = client.scheduler.stats()['query']
+    assert stats['requests'] == exchange.rest_requests and stats['avg_wait'] > 0
+    await client.close()
+    await exchange.close()
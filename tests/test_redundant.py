@@ -0,0 +1,93 @@
+import asyncio
+import collections
+
+from bit.mock_exchange import MockExchange
+from bit.models import UMAccount
+from bit.redundant import Deduplicator, RedundantWebSocketClient
+
+PAIR = 'BTC-USDT'
+
+
+def ticker(timestamp, last_price):
+    return {'pair': PAIR, 'time': timestamp, 'last_price': last_price, 'timestamp': timestamp}
+
+
+def test_messages_of_the_same_millisecond_pass():
+    deduplicator = Deduplicator()
+    assert deduplicator.filter('ticker', PAIR, ticker(1, '100'), 0) is not None
+    assert deduplicator.filter('ticker', PAIR, ticker(1, '101'), 0) is not None
+    # The second copy delivers both again
+    assert deduplicator.filter('ticker', PAIR, ticker(1, '100'), 1) is None
+    assert deduplicator.filter('ticker', PAIR, ticker(1, '101'), 1) is None
+    assert deduplicator.duplicates == 2
+
+
+def test_identical_messages_counted_per_copy():
+    deduplicator = Deduplicator()
+    # One copy received the same content twice in a millisecond, both are real messages
+    assert deduplicator.filter('ticker', PAIR, ticker(1, '100'), 0) is not None
+    assert deduplicator.filter('ticker', PAIR, ticker(1, '100'), 0) is not None
+    assert deduplicator.filter('ticker', PAIR, ticker(1, '100'), 1) is None
+    assert deduplicator.filter('ticker', PAIR, ticker(1, '100'), 1) is None
+    # A third occurrence is new, whichever copy has it first
+    assert deduplicator.filter('ticker', PAIR, ticker(1, '100'), 1) is not None
+    assert deduplicator.filter('ticker', PAIR, ticker(1, '100'), 0) is None
+
+
+def test_typed_messages_keyed_by_content():
+    deduplicator = Deduplicator()
+    first = UMAccount({'user_id': 1, 'total_collateral': '10', 'details': [{'currency': 'BTC', 'equity': '1'}]}, 5)
+    second = UMAccount({'user_id': 1, 'total_collateral': '10', 'details': [{'currency': 'BTC', 'equity': '2'}]}, 5)
+    assert deduplicator.filter('um_account', '', first, 0) is not None
+    assert deduplicator.filter('um_account', '', second, 0) is not None
+    copy = UMAccount({'user_id': 1, 'total_collateral': '10', 'details': [{'currency': 'BTC', 'equity': '2'}]}, 5)
+    assert deduplicator.filter('um_account', '', copy, 1) is None
+
+
+def test_trades_and_depth():
+    deduplicator = Deduplicator()
+    trades = [{'trade_id': '1', 'pair': PAIR}, {'trade_id': '2', 'pair': PAIR}]
+    assert deduplicator.filter('trade', PAIR, trades[:1], 0) == trades[:1]
+    assert deduplicator.filter('trade', PAIR, trades, 1) == trades[1:]
+    assert deduplicator.filter('trade', PAIR, trades, 0) is None
+    assert deduplicator.filter('depth', PAIR, {'sequence': 2}, 0) is not None
+    assert deduplicator.filter('depth', PAIR, {'sequence': 2}, 1) is None
+    assert deduplicator.filter('depth', PAIR, {'sequence': 1}, 1) is None
+    assert deduplicator.filter('depth', PAIR, {'sequence': 3}, 1) is not None
+
+
+def test_data_without_key_always_passes():
+    deduplicator = Deduplicator()
+    assert deduplicator.filter('ticker', PAIR, {'pair': PAIR}, 0) is not None
+    assert deduplicator.filter('ticker', PAIR, {'pair': PAIR}, 1) is not None
+
+
+async def test_redundant_client_delivers_every_ticker_once():
+    # Several ticker updates per millisecond, many of them with the same timestamp
+    exchange = MockExchange(message_rate = 5000)
+    await exchange.start()
+    client = RedundantWebSocketClient('key', 'secret', copies = 2, stream_url = exchange.stream_url, rest_url = exchange.rest_url)
+    await client.start()
+    delivered = []
+    received = [collections.Counter(), collections.Counter()]
+
+    async def on_ticker(channel, pair, data):
+        delivered.append(data)
+
+    def recorder(counter):
+        async def record(channel, pair, data):
+            counter[repr(data)] += 1
+        return record
+
+    for copy, counter in zip(client.clients, received):
+        await copy.subscribe(coro = recorder(counter), channels = ['ticker'], pairs = [PAIR])
+    await client.subscribe(coro = on_ticker, channels = ['ticker'], pairs = [PAIR])
+    await asyncio.sleep(0.5)
+    exchange.message_rate = 0
+    await asyncio.sleep(0.2)
+    await client.close()
+    await exchange.close()
+
+    expected = sum(max(received[0][key], received[1][key]) for key in received[0].keys() | received[1].keys())
+    assert expected > 1000
+    assert len(delivered) == expected
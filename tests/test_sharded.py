@@ -0,0 +1,41 @@
+from bit.delivery import DeliveryPolicy
+from bit.redundant import RedundantWebSocketClient
+from bit.rest_client import RestClient
+from bit.sharded_client import ShardedWebSocketClient
+
+
+class CountingRestClient(RestClient):
+    closes = 0
+
+    async def close(self):
+        self.closes += 1
+        await super().close()
+
+
+async def test_given_rest_client_fetches_the_token_and_is_closed_once(exchange):
+    for cls in (ShardedWebSocketClient, RedundantWebSocketClient):
+        rest_client = CountingRestClient('key', 'secret', exchange.rest_url)
+        client = cls('key', 'secret', rest_client = rest_client, stream_url = exchange.stream_url, rest_url = exchange.rest_url)
+        await client.start()
+        shards = getattr(client, 'shards', None) or client.clients
+        assert all(shard.rest_client is not rest_client for shard in shards)
+        await client.close()
+        assert rest_client.closes == 1
+
+
+async def test_moved_subscription_keeps_its_delivery_policy():
+    client = ShardedWebSocketClient('key', 'secret', shards = 2, offline = True)
+
+    async def on_ticker(channel, pair, data):
+        pass
+
+    pairs = ['BTC-USDT', 'ETH-USDT', 'SOL-USDT', 'XRP-USDT']
+    await client.subscribe(coro = on_ticker, channels = ['ticker'], pairs = pairs, delivery = DeliveryPolicy.DROP_OLDEST, max_queue = 5)
+    emptied = client.shards.index(client.shard_of(pairs[0]))
+    for pair in [pair for pair in pairs if client.shard_of(pair) is client.shards[emptied]]:
+        await client.unsubscribe('ticker', pair)
+    # One pair of the other shard was moved over
+    assert [shard.subscribers['ticker'].keys() != set() for shard in client.shards] == [True, True]
+    mailbox = client.shards[emptied].mailbox_of(on_ticker)
+    assert mailbox.policy == DeliveryPolicy.DROP_OLDEST and mailbox.max_queue == 5
+    await client.close()
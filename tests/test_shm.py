@@ -0,0 +1,143 @@
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import bit
+from bit.shm import SharedMemoryPublisher, SharedMemorySubscriber
+
+PAIR = 'BTC-USDT'
+# Small enough for a few hundred messages to wrap around several times
+RING_SIZE = 4096
+
+
+def until(predicate, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            pytest.fail('Condition not met within {} s'.format(timeout))
+        time.sleep(0.001)
+
+
+def read_trades(name, ready, release, results):
+    """Worker process collecting trades of PAIR until the end message, blocked on the first one until release."""
+    asyncio.run(_read_trades(name, ready, release, results))
+
+
+async def _read_trades(name, ready, release, results):
+    reader = SharedMemorySubscriber(name, poll_interval = 0.0001)
+    received = []
+    done = asyncio.Event()
+
+    async def on_trade(channel, pair, data):
+        if data.get('end'):
+            done.set()
+            return
+        received.append(data['n'])
+        if len(received) == 1:
+            while not release.is_set():
+                await asyncio.sleep(0.001)
+
+    await reader.subscribe(coro = on_trade, channels = ['trade'], pairs = [PAIR])
+    await reader.start()
+    ready.set()
+    await asyncio.wait_for(done.wait(), 30)
+    stats = reader.stats()
+    await reader.close()
+    results.put((received, stats))
+
+
+class Worker:
+    def __init__(self, context, name, *, blocked = False):
+        self.ready = context.Event()
+        self.release = context.Event()
+        if not blocked:
+            self.release.set()
+        self.results = context.Queue()
+        self.process = context.Process(target = read_trades, args = (name, self.ready, self.release, self.results))
+        self.process.start()
+
+    def result(self):
+        result = self.results.get(timeout = 30)
+        self.process.join(10)
+        return result
+
+
+def reader_stats(publisher, worker):
+    return next(reader for reader in publisher.stats()['readers'] if reader['pid'] == worker.process.pid)
+
+
+@pytest.fixture
+def publisher():
+    publisher = SharedMemoryPublisher(None, size = RING_SIZE)
+    yield publisher
+    publisher.close()
+
+
+@pytest.fixture
+def context():
+    return multiprocessing.get_context('spawn')
+
+
+def test_worker_reads_every_message_across_wrap_arounds(publisher, context):
+    worker = Worker(context, publisher.name)
+    assert worker.ready.wait(30)
+    for n in range(500):
+        publisher.write('trade', PAIR, {'n': n, 'price': '100.5', 'qty': '0.25'})
+        # Not subscribed by the worker, skipped without decoding
+        publisher.write('trade', 'ETH-USDT', {'n': n})
+        if n % 10 == 9:
+            until(lambda: reader_stats(publisher, worker)['lag_messages'] == 0)
+    publisher.write('trade', PAIR, {'end': True})
+    received, stats = worker.result()
+    assert publisher.position > 10 * publisher.capacity
+    assert received == list(range(500))
+    assert stats['overruns'] == 0 and stats['lost'] == 0
+    # The worker gave its slot back on close
+    assert publisher.stats()['readers'] == []
+
+
+def test_lag_and_overrun_per_reader(publisher, context):
+    fast = Worker(context, publisher.name)
+    slow = Worker(context, publisher.name, blocked = True)
+    assert fast.ready.wait(30) and slow.ready.wait(30)
+    publisher.write('trade', PAIR, {'n': 0})
+    for n in range(1, 300):
+        publisher.write('trade', PAIR, {'n': n})
+        if n % 10 == 9:
+            until(lambda: reader_stats(publisher, fast)['lag_messages'] == 0)
+    assert publisher.position > publisher.capacity
+    slow_stats = reader_stats(publisher, slow)
+    assert slow_stats['lag_messages'] == 300 and slow_stats['lag_bytes'] == publisher.position
+    assert reader_stats(publisher, fast)['lag_bytes'] == 0
+
+    slow.release.set()
+    until(lambda: reader_stats(publisher, slow)['overruns'] == 1)
+    publisher.write('trade', PAIR, {'n': 300})
+    publisher.write('trade', PAIR, {'end': True})
+    received, stats = fast.result()
+    assert received == list(range(301)) and stats['overruns'] == 0
+    received, stats = slow.result()
+    # The first message was delivered, the ones overwritten meanwhile are counted as lost
+    assert received == [0, 300]
+    assert stats['overruns'] == 1 and stats['lost'] == 299
+    assert stats['messages'] == publisher.messages
+
+
+def test_readers_leave_the_block_to_the_publisher():
+    publisher = SharedMemoryPublisher(None, size = RING_SIZE)
+    # A process not started by multiprocessing has a resource tracker of its own
+    script = 'import sys; from bit.shm import SharedMemorySubscriber; SharedMemorySubscriber(sys.argv[1])'
+    root = os.path.dirname(os.path.dirname(os.path.abspath(bit.__file__)))
+    process = subprocess.run([sys.executable, '-c', script, publisher.name], cwd = root, capture_output = True, text = True, timeout = 30)
+    assert process.returncode == 0, process.stderr
+    assert 'leaked' not in process.stderr
+    reader = SharedMemorySubscriber(publisher.name)
+    asyncio.run(reader.close())
+    publisher.close()
+    with pytest.raises(FileNotFoundError):
+        SharedMemorySubscriber(publisher.name)
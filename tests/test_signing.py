@@ -0,0 +1,78 @@
+import hashlib
+import hmac
+
+import pytest
+
+from bit.rest_client import RestClient
+from bit.signing import Signer, encode_object
+
+SECRET = 'eabe3b5bf4a1e7ea9e1a9c5a3f2d4b6c'
+
+
+# The recursive encoder RestClient signed requests with before bit.signing
+def legacy_encode_list(item_list):
+    return '[' + '&'.join(legacy_encode_object(item) for item in item_list) + ']'
+
+
+def legacy_encode_object(obj):
+    if isinstance(obj, (str, int)):
+        return obj
+    ret_list = []
+    for key in sorted(obj.keys()):
+        val = obj[key]
+        if isinstance(val, list):
+            ret_list.append(f'{key}={legacy_encode_list(val)}')
+        elif isinstance(val, dict):
+            ret_list.append(f'{key}={legacy_encode_object(val)}')
+        elif isinstance(val, bool):
+            ret_list.append(f'{key}={str(val).lower()}')
+        else:
+            ret_list.append(f'{key}={str(val)}')
+    return '&'.join(sorted(ret_list))
+
+
+def legacy_sign(api_path, param_map):
+    str_to_sign = api_path + '&' + legacy_encode_object(param_map)
+    return hmac.new(SECRET.encode('utf-8'), str_to_sign.encode('utf-8'), digestmod = hashlib.sha256).hexdigest()
+
+
+ORDER = {
+    'pair': 'BTC-USDT', 'side': 'buy', 'price': '30000.5', 'qty': '0.01', 'order_type': 'limit',
+    'time_in_force': 'gtc', 'post_only': True, 'reduce_only': False, 'label': 'quote-1', 'timestamp': '1684236540123',
+}
+
+PAYLOADS = [
+    {},
+    {'timestamp': '1684236540123'},
+    ORDER,
+    {'qty': 1, 'price': 1.5, 'mmp': False, 'label': 'a=b&c'},
+    {'currency': 'USDT', 'orders_data': [dict(ORDER, label = 'quote-{}'.format(i)) for i in range(5)], 'timestamp': 1},
+    {'orders_data': [{'order_id': '1', 'price': '2'}, {'order_id': '3', 'qty': '4', 'post_only': False}]},
+    {'outer': {'inner': {'z': 1, 'a': True}, 'list': [{'b': '2', 'a': '1'}]}, 'key': 'value'},
+    {'ids': ['3', '1', '2'], 'empty': [], 'nested': {}},
+]
+
+
+@pytest.mark.parametrize('payload', PAYLOADS)
+def test_encode_object_matches_legacy_encoder(payload):
+    assert encode_object(payload) == legacy_encode_object(payload)
+
+
+@pytest.mark.parametrize('payload', PAYLOADS)
+def test_signer_matches_legacy_signature(payload):
+    assert Signer(SECRET).sign('/spot/v1/orders', payload) == legacy_sign('/spot/v1/orders', payload)
+
+
+def test_signer_reuse_does_not_leak_state():
+    signer = Signer(SECRET)
+    first = signer.sign('/spot/v1/orders', ORDER)
+    signer.sign('/spot/v1/cancel_orders', {'order_id': '1'})
+    assert signer.sign('/spot/v1/orders', ORDER) == first
+
+
+async def test_rest_client_signature():
+    client = RestClient('key', SECRET)
+    try:
+        assert client._get_signature('POST', '/spot/v1/orders', ORDER) == legacy_sign('/spot/v1/orders', ORDER)
+    finally:
+        await client.close()
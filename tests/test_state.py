@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from bit.state import StateTracker
+from bit.web_socket_client import WebSocketClient
+
+from conftest import wait_until
+
+PAIR = 'BTC-USDT'
+ORDER = {'pair': PAIR, 'side': 'buy', 'order_type': 'limit', 'qty': '1', 'price': '100'}
+
+
+@pytest.fixture
+async def state(exchange):
+    client = WebSocketClient('key', 'secret', stream_url = exchange.stream_url, rest_url = exchange.rest_url)
+    await client.start()
+    state = await client.track_state(spot_pairs = [PAIR], um_account = False)
+    state.GAP_GRACE = 0.05
+    await asyncio.wait_for(state.synced.wait(), 5)
+    await asyncio.wait_for(client.wait_subscribed(), 5)
+    yield state
+    await client.close()
+
+
+async def test_orders_and_fills_tracked(exchange, rest_client, state):
+    order = await rest_client.spot_place_order(label = 'tracked', **ORDER)
+    assert (await state.wait_for(label = 'tracked', status = 'open', timeout = 2))['order_id'] == order['order_id']
+    assert [o['order_id'] for o in state.orders_of(PAIR)] == [order['order_id']]
+    exchange.fill(order['order_id'])
+    filled = await state.wait_for(order['order_id'], status = 'filled', timeout = 2)
+    assert filled['status'] == 'filled'
+    await wait_until(lambda: state.fills_of(order['order_id']))
+    assert state.orders_of(PAIR) == [] and state.gaps == 0
+
+
+async def test_missed_order_update_of_known_order_reconciled(exchange, rest_client, state):
+    order = await rest_client.spot_place_order(label = 'missed', **ORDER)
+    await state.wait_for(label = 'missed', status = 'open', timeout = 2)
+    exchange.fill(order['order_id'], publish_order = False)
+    filled = await state.wait_for(label = 'missed', status = 'filled', timeout = 2)
+    assert filled['status'] == 'filled'
+    assert state.gaps == 1
+    assert state.orders_of(PAIR) == []
+
+
+async def test_missed_partial_fill_update_reconciled(exchange, rest_client, state):
+    order = await rest_client.spot_place_order(label = 'partial', **ORDER)
+    await state.wait_for(label = 'partial', status = 'open', timeout = 2)
+    exchange.fill(order['order_id'], 0.4, publish_order = False)
+    await wait_until(lambda: float(state.get_order(order['order_id'])['filled_qty']) == 0.4)
+    assert state.gaps == 1
+    assert state.get_order(order['order_id'])['status'] == 'open'
+
+
+async def test_fill_before_its_order_update_is_no_gap(state):
+    await state.on_message('user_trade', PAIR, [{'trade_id': '1', 'order_id': '7', 'pair': PAIR, 'qty': '1', 'created_at': 1}])
+    await state.on_message('order', PAIR, [{'order_id': '7', 'pair': PAIR, 'status': 'filled', 'filled_qty': '1', 'updated_at': 2}])
+    await asyncio.sleep(state.GAP_GRACE * 2)
+    assert state.gaps == 0
+
+
+class FlakyRestClient:
+    """Open orders query failing with transport errors a few times before answering."""
+
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.queries = 0
+
+    def now_ms(self):
+        return 0
+
+    async def spot_query_open_orders(self):
+        self.queries += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return []
+
+
+async def test_reconcile_retries_transport_errors():
+    client = FlakyRestClient([ConnectionResetError('reset'), asyncio.TimeoutError(), OSError('unreachable')])
+    state = StateTracker(client, spot_pairs = [PAIR])
+    state.RECONCILE_RETRY_WAIT = 0.01
+    state.reconcile()
+    await asyncio.wait_for(state.synced.wait(), 2)
+    assert client.queries == 4 and state.reconciles == 1
+    await state.close()
+
+
+async def test_waiters_removed_after_timeout():
+    state = StateTracker(FlakyRestClient([]), spot_pairs = [PAIR])
+    with pytest.raises(asyncio.TimeoutError):
+        await state.wait_for('1', timeout = 0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        await state.wait_for(label = 'x', timeout = 0.01)
+    assert state._waiters == {} and state._label_waiters == {}
+    await state.close()